@@ -6,23 +6,29 @@ st.set_page_config(
         ) 
 
 from back import SnowparkManager
+import statements
+import llm_streaming
 from bookshelf_views import render_traditional_view, render_column_view, render_hybrid_view
+from document_viewers import paged_pdf_viewer
+from document_cache import DocumentCache
+from render_cache import RenderCache, content_hash
+from tts_pipeline import TTSPipeline
+from audio_player import play_segments
 from datetime import datetime
 import json
 import time
 import psutil
 from typing import Dict, List, Any, Optional
 import hashlib
-import uuid
-from trulens.apps.custom import instrument
+from lazy_deps import instrument
+from tracing import span
 import random
 from streamlit.runtime.scriptrunner import RerunException
 from truelens_utils import TruLensEvaluator
-import os
-import tempfile
-from gtts import gTTS
-from streamlit_pdf_viewer import pdf_viewer 
 
+# Palette and default font size of the text/Word reader; part of its render cache key
+READER_THEME = "Purple"
+READER_FONT_SIZE = 16
 
   
   
@@ -66,8 +72,7 @@ class PDFLibraryApp:
         session = SnowparkManager.get_session()
         if session:
             try:
-                query = "SELECT * FROM TESTDB.MYSCHEMA.BOOK_METADATA"
-                results = session.sql(query).collect()
+                results = statements.BOOK_METADATA_ALL.collect(session)
                 st.session_state.files = [
                     {
                         "name": row["FILENAME"],
@@ -364,17 +369,7 @@ class PDFLibraryApp:
         session = SnowparkManager.get_session()
         if session:
             try:
-                query = """
-                SELECT 
-                    BOOK_ID,
-                    FILENAME,
-                    CATEGORY,
-                    DATE_ADDED,
-                    SIZE,
-                    USAGE_STATS
-                FROM TESTDB.MYSCHEMA.BOOK_METADATA
-                """
-                results = session.sql(query).collect()
+                results = statements.BOOK_METADATA_ALL.collect(session)
                 st.session_state.files = [
                     {
                         "name": row["FILENAME"],
@@ -551,7 +546,8 @@ class PDFLibraryApp:
                     'enable_text': True,
                     'pages_vertical_spacing': 2,
                     'resolution_boost': 1,
-                    'font_size': 16
+                    'font_size': 16,
+                    'window_pages': 10
                 }
             return st.session_state.doc_settings
 
@@ -564,13 +560,7 @@ class PDFLibraryApp:
 
         try:
             # Get document type
-            type_query = f"""
-            SELECT DISTINCT FILE_TYPE
-            FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
-            WHERE FILENAME = '{book['name'].replace("'", "''")}'
-            LIMIT 1
-            """
-            type_result = session.sql(type_query).collect()
+            type_result = statements.RAG_FILE_TYPE.collect(session, book['name'])
             
             if not type_result:
                 st.error("Document type not found.")
@@ -581,43 +571,54 @@ class PDFLibraryApp:
             settings = self.get_document_settings()
             
             if file_type == 'application/pdf':
-                pdf_query = f"""
-                SELECT BINARY_CONTENT
-                FROM RAG_METADATA
-                WHERE FILENAME = '{book['name'].replace("'", "''")}'
-                LIMIT 1
-                """
-                pdf_result = session.sql(pdf_query).collect()
+                # Hash is computed server-side so cached documents never cross the wire again
+                pdf_result = statements.RAG_METADATA_CONTENT_HASH.collect(session, book['name'])
                 
-                if not pdf_result or not pdf_result[0]['BINARY_CONTENT']:
+                if not pdf_result or not pdf_result[0]['CONTENT_HASH']:
                     st.warning("PDF content not found.")
                     return
                     
-                binary_content = bytes(pdf_result[0]['BINARY_CONTENT'])
+                pdf_hash = pdf_result[0]['CONTENT_HASH']
+
+                def load_binary():
+                    binary_result = statements.RAG_METADATA_BINARY.collect(session, book['name'])
+                    return binary_result[0]['BINARY_CONTENT'] if binary_result else None
+
+                binary_content = DocumentCache.get_or_load(pdf_hash, load_binary)
+                if binary_content is None:
+                    st.warning("PDF content not found.")
+                    return
                 
-                self.wrapper_pdf_viewer(
+                # Only the current window of pages is sent to the browser
+                paged_pdf_viewer(
                     binary_content=binary_content,
+                    doc_key=pdf_hash,
                     width=settings['width'],
                     enable_text=settings['enable_text'],
                     pages_vertical_spacing=settings['pages_vertical_spacing'],
-                    resolution_boost=settings['resolution_boost']
+                    resolution_boost=settings['resolution_boost'],
+                    window_pages=settings.get('window_pages', 10)
                 )
                 
             elif file_type in ['text/plain', 'application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-                content_query = f"""
-                SELECT CONTENT
-                FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
-                WHERE FILENAME = '{book['name'].replace("'", "''")}'
-                ORDER BY METADATA:chunk_number
-                """
-                content_result = session.sql(content_query).collect()
-                
-                if not content_result:
+                # A cheap fingerprint of the stored chunks keys the cached text, so reruns skip fetching them
+                fingerprint = statements.RAG_CHUNKS_FINGERPRINT.collect(session, book['name'])
+                if not fingerprint or not fingerprint[0]['CHUNKS']:
                     st.warning("No content found for this document.")
                     return
-                
-                full_content = '\n\n'.join([row['CONTENT'] for row in content_result])
-                self.display_content_block(full_content)
+                row = fingerprint[0]
+                doc_hash = content_hash(f"{book['name']}|{row['CHUNKS']}|{row['CHARS']}|{row['UPDATED_AT']}")
+
+                def load_text():
+                    # Each chunk contributes only its own text, without the heading and overlap it repeats
+                    content_result = statements.RAG_CHUNKS_BY_FILENAME.collect(session, book['name'])
+                    return '\n\n'.join([r['CONTENT'][r['BODY_START'] or 0:] for r in content_result]).encode('utf-8') if content_result else None
+
+                full_content = DocumentCache.get_or_load(f"text-body-{doc_hash}", load_text)
+                if full_content is None:
+                    st.warning("No content found for this document.")
+                    return
+                self.display_content_block(str(full_content, 'utf-8'), doc_hash=doc_hash)
                 
             else:
                 st.warning(f"Unsupported file type: {file_type}")
@@ -791,8 +792,9 @@ class PDFLibraryApp:
                                 st.markdown("### 📄 Content Results")
                                 st.session_state.search_results = results['sources']
 
-                                for idx, result in enumerate(results['sources']):
-                                    self.render_search_result(result, idx)
+                                with span("render.search_results", results=len(results['sources'])):
+                                    for idx, result in enumerate(results['sources']):
+                                        self.render_search_result(result, idx)
 
                         except Exception as e:
                             st.error(f"Search error: {str(e)}")
@@ -923,18 +925,11 @@ class PDFLibraryApp:
                             if session:
                                 try:
                                     # Delete from BOOK_METADATA
-                                    delete_metadata_sql = f"""
-                                    DELETE FROM TESTDB.MYSCHEMA.BOOK_METADATA 
-                                    WHERE FILENAME = '{selected_filename.replace("'", "''")}'
-                                    """
-                                    session.sql(delete_metadata_sql).collect()
+                                    statements.BOOK_METADATA_DELETE_BY_FILENAME.collect(session, selected_filename)
                                     
                                     # Delete from RAG_DOCUMENTS_TMP
-                                    delete_rag_sql = f"""
-                                    DELETE FROM {SnowparkManager.RAG_TABLE}
-                                    WHERE FILENAME = '{selected_filename.replace("'", "''")}'
-                                    """
-                                    session.sql(delete_rag_sql).collect()
+                                    statements.RAG_DELETE_BY_FILENAME.collect(session, selected_filename)
+                                    SnowparkManager.invalidate_document_caches(selected_filename)
                                     
                                     # Remove from session state
                                     st.session_state.files = [
@@ -1053,13 +1048,7 @@ class PDFLibraryApp:
 
                     try:
                         # Get original content
-                        query = f"""
-                        SELECT CONTENT, METADATA:page_number::INTEGER as PAGE_NUM
-                        FROM RAG_DOCUMENTS_TMP
-                        WHERE FILENAME = '{book['name'].replace("'", "''")}'
-                        ORDER BY PAGE_NUM
-                        """
-                        results = session.sql(query).collect()
+                        results = statements.RAG_PAGES_BY_FILENAME.collect(session, book['name'])
                         
                         if not results:
                             st.error("No content found for this document")
@@ -1075,15 +1064,19 @@ class PDFLibraryApp:
                             format_type=format_type,
                             max_tokens=max_tokens,
                             include_key_points=include_key_points,
-                            operation_type="SUMMARY" 
+                            operation_type="SUMMARY",
+                            stream=True
                         )
                         st.session_state.trulens_evaluator = TruLensEvaluator()
                         print("Debug: Created new TruLens evaluator")
-                        if summary and summary.get('summary'):
+                        if summary and summary.get('summary_stream'):
+                            st.markdown("### 📄 Generated Summary")
+                            summary['summary'] = st.write_stream(summary['summary_stream'])
+                        elif summary and summary.get('summary'):
                             # Display summary
                             st.markdown("### 📄 Generated Summary")
                             st.write(summary['summary'])
-
+                        if summary and summary.get('summary'):
                             # Show metadata in expander
                             with st.expander("📊 Summary Details", expanded=False):
                                 st.write(f"- **Document**: {summary['filename']}")
@@ -1269,8 +1262,9 @@ class PDFLibraryApp:
                                 st.markdown("### 📄 Content Results")
                                 st.session_state.search_results = results['sources']
 
-                                for idx, result in enumerate(results['sources']):
-                                    self.render_search_result(result, idx)
+                                with span("render.search_results", results=len(results['sources'])):
+                                    for idx, result in enumerate(results['sources']):
+                                        self.render_search_result(result, idx)
 
                         except Exception as e:
                             st.error(f"Search error: {str(e)}")
@@ -1279,8 +1273,10 @@ class PDFLibraryApp:
                             
             
 
-    def display_content_block(self, content):
+    def display_content_block(self, content, doc_hash: Optional[str] = None):
         """Helper method to display content block with enhanced HTML formatting"""
+        doc_hash = doc_hash or content_hash(content)
+        font_size = self.get_document_settings().get('font_size', READER_FONT_SIZE)
         # Create the container div with improved styling and header/footer handling
         container_style = (
             "background-color: #593163;"
@@ -1291,7 +1287,7 @@ class PDFLibraryApp:
             "position: relative;"
             "box-shadow: 0 4px 6px rgba(0, 0, 0, 0.3);"
             "font-family: Georgia, 'Times New Roman', serif;"
-            "font-size: 16px;"
+            f"font-size: {font_size}px;"
             "height: 800px;"
             "width: 90%;"
             "margin: 2rem auto;"
@@ -1313,8 +1309,25 @@ class PDFLibraryApp:
             "scrollbar-color: #541680 #593163;"
         )
         
-        # Format the content with proper HTML structure
-        formatted_content = self.format_content_html(content)
+        # Only the visible section of the cached HTML is sent to the browser
+        blocks = self.format_content_blocks(content, doc_hash, font_size)
+        total_sections = RenderCache.page_count(blocks)
+        section_key = f"content_section_{doc_hash}"
+        if section_key not in st.session_state or st.session_state[section_key] > total_sections:
+            st.session_state[section_key] = 1
+        if total_sections > 1:
+            nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+            with nav_prev:
+                if st.button("◀ Previous", key=f"prev_{section_key}", use_container_width=True,
+                             disabled=st.session_state[section_key] <= 1):
+                    st.session_state[section_key] -= 1
+            with nav_next:
+                if st.button("Next ▶", key=f"next_{section_key}", use_container_width=True,
+                             disabled=st.session_state[section_key] >= total_sections):
+                    st.session_state[section_key] += 1
+            with nav_info:
+                st.caption(f"Section {st.session_state[section_key]} of {total_sections}")
+        formatted_content = RenderCache.get_page(blocks, st.session_state[section_key])
         
         # Combine everything into the final HTML structure
         html_content = f"""
@@ -1335,33 +1348,17 @@ class PDFLibraryApp:
                 "Voice Accent",
                 ["co.uk", "com", "com.au", "co.in", "ca"],
                 help="Select voice accent for text-to-speech",
-                key=f"accent_{hash(content)}"
+                key=f"accent_{doc_hash}"
             )
             
-            if st.button("🔊 Read Content", use_container_width=True, key=f"read_{hash(content)}"):
+            if st.button("🔊 Read Content", use_container_width=True, key=f"read_{doc_hash}"):
                 try:
-                    with st.spinner("Generating audio..."):
-                        temp_dir = tempfile.gettempdir()
-                        temp_file = os.path.join(temp_dir, f'content_{uuid.uuid4().hex}.mp3')
-                        
-                        try:
-                            # Clean content for text-to-speech
-                            clean_content = self.clean_content_for_tts(content)
-                            
-                            tts = gTTS(text=clean_content, lang='en', slow=False, tld=accent)
-                            tts.save(temp_file)
-                            
-                            with open(temp_file, 'rb') as audio_file:
-                                audio_bytes = audio_file.read()
-                            st.audio(audio_bytes)
-                            
-                        finally:
-                            try:
-                                time.sleep(1)
-                                if os.path.exists(temp_file):
-                                    os.remove(temp_file)
-                            except Exception:
-                                pass
+                    # Clean content for text-to-speech
+                    clean_content = self.clean_content_for_tts(content)
+                    pipeline = TTSPipeline()
+
+                    # Segments are synthesized a few at a time; playback starts with the first
+                    play_segments(pipeline.stream(clean_content, accent), pipeline.mime_type)
                                 
                 except Exception as e:
                     st.error(f"Error generating audio: {str(e)}")
@@ -1369,8 +1366,25 @@ class PDFLibraryApp:
 
     def format_content_html(self, content: str) -> str:
             """Convert markdown content to formatted HTML with enhanced document structure"""
+            return '\n'.join(self.format_content_blocks(content))
+
+    def format_content_blocks(self, content: str, doc_hash: Optional[str] = None,
+                              font_size: int = READER_FONT_SIZE) -> List[str]:
+            """Get the HTML blocks for content, cached per document so rereads skip tokenizing"""
             if not content:
-                return ""
+                return []
+            try:
+                return RenderCache.get_blocks(
+                    doc_hash or content_hash(content), "reader", READER_THEME, font_size,
+                    lambda: self._build_content_blocks(content)
+                )
+            except Exception as e:
+                # Failures are shown but not cached, so the next rerun tries again
+                st.error(f"Error formatting content: {str(e)}")
+                return [f'<p style="color: red;">Error formatting content: {str(e)}</p>']
+
+    def _build_content_blocks(self, content: str) -> List[str]:
+            """Tokenize content into HTML blocks for headings, lists, code and paragraphs"""
                 
             # Create a dictionary of document sections
             document_sections = {
@@ -1483,11 +1497,11 @@ class PDFLibraryApp:
                         f'<code>{code_content}</code></pre>'
                     )
                 
-                return '\n'.join(formatted_paragraphs)
+                return formatted_paragraphs
                 
             except Exception as e:
-                st.error(f"Error formatting content: {str(e)}")
-                return f'<p style="color: red;">Error formatting content: {str(e)}</p>'
+                print(f"Error formatting content: {str(e)}")
+                raise
 
     
     def clean_content_for_tts(self, content: str) -> str:
@@ -1571,22 +1585,33 @@ class PDFLibraryApp:
                         style=style,
                         format_type=format_type,
                         include_quotes=include_quotes,
-                        max_tokens=max_tokens
+                        max_tokens=max_tokens,
+                        stream=True
                     )
                     
-                    if qa_results and qa_results.get('answer'):
-                        # Display answer in a card-like container
+                    if qa_results and (qa_results.get('answer') or qa_results.get('answer_stream')):
+                        # Display answer in a card-like container, filled in as tokens arrive
                         st.markdown("### 💡 Answer")
-                        st.markdown(f"""
-                            <div style="
-                                background-color: #4E2A84;
-                                padding: 20px;
-                                border-radius: 8px;
-                                border: 1px solid #541680;
-                                margin: 10px 0;">
-                                {qa_results['answer']}
-                            </div>
-                            """, unsafe_allow_html=True)
+                        answer_placeholder = st.empty()
+
+                        def render_answer(answer: str):
+                            answer_placeholder.markdown(f"""
+                                <div style="
+                                    background-color: #4E2A84;
+                                    padding: 20px;
+                                    border-radius: 8px;
+                                    border: 1px solid #541680;
+                                    margin: 10px 0;">
+                                    {answer}
+                                </div>
+                                """, unsafe_allow_html=True)
+
+                        if qa_results.get('answer_stream'):
+                            qa_results['answer'] = llm_streaming.render_incrementally(
+                                qa_results['answer_stream'], render_answer
+                            )
+                        else:
+                            render_answer(qa_results['answer'])
                         
                         # Display sources if available
                         if qa_results.get('sources'):
@@ -1595,6 +1620,8 @@ class PDFLibraryApp:
                                 for idx, source in enumerate(qa_results.get('sources', []), 1):
                                     filename = source.get('filename', 'Unknown')
                                     page = source.get('page', 'N/A')
+                                    if source.get('page_end') and source['page_end'] != page:
+                                        page = f"{page}-{source['page_end']}"
                                     
                                     # Extract content snippet if available
                                     content_snippet = source.get('content', '')
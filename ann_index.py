@@ -0,0 +1,272 @@
+import os
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import vector_store
+from vector_store import VectorStore
+from tracing import span
+
+# Below this many live vectors an exact scan is as fast as probing lists
+MIN_INDEX_ROWS = 5000
+# Inverted lists per sqrt(N) vectors, so a probe scans about sqrt(N) / LISTS_PER_SQRT_N rows per list
+LISTS_PER_SQRT_N = 4
+MAX_LISTS = 8192
+DEFAULT_NPROBE = 16
+# k-means trains on this many sampled vectors per list, over KMEANS_ITERATIONS rounds
+TRAIN_POINTS_PER_LIST = 32
+MAX_TRAIN_POINTS = 200000
+KMEANS_ITERATIONS = 10
+# Rebuild once this share of indexed rows are tombstones, or the library has grown this much since training
+REBUILD_TOMBSTONE_SHARE = 0.2
+REBUILD_GROWTH = 4.0
+INDEX_FILE = "ivf.npz"
+
+
+def list_count(rows: int) -> int:
+    return max(1, min(MAX_LISTS, int(LISTS_PER_SQRT_N * math.sqrt(rows))))
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for each unit vector"""
+    return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+
+def train_centroids(vectors: np.ndarray, lists: int, seed: int = 0,
+                    iterations: int = KMEANS_ITERATIONS) -> np.ndarray:
+    """Spherical k-means: unit centroids maximizing cosine similarity to their members"""
+    rng = np.random.default_rng(seed)
+    lists = min(lists, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        starts = np.searchsorted(assign[order], np.arange(lists))
+        used = np.bincount(assign, minlength=lists) > 0
+        sums = np.zeros_like(centroids)
+        sums[used] = np.add.reduceat(vectors[order], starts[used])
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # Empty lists restart from random points so every list ends up used
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = sums / norms[:, None]
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over a VectorStore's rows. k-means centroids split the
+    vectors into inverted lists; a search scores the centroids, then the
+    store's compact codes of the nprobe closest lists, and rescores the best
+    of those exactly. Rows appended to the store since the last update() are
+    inserted into their nearest list; rows the store removed stay in the
+    lists as tombstones that searches skip, until rebuild() compacts the
+    store and retrains. Centroids and list assignments are saved in the
+    store's directory.
+    """
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self.centroids: Optional[np.ndarray] = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self._trained_rows = 0
+        self._generation = -1
+        self._load()
+
+    def _file(self) -> str:
+        return os.path.join(self.store.path, INDEX_FILE)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._file()):
+            return
+        saved = np.load(self._file())
+        if int(saved['generation']) != self.store.generation:
+            return
+        self.centroids = saved['centroids']
+        self._trained_rows = int(saved['trained_rows'])
+        self._generation = self.store.generation
+        self._set_assignments(saved['assign'])
+
+    def save(self) -> None:
+        with self._lock:
+            if self.centroids is None:
+                return
+            np.savez(self._file() + ".tmp.npz", centroids=self.centroids, assign=self._assign,
+                     trained_rows=self._trained_rows, generation=self._generation)
+            os.replace(self._file() + ".tmp.npz", self._file())
+
+    def _set_assignments(self, assign: np.ndarray) -> None:
+        self._assign = assign.astype(np.int32)
+        order = np.argsort(self._assign, kind="stable")
+        bounds = np.searchsorted(self._assign[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]].tolist() for i in range(len(self.centroids))]
+        self._list_arrays = {}
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None and self._generation == self.store.generation
+
+    def build(self, lists: Optional[int] = None, seed: int = 0) -> None:
+        """
+        Train centroids on a sample of live vectors and assign every row.
+        Searches keep using the previous lists until the new ones are swapped
+        in; rows appended meanwhile are picked up by the next update().
+        """
+        generation, rows = self.store.generation, self.store.rows
+        with span("ann.build", rows=rows) as build_span:
+            live_rows = np.flatnonzero(self.store.is_live(np.arange(rows)))
+            if len(live_rows) == 0:
+                return
+            lists = lists or list_count(len(live_rows))
+            rng = np.random.default_rng(seed)
+            sample_size = min(len(live_rows), MAX_TRAIN_POINTS, lists * TRAIN_POINTS_PER_LIST)
+            sample = np.sort(rng.choice(live_rows, sample_size, replace=False))
+            centroids = train_centroids(self.store.vectors(sample), lists, seed)
+            assign = np.empty(rows, dtype=np.int32)
+            for start in range(0, rows, vector_store.SCAN_BLOCK_ROWS):
+                block = np.arange(start, min(rows, start + vector_store.SCAN_BLOCK_ROWS))
+                assign[block] = _nearest(self.store.vectors(block), centroids)
+            build_span.set(lists=len(centroids))
+
+        with self._lock:
+            if self.store.generation != generation:
+                # The store was compacted meanwhile, so these rows are stale
+                return
+            self.centroids = centroids
+            self._trained_rows = len(live_rows)
+            self._generation = generation
+            self._set_assignments(assign)
+            self.save()
+
+    def update(self) -> int:
+        """Insert rows appended to the store since the last build or update"""
+        with self._lock:
+            if not self.trained or len(self._assign) >= self.store.rows:
+                return 0
+            rows = np.arange(len(self._assign), self.store.rows)
+            assign = _nearest(self.store.vectors(rows), self.centroids)
+            for row, list_id in zip(rows.tolist(), assign.tolist()):
+                self._lists[list_id].append(row)
+                self._list_arrays.pop(list_id, None)
+            self._assign = np.concatenate([self._assign, assign])
+            self.save()
+            return len(rows)
+
+    def tombstones(self) -> int:
+        """Indexed rows the store no longer holds"""
+        if not len(self._assign):
+            return 0
+        return int(np.count_nonzero(~self.store.is_live(np.arange(len(self._assign)))))
+
+    def needs_rebuild(self) -> bool:
+        if not self.trained:
+            return len(self.store) >= MIN_INDEX_ROWS
+        return (self.tombstones() > REBUILD_TOMBSTONE_SHARE * len(self._assign)
+                or len(self.store) > REBUILD_GROWTH * max(self._trained_rows, 1))
+
+    def rebuild(self) -> None:
+        """
+        Drop dead rows from the store and retrain. The index lock is not held
+        meanwhile: after compaction searches scan the store exactly until
+        build() swaps the new lists in.
+        """
+        with self._rebuild_lock:
+            if self.tombstones():
+                self.store.compact()
+            self.build()
+
+    def _list_rows(self, list_id: int) -> np.ndarray:
+        rows = self._list_arrays.get(list_id)
+        if rows is None:
+            rows = self._list_arrays[list_id] = np.asarray(self._lists[list_id], dtype=np.int64)
+        return rows
+
+    def search(self, query: Any, k: int = 10, nprobe: int = DEFAULT_NPROBE,
+               exclude_label: Any = None) -> List[Tuple[str, float]]:
+        """
+        Approximate top k (id, cosine similarity), skipping ids with
+        exclude_label; an exact scan while the index is untrained
+        """
+        with span("ann.search", k=k, nprobe=nprobe) as search_span:
+            if not self.trained:
+                search_span.set(exact=True)
+                return self.store.search(query, k, exclude_label=exclude_label)
+            self.update()
+            query = np.asarray(query, dtype=np.float32).reshape(-1)
+            with self._lock:
+                generation = self._generation
+                probes = np.argsort(-(self.centroids @ query))[:nprobe]
+                rows = np.sort(np.concatenate([self._list_rows(int(p)) for p in probes]))
+            search_span.set(exact=False, scanned=len(rows))
+            return self.store.search(query, k, rows=rows, generation=generation, exclude_label=exclude_label)
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = [len(rows) for rows in self._lists]
+        return {
+            'trained': self.trained,
+            'lists': len(sizes),
+            'indexed_rows': len(self._assign),
+            'tombstones': self.tombstones(),
+            'largest_list': max(sizes) if sizes else 0,
+        }
+
+
+_index: Optional[IVFIndex] = None
+_index_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def get_index() -> Optional[IVFIndex]:
+    """Index over vector_store.get_store(), or None when local retrieval is not configured"""
+    global _index
+    store = vector_store.get_store()
+    if store is None:
+        return None
+    with _index_lock:
+        if _index is None or _index.store is not store:
+            _index = IVFIndex(store)
+        return _index
+
+
+def refresh_async(session_factory: Callable[[], Any]) -> bool:
+    """
+    In a background thread: fill an empty store from RAG_DOCUMENTS_TMP, insert
+    new rows into the index and rebuild it when needs_rebuild() says so.
+    session_factory opens the thread's own session. Returns False when local
+    retrieval is not configured or a refresh is already running.
+    """
+    index = get_index()
+    if index is None:
+        return False
+    with _index_lock:
+        if _refreshing.is_set():
+            return False
+        _refreshing.set()
+
+    def _refresh():
+        session = None
+        try:
+            if len(index.store) == 0:
+                session = session_factory()
+                if session is None:
+                    return
+                vector_store.sync_from_table(session, index.store)
+            index.update()
+            if index.needs_rebuild():
+                index.rebuild()
+        except Exception as e:
+            print(f"Vector index refresh failed: {str(e)}")
+        finally:
+            if session is not None:
+                session.close()
+            _refreshing.clear()
+
+    threading.Thread(target=_refresh, name="ann-refresh", daemon=True).start()
+    return True
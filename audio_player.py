@@ -0,0 +1,57 @@
+import streamlit as st
+import streamlit.components.v1 as components
+from typing import Iterable, Tuple
+
+# Chains the audio elements rendered into the same container: the first part
+# plays as soon as it arrives, each later part is hidden until the one before
+# it ends, so the reader sees a single player for the whole reading.
+_CHAIN_SCRIPT = """
+<script>
+const block = window.frameElement && window.frameElement.closest('[data-testid="stVerticalBlock"]');
+if (block) {
+    const parts = [];
+    const wire = (audio) => {
+        audio.dataset.ttsPart = parts.length;
+        const index = parts.push(audio) - 1;
+        audio.addEventListener('ended', () => {
+            const next = parts[index + 1];
+            audio.dataset.ttsDone = '1';
+            if (next) {
+                audio.style.display = 'none';
+                next.style.display = '';
+                next.play().catch(() => {});
+            }
+        });
+        if (index === 0) {
+            audio.play().catch(() => {});
+        } else if (parts[index - 1].dataset.ttsDone) {
+            // Synthesis fell behind playback; continue as soon as the part arrives
+            parts[index - 1].style.display = 'none';
+            audio.play().catch(() => {});
+        } else {
+            audio.style.display = 'none';
+        }
+    };
+    const scan = () => block.querySelectorAll('audio:not([data-tts-part])').forEach(wire);
+    new MutationObserver(scan).observe(block, {childList: true, subtree: true});
+    scan();
+}
+</script>
+"""
+
+
+def play_segments(segments: Iterable[Tuple[int, int, bytes]], mime_type: str) -> None:
+    """
+    Play (index, total, audio) segments, e.g. from TTSPipeline.stream(), as
+    they arrive: playback starts with the first one while later ones are
+    still being synthesized, and each continues where the previous ended.
+    """
+    with st.container():
+        components.html(_CHAIN_SCRIPT, height=0)
+        progress = st.empty()
+        for index, total, audio in segments:
+            if index + 1 < total:
+                progress.caption(f"Playing while preparing audio: part {index + 2} of {total}")
+            else:
+                progress.empty()
+            st.audio(audio, format=mime_type)
@@ -1,12 +1,5 @@
 from tempfile import NamedTemporaryFile
 from snowflake.snowpark import Session
-import snowflake.snowpark.types as T
-import snowflake.snowpark.functions as F
-from snowflake.snowpark.context import get_active_session
-import PyPDF2
-import docx
-import textwrap 
-import io
 import uuid
 import json
 import time
@@ -16,31 +9,40 @@ from datetime import datetime
 import streamlit as st
 from typing import Optional, List, Dict, Any, Tuple
 import requests
-import time
-from gtts import gTTS
 import os
-from tempfile import NamedTemporaryFile
-from pydub import AudioSegment
-from trulens.core import TruSession
-from trulens.connectors.snowflake import SnowflakeConnector
-from snowflake.snowpark.context import get_active_session
-from trulens.apps.custom import instrument
-from trulens_eval.feedback import Feedback
-from trulens_eval.feedback.provider import OpenAI
-from trulens.core.guardrails.base import context_filter
-from trulens.providers.cortex import Cortex
-import numpy as np
-from snowflake.core import Root
+from lazy_deps import instrument
+from tracing import current_span, span, traced
+from query_log import InstrumentedSession
+import statements
+import llm_streaming
+from llm_client import LLMClient
+import context_budget
+import chunking
+from semantic_cache import SemanticCache
+import retrieval_cache
+from retrieval_cache import RetrievalCache
+import vector_store
+import ann_index
+import reranking
+from statements import json_param
+from metrics_rollups import MetricsRollups
 
 
 
 class SnowparkManager:
+    # Target chunk sizes in tokens
     CHUNK_SIZE_OPTIONS = {
-        "Small": 1000,
-        "Medium": 1500,
-        "Large": 2000
+        "Small": 256,
+        "Medium": 384,
+        "Large": 512
     }
     
+    # Recommendations from the local index: score added for a shared category (as in
+    # RAG_SIMILAR_BOOKS), and chunk hits fetched per book asked for, doubling up to the maximum
+    RECOMMENDATION_CATEGORY_BOOST = 0.2
+    RECOMMENDATION_HITS_PER_BOOK = 20
+    MAX_RECOMMENDATION_HITS = 2000
+
     MISTRAL_API_ENDPOINT = "https://api.mistral.ai/v1/embeddings"
     RAG_TABLE = "RAG_DOCUMENTS_TMP"
 
@@ -104,6 +106,19 @@ Please format the response with clear section headers and bullet points for read
     }
 
 
+    @staticmethod
+    def invalidate_document_caches(filename: Optional[str] = None) -> None:
+        """Drop cached searches and answers about a document after it is ingested or deleted; None drops all"""
+        RetrievalCache.invalidate(filename)
+        SemanticCache.invalidate(filename)
+        store = vector_store.get_store()
+        if store is not None:
+            # Re-ingested chunks come back with the next vector_store.sync_from_table
+            if filename is None:
+                store.clear()
+            else:
+                store.remove_label(filename)
+
     @staticmethod
     def cleanup_documents(filenames: List[str]) -> bool:
         """Clean up documents from database when session ends"""
@@ -112,13 +127,9 @@ Please format the response with clear section headers and bullet points for read
             return False
 
         try:
-            filenames_str = "', '".join([f.replace("'", "''") for f in filenames])
-            
-            cleanup_query = f"""
-            DELETE FROM {SnowparkManager.RAG_TABLE}
-            WHERE FILENAME IN ('{filenames_str}')
-            """
-            session.sql(cleanup_query).collect()
+            statements.RAG_DELETE_BY_FILENAMES.collect(session, json_param(list(filenames)))
+            for filename in filenames:
+                SnowparkManager.invalidate_document_caches(filename)
             return True
 
         except Exception as e:
@@ -141,17 +152,20 @@ Please format the response with clear section headers and bullet points for read
         """Create Snowpark session using credentials from secrets"""
         try:
             # Create a new Session using configs
-            session = Session.builder.configs({
-                "account": st.secrets["snowflake_account"],
-                "user": st.secrets["snowflake_user"],
-                "password": st.secrets["snowflake_password"],
-                "warehouse": st.secrets["snowflake_warehouse"],
-                "database": st.secrets["snowflake_database"],
-                "schema": st.secrets["snowflake_schema"],
-                "role":st.secrets["snowflake_role"]
-            }).create()
+            with span("session.checkout"):
+                session = Session.builder.configs({
+                    "account": st.secrets["snowflake_account"],
+                    "user": st.secrets["snowflake_user"],
+                    "password": st.secrets["snowflake_password"],
+                    "warehouse": st.secrets["snowflake_warehouse"],
+                    "database": st.secrets["snowflake_database"],
+                    "schema": st.secrets["snowflake_schema"],
+                    "role":st.secrets["snowflake_role"],
+                    # Bound statements have stable text, so repeated reads hit the result cache
+                    "session_parameters": {"USE_CACHED_RESULT": True}
+                }).create()
             
-            return session
+            return InstrumentedSession(session)
         except Exception as e:
             print(f"Session creation error: {str(e)}")
             st.error(f"❌ Connection Error: {str(e)}")
@@ -261,38 +275,22 @@ Please format the response with clear section headers and bullet points for read
                 eval_results
             )
             
-            insert_query = f"""
-            INSERT INTO TESTDB.MYSCHEMA.TRULENS_METRICS (
-                METRIC_ID,
-                TIMESTAMP,
-                OPERATION_TYPE,
-                STYLE,
-                FORMAT_TYPE,
-                OUTPUT_TOKEN_COUNT,
-                CONTEXT_RELEVANCE,
-                GROUNDEDNESS_SCORE,
-                COHERENCE_SCORE,
-                SOURCE_DIVERSITY_SCORE,
-                FLUENCY_SCORE,
-                TOKEN_EFFICIENCY
-            ) VALUES (
-                '{metric_id}',
-                CURRENT_TIMESTAMP(),
-                '{operation_type}',
-                '{style.replace("'", "''")}',
-                '{format_type.replace("'", "''")}',
-                {output_token_count},
-                {eval_results.get('context_relevance', 0)},
-                {eval_results.get('groundedness', 0)},
-                {eval_results.get('coherence', 0)},
-                {eval_results.get('source_diversity', 0)},
-                {eval_results.get('fluency', 0)},
-                {eval_results.get('token_efficiency', 0)}
-            )
-            """
-            SnowparkManager.debug_print_metrics("INSERT_QUERY", insert_query)
+            params = [
+                metric_id,
+                operation_type,
+                style,
+                format_type,
+                output_token_count,
+                eval_results.get('context_relevance', 0),
+                eval_results.get('groundedness', 0),
+                eval_results.get('coherence', 0),
+                eval_results.get('source_diversity', 0),
+                eval_results.get('fluency', 0),
+                eval_results.get('token_efficiency', 0)
+            ]
+            SnowparkManager.debug_print_metrics("INSERT_QUERY", statements.TRULENS_METRICS_INSERT.text, params)
             
-            session.sql(insert_query).collect()
+            statements.TRULENS_METRICS_INSERT.collect(session, *params)
             SnowparkManager.debug_print_metrics("INSERT_METRICS", "Successfully inserted metrics")
             return True
             
@@ -328,7 +326,7 @@ Please format the response with clear section headers and bullet points for read
             """).collect()
 
             # Create task for processing documents
-            session.sql("""
+            session.sql(f"""
             CREATE OR REPLACE TASK process_documents_task
                 WAREHOUSE = COMPUTE_WH
                 SCHEDULE = '1 MINUTE'
@@ -345,7 +343,7 @@ Please format the response with clear section headers and bullet points for read
                         'PDF'
                     )) as raw_content,
                     CAST(SNOWFLAKE.CORTEX.EMBED_TEXT_768(
-                        'snowflake-arctic-embed-m-v1.5',
+                        '{statements.EMBED_MODEL}',
                         raw_content
                     ) AS VECTOR(FLOAT, 768)) as EMBEDDING,
                     OBJECT_CONSTRUCT(
@@ -419,6 +417,7 @@ Please format the response with clear section headers and bullet points for read
             return {}
 
     @staticmethod
+    @traced("upload.stage")
     def upload_documents_streaming(
         session: Session,
         file_content: bytes,
@@ -427,26 +426,23 @@ Please format the response with clear section headers and bullet points for read
     ) -> bool:
         """Upload document to stage for streaming processing"""
         try:
-            st.write("Debug: Starting upload process...")
+            upload_span = current_span()
+            upload_span.set(filename=filename, bytes=len(file_content))
             
             # First, verify the stage exists
-            st.write("Debug: Checking stage exists...")
             stage_check = session.sql("SHOW STAGES LIKE 'docs_stage'").collect()
             if not stage_check:
                 st.error("Stage 'docs_stage' not found. Please initialize streaming infrastructure first.")
                 return False
             
             # Write file content to a temporary local file
-            st.write("Debug: Creating temporary file...")
             with NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
                 temp_file.write(file_content)
                 temp_file_path = temp_file.name
-                st.write(f"Debug: Temporary file created at: {temp_file_path}")
-                st.write(f"Debug: File size: {len(file_content)} bytes")
+                upload_span.set(temp_file=temp_file_path)
 
             try:
                 # Put file directly to docs_stage with more detailed output
-                st.write("Debug: Uploading to stage...")
                 put_result = session.file.put(
                     temp_file_path,
                     f"@docs_stage/{filename}",
@@ -454,17 +450,15 @@ Please format the response with clear section headers and bullet points for read
                     overwrite=True,
                     #show_progress_bar=True
                 )
-                st.write(f"Debug: Put operation result: {put_result}")
+                upload_span.set(put_result=str(put_result)[:200])
 
                 # Show stage contents for debugging
-                st.write("Debug: Listing stage contents...")
                 list_result = session.sql("LIST @docs_stage").collect()
                 st.write("Files in stage:")
                 for file in list_result:
                     st.write(f"- {file['name']} ({file['size']} bytes)")
 
                 # Verify file was staged with explicit pattern matching
-                st.write(f"Debug: Verifying upload for file: {filename}")
                 verify_query = f"""
                 LIST @docs_stage
                 PATTERN = '.*{filename}.*'
@@ -472,13 +466,12 @@ Please format the response with clear section headers and bullet points for read
                 verification = session.sql(verify_query).collect()
                 
                 if verification and len(verification) > 0:
-                    st.write("Debug: File successfully staged")
-                    st.write(f"Debug: Found {len(verification)} matching files:")
+                    upload_span.set(staged=len(verification))
+                    SnowparkManager.invalidate_document_caches(filename)
                     for v in verification:
                         st.write(f"- {v['name']} ({v['size']} bytes)")
                     
                     # Insert initial metadata
-                    st.write("Debug: Inserting metadata...")
                     metadata_sql = f"""
                     INSERT INTO
                     BOOK_METADATA (
@@ -500,8 +493,7 @@ Please format the response with clear section headers and bullet points for read
                         (SELECT '{file_content}' AS file_content)
                     """  
                 else:
-                    st.write(f"Debug: File not found in stage after upload")
-                    st.write(f"Debug: Verification query: {verify_query}")
+                    upload_span.set(staged=0)
                     return False
 
             except Exception as e:
@@ -510,11 +502,10 @@ Please format the response with clear section headers and bullet points for read
             finally:
                 # Clean up temporary file
                 try:
-                    st.write("Debug: Cleaning up temporary file...")
                    # os.unlink(temp_file_path)
-                    st.write("Debug: Temporary file cleaned up successfully")
+                    upload_span.set(temp_file_kept=True)
                 except Exception as e:
-                    st.write(f"Debug: Error cleaning up temporary file: {str(e)}")
+                    upload_span.set(cleanup_error=str(e))
 
         except Exception as e:
             st.error(f"Upload failed: {str(e)}")
@@ -531,110 +522,15 @@ Please format the response with clear section headers and bullet points for read
         chunk_size: int
     ) -> Tuple[bool, str, Optional[List[Dict]]]:
         """
-        Process PDF content into chunks for storage and extract binary content.
+        Split a PDF, Word or text document into chunks of about chunk_size tokens
+        (see CHUNK_SIZE_OPTIONS) that follow its headings and paragraphs.
         Returns:
-            Tuple containing (success, error_message, documents)
+            Tuple containing (success, error_message, documents); each document
+            has text, page_num and the page_start / page_end span it covers
         """
         try:
-            documents = []
-            
-            if file_type == "application/pdf":
-                # Process PDF using PyPDF2
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-                total_pages = len(pdf_reader.pages)
-
-                for page_num in range(total_pages):
-                    text = pdf_reader.pages[page_num].extract_text()
-                    # Format PDF content with page numbers
-                    formatted_text = f"## Page {page_num + 1}\n\n{text}"
-                    documents.append({
-                        "page_num": page_num + 1,
-                        "text": formatted_text
-                    })
-
-            elif file_type in ["application/msword", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-                # Process Word document
-                doc = docx.Document(io.BytesIO(file_content))
-                current_chunk = []
-                current_length = 0
-                chunk_number = 1
-
-                for paragraph in doc.paragraphs:
-                    if not paragraph.text.strip():
-                        continue
-                    
-                    text = paragraph.text.strip()
-                    style_name = paragraph.style.name.lower()
-
-                    if 'heading' in style_name:
-                        level = style_name[-1] if style_name[-1].isdigit() else '2'
-                        formatted_text = f"{'#' * int(level)} {text}"
-                    elif style_name == 'list paragraph':
-                        formatted_text = f"* {text}"
-                    else:
-                        formatted_text = text
-
-                    if current_length + len(formatted_text) >= chunk_size:
-                        if current_chunk:
-                            documents.append({
-                                "page_num": chunk_number,
-                                "text": "\n\n".join(current_chunk)
-                            })
-                            chunk_number += 1
-                            current_chunk = []
-                            current_length = 0
-
-                    current_chunk.append(formatted_text)
-                    current_length += len(formatted_text)
-
-                if current_chunk:
-                    documents.append({
-                        "page_num": chunk_number,
-                        "text": "\n\n".join(current_chunk)
-                    })
-
-            elif file_type == "text/plain":
-                text_content = file_content.decode("utf-8")
-                lines = text_content.split('\n')
-                current_chunk = []
-                current_length = 0
-                chunk_number = 1
-
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    if line.startswith('#'):
-                        formatted_text = line
-                    elif line.startswith('-') or line.startswith('*'):
-                        formatted_text = line
-                    elif ':' in line and len(line.split(':')[0].split()) <= 3:
-                        section, content = line.split(':', 1)
-                        formatted_text = f"### {section.strip()}\n{content.strip()}"
-                    else:
-                        formatted_text = line
-
-                    if current_length + len(formatted_text) >= chunk_size:
-                        if current_chunk:
-                            documents.append({
-                                "page_num": chunk_number,
-                                "text": "\n\n".join(current_chunk)
-                            })
-                            chunk_number += 1
-                            current_chunk = []
-                            current_length = 0
-
-                    current_chunk.append(formatted_text)
-                    current_length += len(formatted_text)
-
-                if current_chunk:
-                    documents.append({
-                        "page_num": chunk_number,
-                        "text": "\n\n".join(current_chunk)
-                    })
-
-            else:
+            documents = chunking.chunk_document(file_content, file_type, chunk_size)
+            if documents is None:
                 return False, f"Unsupported file type: {file_type}", None
 
             print(f"Processed {len(documents)} chunks from document")
@@ -647,14 +543,8 @@ Please format the response with clear section headers and bullet points for read
     def check_document_exists(session: Session, filename: str) -> bool:
         """Check if document already exists in database"""
         try:
-            escaped_filename = filename.replace("'", "''")
-            check_query = f"""
-            SELECT COUNT(*) as count
-            FROM {SnowparkManager.RAG_TABLE}
-            WHERE FILENAME = '{escaped_filename}'
-            """
-            result = session.sql(check_query).collect()
-            return result[0]['COUNT'] > 0
+            result = statements.RAG_CHUNK_COUNT.collect(session, filename)
+            return result[0]['TOTAL_PAGES'] > 0
         except Exception as e:
             st.error(f"Error checking document existence: {str(e)}")
             return False
@@ -663,21 +553,7 @@ Please format the response with clear section headers and bullet points for read
     def cleanup_duplicate_documents(session: Session, filename: str) -> bool:
         """Remove duplicate documents from database"""
         try:
-            escaped_filename = filename.replace("'", "''")
-            cleanup_query = f"""
-            DELETE FROM {SnowparkManager.RAG_TABLE}
-            WHERE DOC_ID IN (
-                SELECT DOC_ID
-                FROM (
-                    SELECT DOC_ID,
-                        ROW_NUMBER() OVER (PARTITION BY FILENAME ORDER BY CREATED_AT DESC) as rn
-                    FROM {SnowparkManager.RAG_TABLE}
-                    WHERE FILENAME = '{escaped_filename}'
-                )
-                WHERE rn > 1
-            )
-            """
-            session.sql(cleanup_query).collect()
+            statements.RAG_DELETE_DUPLICATES.collect(session, filename)
             return True
         except Exception as e:
             st.error(f"Error cleaning up duplicates: {str(e)}")
@@ -685,6 +561,7 @@ Please format the response with clear section headers and bullet points for read
 
 
 
+    @traced("upload.stage")
     def upload_documents_streaming(
         session: Session,
         file_content: bytes,
@@ -693,36 +570,32 @@ Please format the response with clear section headers and bullet points for read
     ) -> bool:
         """Upload document to stage for streaming processing with improved metadata handling"""
         try:
-            st.write("Debug: Starting upload process...")
+            upload_span = current_span()
+            upload_span.set(filename=filename, bytes=len(file_content))
             
             # First, verify the stage exists
-            st.write("Debug: Checking stage exists...")
             stage_check = session.sql("SHOW STAGES LIKE 'docs_stage'").collect()
             if not stage_check:
                 st.error("Stage 'docs_stage' not found. Please initialize streaming infrastructure first.")
                 return False
             
             # Write file content to a temporary local file
-            st.write("Debug: Creating temporary file...")
             with NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
                 temp_file.write(file_content)
                 temp_file_path = temp_file.name
-                st.write(f"Debug: Temporary file created at: {temp_file_path}")
-                st.write(f"Debug: File size: {len(file_content)} bytes")
+                upload_span.set(temp_file=temp_file_path)
 
             try:
                 # Put file directly to docs_stage
-                st.write("Debug: Uploading to stage...")
                 put_result = session.file.put(
                     temp_file_path,
                     f"@docs_stage/{filename}",
                     auto_compress=False,
                     overwrite=True
                 )
-                st.write(f"Debug: Put operation result: {put_result}")
+                upload_span.set(put_result=str(put_result)[:200])
 
                 # Verify file was staged
-                st.write(f"Debug: Verifying upload for file: {filename}")
                 verify_query = f"""
                 LIST @docs_stage
                 PATTERN = '.*{filename}.*'
@@ -730,66 +603,38 @@ Please format the response with clear section headers and bullet points for read
                 verification = session.sql(verify_query).collect()
                 
                 if verification and len(verification) > 0:
-                    st.write("Debug: File successfully staged")
+                    upload_span.set(staged=len(verification))
+                    SnowparkManager.invalidate_document_caches(filename)
                     
-                    # Create properly escaped JSON string for usage stats
-                    usage_stats = json.dumps({
+                    usage_stats = json_param({
                         "queries": 0,
                         "summaries": 0
-                    }).replace("'", "''")  # Properly escape single quotes for SQL
+                    })
                     
                     # Get the file size from the staged file
                     file_size = verification[0]['size']
                     
-                    # Insert metadata with properly formatted JSON
-                    st.write("Debug: Inserting metadata...")
-                    metadata_sql = f"""
-                    INSERT INTO TESTDB.MYSCHEMA.BOOK_METADATA (
-                        BOOK_ID,
-                        FILENAME,
-                        CATEGORY,
-                        DATE_ADDED,
-                        SIZE,
-                        USAGE_STATS
+                    # Insert metadata with bound values
+                    statements.BOOK_METADATA_INSERT.collect(
+                        session, str(uuid.uuid4()), filename, 'Document', file_size, usage_stats, None
                     )
-                    SELECT 
-                        UUID_STRING(),           -- Generate unique ID
-                        '{filename.replace("'", "''")}',  -- Escaped filename
-                        'Document',              -- Default category
-                        CURRENT_TIMESTAMP(),     -- Current timestamp
-                        {file_size},             -- Size from staged file
-                        PARSE_JSON('{usage_stats}')  -- Parsed JSON object
-                    FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))  -- Use result of last query
-                    LIMIT 1
-                    """
-                    
-                    session.sql(metadata_sql).collect()
                     
                     # Insert metrics for upload
-                    metrics_sql = f"""
-                    INSERT INTO ANALYTICS_METRICS (
-                        METRIC_ID,
-                        TIMESTAMP,
-                        DOCUMENT_NAME,
-                        ACTION_TYPE,
-                        STATUS,
-                        MEMORY_USAGE_MB,
-                        TOKEN_COUNT
-                    ) VALUES (
-                        '{str(uuid.uuid4())}',
-                        CURRENT_TIMESTAMP(),
-                        '{filename.replace("'", "''")}',
-                        'FILE_UPLOAD',
-                        'success',
-                        {len(file_content) / (1024 * 1024)},  # Convert bytes to MB
-                        0
-                    )
-                    """
                     try:
-                        session.sql(metrics_sql).collect()
-                        st.write("Debug: Upload metrics recorded")
+                        statements.ANALYTICS_METRICS_INSERT.collect(
+                            session,
+                            str(uuid.uuid4()),
+                            filename,
+                            'FILE_UPLOAD',
+                            None,
+                            'success',
+                            0,
+                            len(file_content) / (1024 * 1024),  # Convert bytes to MB
+                            None
+                        )
+                        MetricsRollups.refresh(session, wait=False)
                     except Exception as e:
-                        st.write(f"Debug: Error recording metrics: {str(e)}")
+                        upload_span.set(metrics_error=str(e))
                     
                     
                     from thumbnail_generator import ThumbnailGenerator
@@ -806,7 +651,7 @@ Please format the response with clear section headers and bullet points for read
                     
                     return True
                 else:
-                    st.write(f"Debug: File not found in stage after upload")
+                    upload_span.set(staged=0)
                     return False
                              
 
@@ -816,11 +661,9 @@ Please format the response with clear section headers and bullet points for read
             finally:
                 # Clean up temporary file
                 try:
-                    st.write("Debug: Cleaning up temporary file...")
                     os.unlink(temp_file_path)
-                    st.write("Debug: Temporary file cleaned up successfully")
                 except Exception as e:
-                    st.write(f"Debug: Error cleaning up temporary file: {str(e)}")
+                    upload_span.set(cleanup_error=str(e))
 
         except Exception as e:
             st.error(f"Upload failed: {str(e)}")
@@ -848,17 +691,15 @@ Please format the response with clear section headers and bullet points for read
             
             if file_details:
                 print("🔍 File details found")
-                filename_escaped = filename.replace("'", "''")
                 
                 # Delete existing entries from RAG table
-                delete_rag_sql = f"DELETE FROM {SnowparkManager.RAG_TABLE} WHERE FILENAME = '{filename_escaped}'"
-                session.sql(delete_rag_sql).collect()
+                statements.RAG_DELETE_BY_FILENAME.collect(session, filename)
+                SnowparkManager.invalidate_document_caches(filename)
                 
                 # Only handle RAG_METADATA for PDFs
                 if file_type == "application/pdf" and file_content:
                     # Delete existing PDF metadata
-                    delete_metadata_sql = f"DELETE FROM RAG_METADATA WHERE FILENAME = '{filename_escaped}'"
-                    session.sql(delete_metadata_sql).collect()
+                    statements.RAG_METADATA_DELETE_BY_FILENAME.collect(session, filename)
                     
                     # Store binary content for PDFs
                     metadata_doc_id = str(uuid.uuid4())
@@ -867,30 +708,13 @@ Please format the response with clear section headers and bullet points for read
                         'file_size': len(file_content)
                     }
                     
-                    metadata_insert_sql = f"""
-                    INSERT INTO RAG_METADATA (
-                        DOC_ID, 
-                        FILENAME, 
-                        FILE_TYPE, 
-                        BINARY_CONTENT, 
-                        METADATA
-                    ) 
-                    SELECT
-                        '{metadata_doc_id}',
-                        '{filename_escaped}',
-                        '{file_type}',
-                        TO_BINARY(HEX_ENCODE(?)),
-                        PARSE_JSON('{json.dumps(metadata)}')
-                    """
-                    session.sql(metadata_insert_sql, params=[file_content]).collect()
+                    statements.RAG_METADATA_INSERT.collect(
+                        session, metadata_doc_id, filename, file_type, file_content, json_param(metadata)
+                    )
                     print(f"Inserted binary content into RAG_METADATA for PDF, doc_id: {metadata_doc_id}")
                 
                 # Update BOOK_METADATA
-                delete_book_sql = f"""
-                DELETE FROM TESTDB.MYSCHEMA.BOOK_METADATA 
-                WHERE FILENAME = '{filename_escaped}'
-                """
-                session.sql(delete_book_sql).collect()
+                statements.BOOK_METADATA_DELETE_BY_FILENAME.collect(session, filename)
                 
                 # Insert into BOOK_METADATA
                 book_id = str(uuid.uuid4())
@@ -935,48 +759,17 @@ Please format the response with clear section headers and bullet points for read
                         }
                        
 
-                # Construct SQL based on whether we have a thumbnail
+                # The thumbnail is bound like every other value; NULL when generation failed
                 print("🔍 Before calling book_metadata_sql")
-                if thumbnail:
-                    book_metadata_sql = f"""
-                    INSERT INTO TESTDB.MYSCHEMA.BOOK_METADATA (
-                        BOOK_ID,
-                        FILENAME,
-                        CATEGORY,
-                        DATE_ADDED,
-                        SIZE,
-                        USAGE_STATS,
-                        THUMBNAIL
-                    )
-                    SELECT
-                        '{book_id}',
-                        '{filename_escaped}',
-                        '{file_details['category'].replace("'", "''")}',
-                        CURRENT_TIMESTAMP(),
-                        '{file_size}',
-                        TO_VARIANT(PARSE_JSON('{{ "queries": 0, "summaries": 0 }}')),
-                        {f", '{thumbnail}'" if thumbnail else ''} 
-                    """
-                else:
-                    book_metadata_sql = f"""
-                    INSERT INTO TESTDB.MYSCHEMA.BOOK_METADATA (
-                        BOOK_ID,
-                        FILENAME,
-                        CATEGORY,
-                        DATE_ADDED,
-                        SIZE,
-                        USAGE_STATS
-                    )
-                    SELECT
-                        '{book_id}',
-                        '{filename_escaped}',
-                        '{file_details['category'].replace("'", "''")}',
-                        CURRENT_TIMESTAMP(),
-                        '{file_size}',
-                        TO_VARIANT(PARSE_JSON('{{ "queries": 0, "summaries": 0 }}'))
-                    """
-                print("🔍 After calling book_metadata_sql")
-                session.sql(book_metadata_sql).collect()
+                statements.BOOK_METADATA_INSERT.collect(
+                    session,
+                    book_id,
+                    filename,
+                    file_details['category'],
+                    file_size,
+                    json_param({"queries": 0, "summaries": 0}),
+                    thumbnail
+                )
                 print("🔍 After calling book_metadata_sql collect")
                 # Process documents for RAG table
                 temp_table = f"TEMP_{uuid.uuid4().hex[:8]}"
@@ -996,8 +789,10 @@ Please format the response with clear section headers and bullet points for read
                 for idx, doc in enumerate(documents, 1):
                     chunk_metadata = {
                         'page_number': doc.get('page_num', idx),
+                        'page_end': doc.get('page_end', doc.get('page_num', idx)),
                         'total_pages': len(documents),
                         'chunk_number': idx,
+                        'body_start': doc.get('body_start', 0),
                         'file_type': file_type  # Store file type in metadata
                     }
                     
@@ -1021,26 +816,14 @@ Please format the response with clear section headers and bullet points for read
                 df.write.save_as_table(temp_table, mode="overwrite", table_type="temporary")
 
                 # Insert into final table with embeddings
-                insert_sql = f"""
-                INSERT INTO {SnowparkManager.RAG_TABLE} (
-                    DOC_ID, FILENAME, FILE_TYPE, CONTENT, EMBEDDING, METADATA, CREATED_AT
-                )
-                SELECT 
-                    t.DOC_ID,
-                    t.FILENAME,
-                    t.FILE_TYPE,
-                    t.CONTENT,
-                    CAST(SNOWFLAKE.CORTEX.EMBED_TEXT_768(
-                        'snowflake-arctic-embed-m-v1.5',
-                        t.CONTENT
-                    ) AS VECTOR(FLOAT, 768)),
-                    PARSE_JSON(t.METADATA),
-                    CURRENT_TIMESTAMP()
-                FROM {temp_table} t
-                """
-                
-                session.sql(insert_sql).collect()
+                statements.RAG_INSERT_FROM_STAGING.format(staging_table=temp_table).collect(session, statements.EMBED_MODEL)
                 session.sql(f"DROP TABLE IF EXISTS {temp_table}").collect()
+                # Answers given while the upload ran may quote the old content
+                SnowparkManager.invalidate_document_caches(filename)
+                store = vector_store.get_store()
+                if store is not None:
+                    vector_store.sync_from_table(session, store, filename=filename)
+                    ann_index.refresh_async(SnowparkManager.get_session)
                 
                 return True
             else:
@@ -1247,6 +1030,7 @@ Please format the response with clear section headers and bullet points for read
 
 
     @staticmethod
+    @traced("search.request")
     def semantic_search_with_llm(
             query: str,
             filename: Optional[str] = None,
@@ -1259,89 +1043,89 @@ Please format the response with clear section headers and bullet points for read
             include_quotes: bool = True,
             max_tokens: int = 500,
             model: str = 'mistral-large2',
-            operation_type: str = "SEARCH"
+            operation_type: str = "SEARCH",
+            stream: bool = False,
+            rerank: bool = True
         ) -> Optional[Dict[str, Any]]:
         """
         Semantic search using Cortex Search Service with LLM response generation.
+        With stream=True the answer is returned as 'answer_stream', a token iterator.
+        With rerank=True a wider candidate set is fetched and reranked locally down to limit.
         """
         session = SnowparkManager.get_session()
         if not session:
             return None
+        close_session = True
 
         try:
             start_time = time.time()
             if not query or not query.strip():
                 return {'answer': 'Please provide a valid search query.', 'sources': [], 'raw_results': []}
 
+            def record_metrics(synthesized_answer: str) -> None:
+                end_time = time.time()
+                output_token_count = context_budget.count_tokens(synthesized_answer)
+                memory_mb = Process().memory_info().rss / (1024 * 1024)
+                processing_time = int((end_time - start_time) * 1000)
+
+                statements.ANALYTICS_METRICS_INSERT.collect(
+                    session,
+                    str(uuid.uuid4()),
+                    filename or "multiple_docs",
+                    'SEARCH',
+                    query,
+                    'success',
+                    output_token_count,
+                    memory_mb,
+                    processing_time
+                )
+                MetricsRollups.refresh(session, wait=False)
+
+            # Repeated and reworded questions about a document are answered from the cache
+            variant = (limit, style, format_type, include_quotes, max_tokens, temperature, rerank)
+            with span("cache.lookup") as cache_span:
+                cached, cache_token = SemanticCache.lookup(session, query, filename, variant)
+                cache_span.set(hit=cached is not None)
+            if cached:
+                record_metrics(cached['answer'])
+                return dict(cached, cached=True)
+
             # Set proper context first
             session.sql("USE DATABASE TESTDB").collect()
             session.sql("USE SCHEMA MYSCHEMA").collect()
             session.sql("USE WAREHOUSE COMPUTE_WH").collect()
 
-            # Get page mapping if filename is provided
-            page_map = {}
-            if filename:
-                safe_filename = filename.replace("'", "''")
-                content_query = """
-                SELECT CONTENT, METADATA:page_number::INTEGER as PAGE_NUM
-                FROM RAG_DOCUMENTS_TMP
-                WHERE FILENAME = '{}'
-                ORDER BY PAGE_NUM
-                """.format(safe_filename)
-                all_pages = session.sql(content_query).collect()
-                page_map = {row['PAGE_NUM']: row['CONTENT'] for row in all_pages}
-
-            # Initialize cortex search service
-            root = Root(session)
-            search_service = root.databases["TESTDB"].schemas["MYSCHEMA"].cortex_search_services["MY_RAG_SEARCH_SERVICE"]
-            
-            filters = None
-            # Build simple search parameters focusing on basic search functionality
-            search_params = {
-                "query": query,
-                "columns": ["CONTENT", "FILENAME", "METADATA"],
-                "limit": limit,
-                "similarity_threshold": 0.5  # Lower threshold for better recall
-            }
-            
-            if filename:
-                #search_params["filters"] = "FILENAME = '{}'".format(safe_filename)
-                filters = "FILENAME = '{}'".format(safe_filename)
-                
-            print(f"Debug - Executing search with query: {query}")
-            print(f"Debug - Search parameters: {search_params}")
-            print(f"Debug - Filters: {filters}")
-            
-            # Execute search
-            resp = search_service.search(**search_params, filters=filters)
-            
-            # Debug search results
-            if resp.results:
-                print(f"Debug - Found {len(resp.results)} results")
-                for idx, result in enumerate(resp.results):
-                    print(f"Debug - Result {idx + 1} preview: {result['CONTENT'][:100]}...")
-                
-            # Execute search using cortex service
-            #resp = search_service.search(**search_params)
+            # Page numbers come back in the search results' METADATA, so no page lookup is needed here
+            # Identical searches from this page, the RAG pipeline and evaluation replays share one call
+            fetch_limit = reranking.candidate_count(limit) if rerank else limit
+            with span("retrieval", limit=fetch_limit, filtered=bool(filename), query=query[:200], filename=filename) as retrieval_span:
+                search_results = RetrievalCache.search(
+                    session, query, fetch_limit, filename, **retrieval_cache.SEARCH_OPTIONS
+                )
+                retrieval_span.set(
+                    results=len(search_results),
+                    previews=[(result['CONTENT'] or '')[:100] for result in search_results[:3]]
+                )
 
-            if not resp.results:
+            if not search_results:
                 return {'answer': 'No relevant results found.', 'sources': [], 'raw_results': []}
 
             # Process results
             processed_results = []
-            for idx, result in enumerate(resp.results):
+            for idx, result in enumerate(search_results):
                 try:
                     content = result['CONTENT'].strip() if result['CONTENT'] is not None else ""
                     result_filename = result.get('FILENAME', 'Unknown')
                     
                     # Get page number from metadata
-                    page_num = None
+                    page_num = page_end = None
                     if result['METADATA']:
                         try:
                             metadata = result['METADATA']
                             if isinstance(metadata, str):
                                 metadata = json.loads(metadata)
                             page_num = metadata.get('page_number')
+                            page_end = metadata.get('page_end')
                         except:
                             pass
                     
@@ -1349,6 +1133,7 @@ Please format the response with clear section headers and bullet points for read
                         'FILENAME': result_filename,
                         'CONTENT': content,
                         'PAGE_NUMBER': page_num or 1,
+                        'PAGE_END': max(page_end or 1, page_num or 1),
                         'SIMILARITY_SCORE': float(result['_SCORE']) if '_SCORE' in result else 0.0
                     })
                     
@@ -1356,33 +1141,40 @@ Please format the response with clear section headers and bullet points for read
                     print(f"Error processing result {idx}: {str(e)}")
                     continue
 
-            # Prepare context with length management
-            context_sections = []
-            total_length = 0
-            max_context_length = 32000  # Conservative limit
-            
-            for i, r in enumerate(processed_results):
-                section_header = f"Section {i+1} (Source: {r['FILENAME']}, Page {r['PAGE_NUMBER']})"
-                section_content = r['CONTENT']
-                
-                # Truncate long sections
-                if len(section_content) > 4000:
-                    section_content = section_content[:4000] + "..."
-                
-                section_text = f"{section_header}\n{section_content}"
-                
-                if total_length + len(section_text) > max_context_length:
-                    break
-                    
-                context_sections.append(section_text)
-                total_length += len(section_text)
-            
-            context = "\n\n".join(context_sections)
-
             # Get style and format instructions
             style_instr = SnowparkManager.STYLE_INSTRUCTIONS.get(style, "Provide detailed answers with supporting details.")
             format_instr = SnowparkManager.FORMAT_INSTRUCTIONS.get(format_type, "Format the response as paragraphs.")
 
+            # Keep the best few candidates so the prompt stays small; the question embedding is shared with the answer cache
+            if rerank and len(processed_results) > limit:
+                processed_results = reranking.rerank(
+                    query, processed_results, limit, session, SemanticCache.question_embedding(session, cache_token)
+                )
+
+            # Pack the best-scoring, non-overlapping sections into the model's token budget
+            with span("prompt.assemble") as prompt_span:
+                def page_label(r: Dict[str, Any]) -> str:
+                    # Chunks may span pages; cite the whole span
+                    if r['PAGE_END'] > r['PAGE_NUMBER']:
+                        return f"Pages {r['PAGE_NUMBER']}-{r['PAGE_END']}"
+                    return f"Page {r['PAGE_NUMBER']}"
+
+                def section_header(r: Dict[str, Any]) -> str:
+                    return f"Section (Source: {r['FILENAME']}, {page_label(r)})"
+
+                budget = context_budget.evidence_budget(
+                    'mistral-large2', max_tokens,
+                    context_budget.count_tokens(style_instr + format_instr + query)
+                )
+                packed, context_tokens = context_budget.pack_context(
+                    processed_results, budget, score_key='SIMILARITY_SCORE', header=section_header
+                )
+                context = "\n\n".join(
+                    f"Section {i+1} (Source: {r['FILENAME']}, {page_label(r)})\n{r['CONTENT']}"
+                    for i, r in enumerate(packed)
+                )
+                prompt_span.set(sections=len(packed), tokens=context_tokens, budget=budget)
+
             # Prepare system prompt
             system_prompt = f"""You are an AI assistant analyzing documents. Based on the context provided, answer the user's question.
             If you cannot find the relevant information in the context, clearly state that.
@@ -1393,78 +1185,114 @@ Please format the response with clear section headers and bullet points for read
             {context}
             """
 
-            # Generate LLM response
-            llm_query = """
-            SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                'mistral-large2',
-                ARRAY_CONSTRUCT(
-                    OBJECT_CONSTRUCT('role', 'system', 'content', '{system_prompt}'),
-                    OBJECT_CONSTRUCT('role', 'user', 'content', '{user_query}')
-                ),
-                OBJECT_CONSTRUCT(
-                    'temperature', {temperature},
-                    'max_tokens', {max_tokens}
+            sources = [{
+                'filename': r['FILENAME'],
+                'page': r['PAGE_NUMBER'],
+                'page_end': r['PAGE_END'],
+                'score': r['SIMILARITY_SCORE'],
+                'content': r['CONTENT'][:200] + '...' if len(r['CONTENT']) > 200 else r['CONTENT']
+            } for r in processed_results]
+
+            if stream:
+                def finish_stream(answer_stream):
+                    try:
+                        if answer_stream.completed:
+                            record_metrics(answer_stream.text)
+                            SemanticCache.store(session, cache_token, {
+                                'answer': answer_stream.text,
+                                'sources': sources,
+                                'raw_results': processed_results
+                            })
+                    finally:
+                        session.close()
+
+                answer_stream = llm_streaming.stream_completion(
+                    session, 'mistral-large2', system_prompt, query, temperature, max_tokens,
+                    on_complete=finish_stream
                 )
-            ) as response
-            """.format(
-                system_prompt=system_prompt.replace("'", "''"),
-                user_query=query.replace("'", "''"),
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+                close_session = False
+                return {
+                    'answer': None,
+                    'answer_stream': answer_stream,
+                    'sources': sources,
+                    'raw_results': processed_results
+                }
 
-            llm_response = session.sql(llm_query).collect()
-            synthesized_answer = SnowparkManager.process_llm_response(llm_response)
+            # Generate LLM response; identical questions in flight from other users share one call
+            with span("completion", model='mistral-large2', max_tokens=max_tokens):
+                synthesized_answer = LLMClient.complete(
+                    session, 'mistral-large2', system_prompt, query, temperature, max_tokens
+                ) or "Failed to generate response"
 
             # Record metrics
-            end_time = time.time()
-            output_token_count = len(synthesized_answer.split()) if synthesized_answer else 0
-            memory_mb = Process().memory_info().rss / (1024 * 1024)
-            processing_time = int((end_time - start_time) * 1000)
-
-            metrics_sql = f"""
-            INSERT INTO ANALYTICS_METRICS (
-                METRIC_ID,
-                TIMESTAMP,
-                DOCUMENT_NAME,
-                ACTION_TYPE,
-                USER_QUERY,
-                STATUS,
-                TOKEN_COUNT,
-                MEMORY_USAGE_MB,
-                RESPONSE_TIME_MS
-            ) VALUES (
-                '{str(uuid.uuid4())}',
-                CURRENT_TIMESTAMP(),
-                '{(filename or "multiple_docs").replace("'", "''")}',
-                'SEARCH',
-                '{query.replace("'", "''")}',
-                'success',
-                {output_token_count},
-                {memory_mb},
-                {processing_time}
-            )
-            """
-            session.sql(metrics_sql).collect()
+            record_metrics(synthesized_answer)
 
-            return {
+            result = {
                 'answer': synthesized_answer,
-                'sources': [{
-                    'filename': r['FILENAME'],
-                    'page': r['PAGE_NUMBER'],
-                    'score': r['SIMILARITY_SCORE'],
-                    'content': r['CONTENT'][:200] + '...' if len(r['CONTENT']) > 200 else r['CONTENT']
-                } for r in processed_results],
+                'sources': sources,
                 'raw_results': processed_results
             }
+            if synthesized_answer != "Failed to generate response":
+                SemanticCache.store(session, cache_token, result)
+            return result
 
         except Exception as e:
             st.error(f"❌ Search failed: {str(e)}")
             return None
         finally:
-            if session:
+            # A streamed answer closes the session once the stream finishes
+            if session and close_session:
                 session.close()
             
+    @staticmethod
+    def _indexed_similar_books(session, current_book: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rows shaped like RAG_SIMILAR_BOOKS from the local ANN index: books whose
+        closest chunk is nearest the current book's mean chunk embedding, plus
+        the category boost. None when the index cannot answer, so the caller
+        falls back to SQL.
+        """
+        index = ann_index.get_index()
+        if index is None:
+            return None
+        ann_index.refresh_async(SnowparkManager.get_session)
+        store = index.store
+        own_rows = [store.row(doc_id) for doc_id in store.ids_with_label(current_book)]
+        if not own_rows:
+            return None
+
+        with span("recommendations.ann", chunks=len(own_rows)):
+            query = store.vectors(sorted(own_rows)).mean(axis=0)
+            best: Dict[str, float] = {}
+            hits = limit * SnowparkManager.RECOMMENDATION_HITS_PER_BOOK
+            while True:
+                # The book's own chunks are skipped; other books have several chunks each,
+                # so widen the search until enough distinct books appear
+                for doc_id, score in index.search(query, k=hits, exclude_label=current_book):
+                    filename = store.label(doc_id)
+                    if filename:
+                        best[filename] = max(score, best.get(filename, -1.0))
+                if len(best) >= limit or hits >= min(len(store), SnowparkManager.MAX_RECOMMENDATION_HITS):
+                    break
+                hits *= 2
+
+            metadata = {
+                row['FILENAME']: row for row in
+                statements.BOOK_METADATA_BY_FILENAMES.collect(session, json_param([current_book] + list(best)))
+            }
+        if current_book not in metadata:
+            return None
+        category = metadata[current_book]['CATEGORY']
+        books = []
+        for filename, score in best.items():
+            row = metadata.get(filename)
+            if row is None:
+                continue
+            boost = SnowparkManager.RECOMMENDATION_CATEGORY_BOOST if row['CATEGORY'] == category else 0.0
+            books.append(dict(row.as_dict(), TOTAL_SCORE=score + boost))
+        books.sort(key=lambda book: -book['TOTAL_SCORE'])
+        return books[:limit]
+
     @staticmethod
     def get_book_recommendations(current_book: str, recommendation_type: str = "content", limit: int = 3) -> List[Dict]:
         """
@@ -1477,51 +1305,13 @@ Please format the response with clear section headers and bullet points for read
                 print("Failed to establish database session")
                 return []
 
-            # Get current book's metadata and find similar books
-            safe_book_name = current_book.replace("'", "''")
-            similar_books_query = f"""
-            WITH current_book AS (
-                SELECT 
-                    m.FILENAME,
-                    m.CATEGORY,
-                    r.EMBEDDING
-                FROM TESTDB.MYSCHEMA.BOOK_METADATA m
-                JOIN TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP r ON m.FILENAME = r.FILENAME
-                WHERE m.FILENAME = '{safe_book_name}'
-                LIMIT 1
-            ),
-            similarity_scores AS (
-                SELECT DISTINCT  -- Add DISTINCT to remove duplicates
-                    FIRST_VALUE(m.FILENAME) OVER (PARTITION BY m.FILENAME ORDER BY r.CREATED_AT DESC) as FILENAME,
-                    FIRST_VALUE(m.CATEGORY) OVER (PARTITION BY m.FILENAME ORDER BY r.CREATED_AT DESC) as CATEGORY,
-                    FIRST_VALUE(m.DATE_ADDED) OVER (PARTITION BY m.FILENAME ORDER BY r.CREATED_AT DESC) as DATE_ADDED,
-                    FIRST_VALUE(m.SIZE) OVER (PARTITION BY m.FILENAME ORDER BY r.CREATED_AT DESC) as SIZE,
-                    CASE 
-                        WHEN m.CATEGORY = (SELECT CATEGORY FROM current_book) THEN 0.2
-                        ELSE 0
-                    END as category_boost,
-                    VECTOR_COSINE_SIMILARITY(
-                        r.EMBEDDING,
-                        (SELECT EMBEDDING FROM current_book)
-                    ) as content_similarity
-                FROM TESTDB.MYSCHEMA.BOOK_METADATA m
-                JOIN TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP r ON m.FILENAME = r.FILENAME
-                WHERE m.FILENAME != '{safe_book_name}'
-            )
-            SELECT DISTINCT  -- Additional DISTINCT for safety
-                FILENAME,
-                CATEGORY,
-                DATE_ADDED,
-                SIZE,
-                MAX(content_similarity + category_boost) as total_score
-            FROM similarity_scores
-            GROUP BY FILENAME, CATEGORY, DATE_ADDED, SIZE
-            ORDER BY total_score DESC
-            LIMIT {limit}
-            """
-            
-            print("Executing similar books query...")
-            similar_books = session.sql(similar_books_query).collect()
+            similar_books = SnowparkManager._indexed_similar_books(session, current_book, limit)
+            if similar_books is None:
+                # Get current book's metadata and find similar books
+                print("Executing similar books query...")
+                similar_books = statements.RAG_SIMILAR_BOOKS.format(limit=int(limit)).collect(
+                    session, current_book, current_book
+                )
 
             if not similar_books:
                 print("No similar books found")
@@ -1555,6 +1345,77 @@ Please format the response with clear section headers and bullet points for read
          
          
                 
+    @staticmethod
+    @traced("summary.finish")
+    def _finish_summary(
+        session,
+        filename: str,
+        generated_summary: str,
+        page_count: int,
+        style: str,
+        format_type: str,
+        max_tokens: int,
+        start_time: float
+    ) -> Dict[str, Any]:
+        """Record metrics and run the TruLens evaluation for a generated summary"""
+        # Initialize the summary dictionary
+        summary = {
+            'summary': generated_summary,
+            'filename': filename,
+            'page_count': page_count,
+            'status': 'success'
+        }
+
+         # Record metrics for summary generation
+        token_count = context_budget.count_tokens(generated_summary)
+        finish_span = current_span()
+        finish_span.set(filename=filename, page_count=page_count, token_count=token_count)
+
+        # Record metrics for summary generation
+        #token_count = len(generated_summary.split())  # Estimate token count
+        end_time = time.time()
+        memory_mb = psutil.Process().memory_info().rss / (1024 * 1024)  # Calculate memory in MB
+        processing_time = int((end_time - start_time) * 1000)  # Calculate time in ms
+
+        statements.ANALYTICS_METRICS_INSERT.collect(
+            session, str(uuid.uuid4()), filename, 'SUMMARY', None,
+            'success', token_count, memory_mb, processing_time
+        )
+        MetricsRollups.refresh(session, wait=False)
+
+        from truelens_utils import TruLensEvaluator
+
+        st.session_state.trulens_evaluator = TruLensEvaluator()
+        finish_span.set(
+            evaluator=type(st.session_state.trulens_evaluator).__name__,
+            evaluator_initialized=bool(getattr(st.session_state.trulens_evaluator, 'initialized', False))
+        )
+
+        # TruLens evaluation
+        if (hasattr(st.session_state, 'trulens_evaluator') and 
+            st.session_state.trulens_evaluator and 
+            st.session_state.trulens_evaluator.initialized):
+
+            #contexts = [{"CONTENT": row['CONTENT']} for row in results] if results else []
+
+            eval_results = st.session_state.trulens_evaluator.evaluate_rag_pipeline(
+                query="Generate a summary of this document",
+                filename = filename,
+                response=generated_summary,
+                operation_type="SUMMARY",
+                style=style,
+                format_type=format_type,
+                output_token_count=max_tokens
+            )
+
+            # Handle the new return format
+            if eval_results and eval_results.get('status') == 'success':
+                summary['dashboard_url'] = eval_results.get('dashboard_url')
+            finish_span.set(evaluation=eval_results.get('status') if eval_results else None)
+
+        return summary
+
+
     @instrument 
     def get_document_summary(
         filename: str,
@@ -1562,26 +1423,40 @@ Please format the response with clear section headers and bullet points for read
         format_type: str = "Structured",
         max_tokens: int = 1000,
         include_key_points: bool = True,
-        operation_type: str = "SUMMARY"  # Add operation type parameter
+        operation_type: str = "SUMMARY",  # Add operation type parameter
+        stream: bool = False
     ) -> Optional[Dict[str, Any]]:
-        """Generate a comprehensive summary of a specific document with customizable options"""
-        print("\n=== Debug: Starting Document Summary Generation ===")
-        print(f"Filename: {filename}")
-        print(f"Style: {style}")
-        print(f"Format: {format_type}")
+        """
+        Generate a comprehensive summary of a specific document with customizable options.
+        With stream=True the final pass is returned as 'summary_stream' instead of 'summary'.
+        """
+        with span("summary.request", filename=filename, style=style, format_type=format_type, stream=stream):
+            return SnowparkManager._document_summary(
+                filename, style, format_type, max_tokens, include_key_points, operation_type, stream
+            )
+
+    @staticmethod
+    def _document_summary(
+        filename: str,
+        style: str,
+        format_type: str,
+        max_tokens: int,
+        include_key_points: bool,
+        operation_type: str,
+        stream: bool
+    ) -> Optional[Dict[str, Any]]:
+        """Body of get_document_summary, run inside its summary.request span"""
         session = SnowparkManager.get_session()
         if not session:
             return None
+        close_session = True
 
         try:
             start_time = time.time()
-            escaped_filename = filename.replace("'", "''")
-            count_query = f"""
-            SELECT COUNT(*) as total_pages
-            FROM {SnowparkManager.RAG_TABLE}
-            WHERE FILENAME = '{escaped_filename}'  
-            """
-            page_count = session.sql(count_query).collect()[0]['TOTAL_PAGES']
+            # All pages are read once and batched locally instead of one LIMIT/OFFSET query per batch
+            with span("retrieval"):
+                pages = statements.RAG_PAGES_BY_FILENAME.collect(session, filename)
+            page_count = len(pages)
 
             if page_count == 0:
                 return {
@@ -1610,33 +1485,7 @@ Please format the response with clear section headers and bullet points for read
                 "Narrative": "Present the summary as a flowing narrative with clear paragraph transitions."
             }
 
-            batch_size = 5
-            num_batches = (page_count + batch_size - 1) // batch_size
-            all_summaries = []
-
-            for batch in range(num_batches):
-                start_page = batch * batch_size
-                
-                batch_query = f"""
-                SELECT 
-                    CONTENT,
-                    METADATA:page_number::INTEGER as PAGE_NUMBER
-                FROM {SnowparkManager.RAG_TABLE}
-                WHERE FILENAME = '{escaped_filename}'  
-                ORDER BY PAGE_NUMBER
-                LIMIT {batch_size} OFFSET {start_page}
-                """
-
-                batch_results = session.sql(batch_query).collect()
-                if not batch_results:
-                    continue
-
-                batch_content = ""
-                for row in batch_results:
-                    page_num = row['PAGE_NUMBER'] or 'N/A'
-                    batch_content += f"[Page {page_num}]\n{row['CONTENT']}\n\n"
-
-                system_prompt = f"""
+            system_prompt = f"""
                 You are an expert document analyzer creating summaries.
                 {style_instructions[style]}
                 {format_instructions[format_type]}
@@ -1644,50 +1493,54 @@ Please format the response with clear section headers and bullet points for read
                 Focus on maintaining accuracy and coherence.
                 """
 
-                llm_query = f"""
-                SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                    'mistral-large',
-                    ARRAY_CONSTRUCT(
-                        OBJECT_CONSTRUCT(
-                            'role', 'system',
-                            'content', '{system_prompt}'
-                        ),
-                        OBJECT_CONSTRUCT(
-                            'role', 'user',
-                            'content', 'Summarize this section:\n{batch_content.replace("'", "''")}'
-                        )
-                    ),
-                    OBJECT_CONSTRUCT(
-                        'temperature', 0.3,
-                        'max_tokens', {max_tokens // num_batches}
+            # Batches are cut by token count, and each asks for output in proportion to its input,
+            # sized so that all batch summaries fit the final pass
+            page_chunks = [{'PAGE_NUM': row['PAGE_NUM'], 'CONTENT': row['CONTENT'] or ""} for row in pages]
+            batches = context_budget.pack_batches(page_chunks, context_budget.SUMMARY_BATCH_TOKENS)
+            reduce_budget = context_budget.evidence_budget(
+                'mistral-large', max_tokens, context_budget.count_tokens(system_prompt),
+                cap=context_budget.context_window('mistral-large')
+            )
+
+            batch_calls = []
+            for batch_results in batches:
+                batch_content = ""
+                for row in batch_results:
+                    page_num = row['PAGE_NUM'] or 'N/A'
+                    batch_content += f"[Page {page_num}]\n{row['CONTENT']}\n\n"
+                batch_tokens = context_budget.batch_output_tokens(
+                    context_budget.count_tokens(batch_content), reduce_budget, len(batches)
+                )
+                batch_calls.append(LLMClient.acomplete(
+                    session, 'mistral-large', system_prompt, f"Summarize this section:\n{batch_content}", 0.3, batch_tokens
+                ))
+
+            # Batch summaries are independent, so they run concurrently through the shared client
+            with span("completion", model='mistral-large', batches=len(batch_calls)) as batch_span:
+                batch_summaries = LLMClient.run_all(batch_calls)
+                all_summaries = [batch_summary for batch_summary in batch_summaries if batch_summary]
+                batch_span.set(summaries=len(all_summaries))
+
+            # With too many batches their summaries overflow the final prompt even at the
+            # minimum length, so consecutive summaries are combined again in tiers first
+            for tier in range(context_budget.MAX_REDUCE_TIERS):
+                groups = context_budget.reduce_groups(all_summaries, reduce_budget)
+                if groups is None:
+                    break
+                group_calls = []
+                for group in groups:
+                    group_content = "\n\n".join(group)
+                    group_tokens = context_budget.batch_output_tokens(
+                        context_budget.count_tokens(group_content), reduce_budget, len(groups)
                     )
-                )::string as RESPONSE;
-                """
+                    group_calls.append(LLMClient.acomplete(
+                        session, 'mistral-large', system_prompt,
+                        f"Combine these consecutive section summaries:\n{group_content}", 0.3, group_tokens
+                    ))
+                with span("completion", model='mistral-large', tier=tier + 1, batches=len(group_calls)) as tier_span:
+                    all_summaries = [group_summary for group_summary in LLMClient.run_all(group_calls) if group_summary]
+                    tier_span.set(summaries=len(all_summaries))
 
-                batch_response = session.sql(llm_query).collect()
-                
-                if batch_response and batch_response[0]['RESPONSE']:
-                    try:
-                        response_data = json.loads(batch_response[0]['RESPONSE'])
-                        if isinstance(response_data, dict) and 'choices' in response_data:
-                            if isinstance(response_data['choices'][0], dict):
-                                if 'messages' in response_data['choices'][0]:
-                                    batch_summary = response_data['choices'][0]['messages']
-                                elif 'message' in response_data['choices'][0]:
-                                    batch_summary = response_data['choices'][0]['message'].get('content', '')
-                                else:
-                                    batch_summary = str(response_data['choices'][0])
-                            else:
-                                batch_summary = str(response_data['choices'][0])
-                        else:
-                            batch_summary = str(response_data)
-                    except json.JSONDecodeError:
-                        batch_summary = batch_response[0]['RESPONSE'].strip()
-                    
-                    if batch_summary:
-                        all_summaries.append(batch_summary)
-                        
-            print("before if all_summaries")
             if all_summaries:
                 combined_summaries = "\n\n".join(all_summaries)
                 
@@ -1700,156 +1553,41 @@ Please format the response with clear section headers and bullet points for read
                 {combined_summaries}
                 """
 
-                final_query = f"""
-                SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                    'mistral-large',
-                    ARRAY_CONSTRUCT(
-                        OBJECT_CONSTRUCT(
-                            'role', 'system',
-                            'content', '{style_instructions[style]}'
-                        ),
-                        OBJECT_CONSTRUCT(
-                            'role', 'user',
-                            'content', '{final_prompt.replace("'", "''")}'
-                        )
-                    ),
-                    OBJECT_CONSTRUCT(
-                        'temperature', 0.3,
-                        'max_tokens', {max_tokens}
+                if stream:
+                    # Batch summaries are done; the final pass streams while the page renders
+                    def finish_stream(summary_stream):
+                        try:
+                            if summary_stream.completed and summary_stream.text:
+                                SnowparkManager._finish_summary(
+                                    session, filename, summary_stream.text, page_count,
+                                    style, format_type, max_tokens, start_time
+                                )
+                        finally:
+                            session.close()
+
+                    summary_stream = llm_streaming.stream_completion(
+                        session, 'mistral-large', style_instructions[style], final_prompt, 0.3, max_tokens,
+                        on_complete=finish_stream
                     )
-                )::string as RESPONSE;
-                """
-                print("before final_response")
-                final_response = session.sql(final_query).collect()
-
-                if final_response and final_response[0]['RESPONSE']:
-                    try:
-                        response_data = json.loads(final_response[0]['RESPONSE'])
-                        if isinstance(response_data, dict) and 'choices' in response_data:
-                            if isinstance(response_data['choices'][0], dict):
-                                if 'messages' in response_data['choices'][0]:
-                                    generated_summary = response_data['choices'][0]['messages']
-                                elif 'message' in response_data['choices'][0]:
-                                    generated_summary = response_data['choices'][0]['message'].get('content', '')
-                                else:
-                                    generated_summary = str(response_data['choices'][0])
-                            else:
-                                generated_summary = str(response_data['choices'][0])
-                        else:
-                            generated_summary = str(response_data)
-                    except json.JSONDecodeError:
-                        generated_summary = final_response[0]['RESPONSE'].strip()
-                    
-                    # Initialize the summary dictionary
-                    summary = {
-                        'summary': generated_summary,
+                    close_session = False
+                    return {
+                        'summary': None,
+                        'summary_stream': summary_stream,
                         'filename': filename,
                         'page_count': page_count,
-                        'status': 'success'
+                        'status': 'streaming'
                     }
-                    
-                    # After getting the query results
-                    query = f"""
-                    SELECT CONTENT, METADATA:page_number::INTEGER as PAGE_NUM
-                    FROM RAG_DOCUMENTS_TMP
-                    WHERE FILENAME = '{filename.replace("'", "''")}' 
-                    ORDER BY PAGE_NUM
-                    """
-                    results = session.sql(query).collect()
-                    
-                     # Record metrics for summary generation
-                    token_count = len(generated_summary.split())  # Estimate token count
-                    print("token_count: {Token_count}")
-                    
-                    # Record metrics for summary generation
-                    #token_count = len(generated_summary.split())  # Estimate token count
-                    end_time = time.time()
-                    memory_mb = psutil.Process().memory_info().rss / (1024 * 1024)  # Calculate memory in MB
-                    processing_time = int((end_time - start_time) * 1000)  # Calculate time in ms
-                    
-                    metrics_sql = f"""
-                    INSERT INTO ANALYTICS_METRICS (
-                        METRIC_ID,
-                        TIMESTAMP,
-                        DOCUMENT_NAME,
-                        ACTION_TYPE,
-                        STATUS,
-                        TOKEN_COUNT,
-                        MEMORY_USAGE_MB,
-                        RESPONSE_TIME_MS
-                    ) VALUES (
-                        '{str(uuid.uuid4())}',
-                        CURRENT_TIMESTAMP(),
-                        '{filename.replace("'", "''")}',
-                        'SUMMARY',
-                        'success',
-                        {token_count},
-                        {memory_mb},
-                        {processing_time}
+
+                with span("completion", model='mistral-large', final=True):
+                    generated_summary = LLMClient.complete(
+                        session, 'mistral-large', style_instructions[style], final_prompt, 0.3, max_tokens
+                    )
+
+                if generated_summary:
+                    return SnowparkManager._finish_summary(
+                        session, filename, generated_summary, page_count,
+                        style, format_type, max_tokens, start_time
                     )
-                    """
-                    session.sql(metrics_sql).collect() 
-                 
-                    # Store results before processing
-                    # document_results = results
-                    print("Debug: Summary generated, proceeding to evaluation")
-                    
-                    from truelens_utils import TruLensEvaluator
-                
-                    st.session_state.trulens_evaluator = TruLensEvaluator()
-                    print("Debug: Created new TruLens evaluator")
-                    
-                     # Debug TruLens evaluator status
-                    print("\n=== Debug: Checking TruLens Evaluator Status ===")
-                    print(f"Has trulens_evaluator attribute: {hasattr(st.session_state, 'trulens_evaluator')}")
-                    print(f"Evaluator object exists: {bool(st.session_state.get('trulens_evaluator'))}")
-                    if hasattr(st.session_state, 'trulens_evaluator'):
-                        print(f"Evaluator initialized: {getattr(st.session_state.trulens_evaluator, 'initialized', False)}")
-                    
-                    # TruLens evaluation
-                    # Debug TruLens evaluator status in detail
-                    print("\n=== TruLens Evaluator Status Check ===")
-                    
-                    # Check 1: Does the attribute exist?
-                    has_attr = hasattr(st.session_state, 'trulens_evaluator')
-                    print(f"1. Has trulens_evaluator attribute: {has_attr}")
-                    
-                    # Check 2: Is the evaluator object not None?
-                    evaluator_exists = bool(st.session_state.get('trulens_evaluator'))
-                    print(f"2. Evaluator object exists: {evaluator_exists}")
-                    
-                    # Check 3: Is it initialized?
-                    if evaluator_exists:
-                        is_initialized = getattr(st.session_state.trulens_evaluator, 'initialized', False)
-                        print(f"3. Evaluator initialized: {is_initialized}")
-                        print(f"4. Evaluator type: {type(st.session_state.trulens_evaluator)}")
-                        print(f"5. Evaluator attributes: {dir(st.session_state.trulens_evaluator)}")
-                    else:
-                        print("3. Can't check initialization - evaluator doesn't exist")
-        
-                    # Now do TruLens evaluation
-                    if (hasattr(st.session_state, 'trulens_evaluator') and 
-                        st.session_state.trulens_evaluator and 
-                        st.session_state.trulens_evaluator.initialized):
-                        
-                        #contexts = [{"CONTENT": row['CONTENT']} for row in results] if results else []
-                           
-                        eval_results = st.session_state.trulens_evaluator.evaluate_rag_pipeline(
-                            query="Generate a summary of this document",
-                            filename = filename,
-                            response=generated_summary,
-                            operation_type="SUMMARY",
-                            style=style,
-                            format_type=format_type,
-                            output_token_count=max_tokens
-                        )
-                        
-                        # Handle the new return format
-                        if eval_results and eval_results.get('status') == 'success':
-                            summary['dashboard_url'] = eval_results.get('dashboard_url')
-                    
-                    print("Debug: Returning final summary with evaluation")
-                    return summary
                     
             
         except Exception as e:
@@ -1861,7 +1599,9 @@ Please format the response with clear section headers and bullet points for read
                 'status': 'error'
             }
         finally:
-            session.close()          
+            # A streamed summary closes the session once the stream finishes
+            if close_session:
+                session.close()
         
 
 
@@ -1873,19 +1613,12 @@ Please format the response with clear section headers and bullet points for read
             return False
 
         try:
-            delete_query = f"""
-            DELETE FROM {SnowparkManager.RAG_TABLE}
-            WHERE FILENAME = '{filename.replace("'", "''")}'
-            """
-            session.sql(delete_query).collect()
+            statements.RAG_DELETE_BY_FILENAME.collect(session, filename)
+            SnowparkManager.invalidate_document_caches(filename)
             return True
             
             
-            delete_metadata_query = f"""
-            DELETE FROM BOOK_METADATA
-            WHERE FILENAME = '{filename.replace("'", "''")}'
-            """
-            session.sql(delete_metadata_query).collect()
+            statements.BOOK_METADATA_DELETE_BY_FILENAME.collect(session, filename)
             
 
         except Exception as e:
@@ -0,0 +1,160 @@
+"""
+Approximate nearest-neighbour recall and latency benchmark.
+
+Fills a vector_store.VectorStore in a temporary directory with synthetic
+clustered embeddings (chunks of the same book sit near a shared topic
+vector), builds an ann_index.IVFIndex over it and compares, per library
+size:
+  - exact:     a full scan of the store's compact codes with float32 rescoring
+  - nprobe=N:  the IVF index probing N inverted lists
+"recall@k" is the share of the exact top k the index returns; "scan MB" is
+the compact code memory a full scan touches. Queries are noisy copies of
+random chunks, like a book's mean embedding looking for its neighbours.
+After the timed runs a share of the library is deleted and re-added to
+report recall with tombstones and incremental inserts, then after rebuild().
+
+Usage:
+    python benchmarks/ann_recall.py
+    python benchmarks/ann_recall.py --sizes 10000,100000,1000000 --nprobe 8,16,32
+    python benchmarks/ann_recall.py --dtype float16 --k 20 --json ann.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Sequence, Set
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+import vector_store  # noqa: E402
+from ann_index import IVFIndex  # noqa: E402
+
+PERCENTILES = (50, 95)
+# Vectors generated and added per step, to bound memory for large libraries
+ADD_BATCH = 50000
+CHUNKS_PER_BOOK = 200
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def fill_store(store: vector_store.VectorStore, size: int, dims: int, seed: int) -> None:
+    """Chunks around one of size / CHUNKS_PER_BOOK topics, labelled with their book"""
+    rng = np.random.default_rng(seed)
+    books = max(1, size // CHUNKS_PER_BOOK)
+    topics = rng.normal(size=(books, dims)).astype(np.float32)
+    for start in range(0, size, ADD_BATCH):
+        count = min(ADD_BATCH, size - start)
+        book = rng.integers(0, books, count)
+        vectors = topics[book] + 0.9 * rng.normal(size=(count, dims)).astype(np.float32)
+        store.add([str(start + i) for i in range(count)], vectors, [f"book{b}.pdf" for b in book.tolist()])
+
+
+def make_queries(store: vector_store.VectorStore, count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(store.rows, count, replace=False))
+    return store.vectors(rows) + 0.03 * rng.normal(size=(count, store.dims)).astype(np.float32)
+
+
+def run(search, queries: np.ndarray, k: int, truth: List[Set[str]]) -> Dict[str, Any]:
+    timings: List[float] = []
+    found = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids = {doc_id for doc_id, _ in search(query, k)}
+        timings.append((time.perf_counter() - start) * 1000)
+        found += len(ids & expected)
+    return {
+        "latency_ms": {f"p{p}": round(percentile(timings, p), 3) for p in PERCENTILES},
+        "recall_at_k": round(found / (k * len(queries)), 4),
+    }
+
+
+def print_row(size: int, name: str, report: Dict[str, Any]) -> None:
+    print(f"{size:>10}  {name:<12}" + "".join(f"{report['latency_ms']['p' + str(p)]:>10.2f}" for p in PERCENTILES)
+          + f"{report['recall_at_k']:>10.3f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,50000,200000", help="Comma separated library sizes in chunks")
+    parser.add_argument("--dims", type=int, default=vector_store.DEFAULT_DIMS, help="Embedding dimensions")
+    parser.add_argument("--dtype", default="int8", choices=vector_store.DTYPES, help="Code type of the store")
+    parser.add_argument("--nprobe", default="4,16,32", help="Comma separated lists probed per query")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per library size")
+    parser.add_argument("--churn", type=float, default=0.1, help="Share of the library deleted and re-added after timing")
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    probes = [int(p) for p in args.nprobe.split(",")]
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'chunks':>10}  {'search':<12}" + "".join(f"{'p' + str(p) + ' ms':>10}" for p in PERCENTILES)
+          + f"{'recall@k':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        path = tempfile.mkdtemp(prefix="ann_recall_")
+        try:
+            store = vector_store.VectorStore(path, dims=args.dims, dtype=args.dtype)
+            fill_store(store, size, args.dims, seed=size)
+            start = time.perf_counter()
+            index = IVFIndex(store)
+            index.build()
+            report: Dict[str, Any] = {
+                "build_s": round(time.perf_counter() - start, 2),
+                "lists": len(index.centroids),
+                "scan_mb": round(store.stats()['scan_bytes'] / 2 ** 20, 1),
+            }
+            queries = make_queries(store, args.queries, seed=size + 1)
+            truth = [{doc_id for doc_id, _ in store.search(q, args.k)} for q in queries]
+            report["exact"] = run(store.search, queries, args.k, truth)
+            print_row(size, "exact", report["exact"])
+            for nprobe in probes:
+                report[f"nprobe={nprobe}"] = run(lambda q, k: index.search(q, k, nprobe=nprobe), queries, args.k, truth)
+                print_row(size, f"nprobe={nprobe}", report[f"nprobe={nprobe}"])
+
+            # Delete a share of the books and add them back as new rows
+            books = sorted({store.label(str(i)) for i in range(0, size, CHUNKS_PER_BOOK)})
+            churned = books[:max(1, int(len(books) * args.churn))]
+            for book in churned:
+                ids = sorted(store.ids_with_label(book), key=store.row)
+                vectors = store.vectors([store.row(i) for i in ids])
+                store.remove_label(book)
+                store.add(ids, vectors, [book] * len(ids))
+            truth = [{doc_id for doc_id, _ in store.search(q, args.k)} for q in queries]
+            nprobe = probes[len(probes) // 2]
+            report["churned"] = run(lambda q, k: index.search(q, k, nprobe=nprobe), queries, args.k, truth)
+            report["churned"]["tombstones"] = index.tombstones()
+            print_row(size, "churned", report["churned"])
+            start = time.perf_counter()
+            index.rebuild()
+            report["rebuild_s"] = round(time.perf_counter() - start, 2)
+            report["rebuilt"] = run(lambda q, k: index.search(q, k, nprobe=nprobe), queries, args.k, truth)
+            print_row(size, "rebuilt", report["rebuilt"])
+            print(f"{'':>10}  build {report['build_s']}s, rebuild {report['rebuild_s']}s, "
+                  f"{report['lists']} lists, scan {report['scan_mb']} MB")
+            results[str(size)] = report
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"\nReport written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,662 @@
+"""
+Local stand-in for the Snowflake backend used by the benchmark harnesses.
+
+FakeSession mimics the small part of the Snowpark Session API the app uses
+(`sql(...).collect()`, `close()`) on top of an in-memory SQLite database
+seeded with a synthetic library, so pages can be rendered headlessly without
+credentials or network access.
+
+FakeCortex stands in for SNOWFLAKE.CORTEX.COMPLETE / EMBED_TEXT_768, the
+streaming Cortex REST endpoint and the Cortex Search service with
+deterministic output and configurable latency.
+Every statement is timed per stage so benchmarks can break latency down.
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS BOOK_METADATA (
+        BOOK_ID TEXT, FILENAME TEXT, CATEGORY TEXT, DATE_ADDED TEXT,
+        SIZE REAL, USAGE_STATS TEXT, THUMBNAIL TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RAG_DOCUMENTS_TMP (
+        DOC_ID TEXT, FILENAME TEXT, FILE_TYPE TEXT, CONTENT TEXT,
+        EMBEDDING TEXT, METADATA TEXT, CREATED_AT TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RAG_METADATA (
+        DOC_ID TEXT, FILENAME TEXT, FILE_TYPE TEXT, BINARY_CONTENT BLOB,
+        METADATA TEXT, CREATED_AT TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ANALYTICS_METRICS (
+        METRIC_ID TEXT, TIMESTAMP TEXT, DOCUMENT_NAME TEXT, ACTION_TYPE TEXT,
+        USER_QUERY TEXT, STATUS TEXT, TOKEN_COUNT INTEGER, MEMORY_USAGE_MB REAL,
+        RESPONSE_TIME_MS INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS TRULENS_METRICS (
+        METRIC_ID TEXT, TIMESTAMP TEXT, OPERATION_TYPE TEXT, STYLE TEXT, FORMAT_TYPE TEXT,
+        OUTPUT_TOKEN_COUNT INTEGER, CONTEXT_RELEVANCE REAL, RELEVANCE_SCORE REAL,
+        GROUNDEDNESS_SCORE REAL, COHERENCE_SCORE REAL, SOURCE_DIVERSITY_SCORE REAL,
+        FLUENCY_SCORE REAL, TOKEN_EFFICIENCY REAL
+    )
+    """,
+]
+
+FAKE_SECRETS = {
+    "snowflake_account": "local",
+    "snowflake_user": "benchmark",
+    "snowflake_password": "unused",
+    "snowflake_warehouse": "LOCAL_WH",
+    "snowflake_database": "TESTDB",
+    "snowflake_schema": "MYSCHEMA",
+    "snowflake_role": "LOCAL",
+}
+
+
+# SELECTs with no FROM clause (single Cortex calls) run outside the session lock
+_TABLE_FREE = re.compile(r"^\s*SELECT\b(?!.*\bFROM\b)", re.I | re.S)
+ASYNC_JOB_WORKERS = 16
+
+# Snowflake syntax rewritten before a statement reaches SQLite
+_TRANSLATIONS = [
+    (re.compile(r"TESTDB\.MYSCHEMA\.", re.I), ""),
+    (re.compile(r"SNOWFLAKE\.CORTEX\.EMBED_TEXT_768\s*\(", re.I), "CORTEX_EMBED("),
+    (re.compile(r"SNOWFLAKE\.CORTEX\.(\w+)\s*\(", re.I), r"CORTEX_\1("),
+    (re.compile(r"\bCURRENT_TIMESTAMP\(\)", re.I), "CURRENT_TIMESTAMP"),
+    # SQLite string literals have no backslash escapes
+    (re.compile(r"' \\n\\r\\t'"), "' ' || char(10) || char(13) || char(9)"),
+    (re.compile(r"TABLE\s*\(\s*FLATTEN\s*\(\s*INPUT\s*=>\s*PARSE_JSON\s*\(\s*\?\s*\)\s*\)\s*\)", re.I), "json_each(?)"),
+    (re.compile(r"\bAS\s+VECTOR\s*\(\s*FLOAT\s*,\s*\d+\s*\)", re.I), "AS TEXT"),
+    (re.compile(r"\b(METADATA|USAGE_STATS):(\w+)", re.I), r"json_extract(\1, '$.\2')"),
+    (re.compile(r"::(INTEGER|INT|NUMBER|FLOAT|STRING|VARCHAR|TEXT|VARIANT|ARRAY|DATE|TIMESTAMP\w*|BOOLEAN)\b", re.I), ""),
+]
+
+STAGES = ("setup", "retrieval", "search", "embed", "llm", "metrics_write", "other")
+
+
+def classify(query: str) -> str:
+    """Benchmark stage a statement belongs to"""
+    upper = query.upper()
+    if "CORTEX.COMPLETE" in upper:
+        return "llm"
+    if "EMBED_TEXT" in upper:
+        return "embed"
+    stripped = upper.strip()
+    if stripped.startswith(("USE ", "ALTER ")):
+        return "setup"
+    if "ANALYTICS_METRICS" in upper or "TRULENS_METRICS" in upper or "ANALYTICS_ROLLUPS" in upper:
+        return "metrics_write" if not stripped.startswith(("SELECT", "WITH")) else "other"
+    if "RAG_DOCUMENTS_TMP" in upper:
+        return "retrieval"
+    return "other"
+
+
+def _json_arg(value: Any) -> Any:
+    # Nested ARRAY_CONSTRUCT / OBJECT_CONSTRUCT results arrive as JSON text
+    if isinstance(value, str) and value[:1] in "[{":
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _object_construct(*args: Any) -> str:
+    return json.dumps({args[i]: _json_arg(args[i + 1]) for i in range(0, len(args) - 1, 2)})
+
+
+def _array_construct(*args: Any) -> str:
+    return json.dumps([_json_arg(a) for a in args])
+
+
+def _cosine(a: Optional[str], b: Optional[str]) -> Optional[float]:
+    if a is None or b is None:
+        return None
+    va, vb = json.loads(a), json.loads(b)
+    dot = sum(x * y for x, y in zip(va, vb))
+    norm = math.sqrt(sum(x * x for x in va)) * math.sqrt(sum(y * y for y in vb))
+    return dot / norm if norm else 0.0
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class FakeCortex:
+    """
+    Deterministic COMPLETE / EMBED / Cortex Search stand-ins.
+    Latency is base + per-token cost with a jitter derived from the input,
+    so repeated runs with the same corpus produce the same timings shape.
+    """
+
+    def __init__(
+        self,
+        complete_ms: float = 400.0,
+        prompt_token_ms: float = 0.02,
+        output_token_ms: float = 8.0,
+        answer_tokens: int = 120,
+        embed_ms: float = 30.0,
+        search_ms: float = 60.0,
+        jitter: float = 0.1,
+        sleep: bool = True
+    ):
+        self.complete_ms = complete_ms
+        self.prompt_token_ms = prompt_token_ms
+        self.output_token_ms = output_token_ms
+        self.answer_tokens = answer_tokens
+        self.embed_ms = embed_ms
+        self.search_ms = search_ms
+        self.jitter = jitter
+        self.sleep = sleep
+        self.calls: Counter = Counter()
+
+    def _wait(self, ms: float, key: str) -> None:
+        if not self.sleep or ms <= 0:
+            return
+        spread = (zlib.crc32(key.encode()) % 2001 - 1000) / 1000 * self.jitter
+        time.sleep(ms * (1 + spread) / 1000)
+
+    def _answer(self, text: str, max_tokens: int) -> Tuple[List[str], List[str]]:
+        """(prompt words, answer words) for a prompt; the answer is derived from the prompt's own words"""
+        words = _tokens(text) or ["empty"]
+        digest = int(hashlib.sha256(text.encode()).hexdigest(), 16)
+        count = max(1, min(max_tokens, self.answer_tokens))
+        return words, [words[(digest + i * 7919) % len(words)] for i in range(count)]
+
+    def complete(self, model: str, prompt: str, options: Optional[str] = None) -> str:
+        self.calls["complete"] += 1
+        messages = _json_arg(prompt)
+        text = " ".join(m.get("content", "") for m in messages) if isinstance(messages, list) else str(prompt)
+        max_tokens = int((_json_arg(options) or {}).get("max_tokens", self.answer_tokens)) if options else self.answer_tokens
+        words, answer_words = self._answer(text, max_tokens)
+        count = len(answer_words)
+        answer = " ".join(answer_words)
+        self._wait(self.complete_ms + self.prompt_token_ms * len(words) + self.output_token_ms * count, text)
+        if not isinstance(messages, list):
+            return answer
+        return json.dumps({
+            "choices": [{"messages": answer}],
+            "created": int(time.time()),
+            "model": model,
+            "usage": {"prompt_tokens": len(words), "completion_tokens": count, "total_tokens": len(words) + count},
+        })
+
+    def stream(self, messages: List[Dict[str, str]], max_tokens: int) -> Iterator[str]:
+        """Same answer as complete(), yielded word by word: prompt cost up front, then per-token cost"""
+        self.calls["stream"] += 1
+        text = " ".join(m.get("content", "") for m in messages)
+        words, answer_words = self._answer(text, max_tokens)
+        self._wait(self.complete_ms + self.prompt_token_ms * len(words), text)
+        for i, word in enumerate(answer_words):
+            if i:
+                self._wait(self.output_token_ms, word)
+            yield word + " "
+
+    def embed(self, model: str, text: Optional[str]) -> Optional[str]:
+        self.calls["embed"] += 1
+        if text is None:
+            return None
+        self._wait(self.embed_ms, text)
+        return json.dumps([round(x, 5) for x in self.vector(text)])
+
+    @staticmethod
+    def vector(text: str, dims: int = 768) -> List[float]:
+        """Deterministic unit vector built from hashed terms, so similar texts score higher"""
+        vec = [0.0] * dims
+        for token in _tokens(text):
+            h = zlib.crc32(token.encode())
+            vec[h % dims] += 1.0 if h & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+        return [x / norm for x in vec]
+
+
+class FakeSearchService:
+    """Cortex Search stand-in ranking RAG_DOCUMENTS_TMP chunks by query term overlap"""
+
+    def __init__(self, session: "FakeSession"):
+        self._session = session
+        self._index: Dict[str, set] = {}
+        self._indexed_rows = -1
+
+    def _refresh(self) -> None:
+        conn = self._session._conn
+        with self._session._lock:
+            (rows,) = conn.execute("SELECT COUNT(*) FROM RAG_DOCUMENTS_TMP").fetchone()
+            if rows == self._indexed_rows:
+                return
+            index: Dict[str, set] = defaultdict(set)
+            for rowid, content in conn.execute("SELECT rowid, CONTENT FROM RAG_DOCUMENTS_TMP"):
+                for token in set(_tokens(content or "")):
+                    index[token].add(rowid)
+            self._index, self._indexed_rows = index, rows
+
+    def search(self, query: str, columns: Sequence[str], limit: int = 10, filters: Any = None, **kwargs):
+        start = time.perf_counter()
+        self._session.cortex._wait(self._session.cortex.search_ms, query)
+        self._refresh()
+
+        filename = None
+        if isinstance(filters, str):
+            match = re.search(r"FILENAME\s*=\s*'((?:[^']|'')*)'", filters)
+            filename = match.group(1).replace("''", "'") if match else None
+        elif isinstance(filters, dict):
+            filename = (filters.get("@eq") or {}).get("FILENAME")
+
+        allowed = None
+        if filename:
+            with self._session._lock:
+                allowed = {r for (r,) in self._session._conn.execute(
+                    "SELECT rowid FROM RAG_DOCUMENTS_TMP WHERE FILENAME = ?", (filename,))}
+
+        scores: Counter = Counter()
+        for token in set(_tokens(query)):
+            for rowid in self._index.get(token, ()):
+                if allowed is None or rowid in allowed:
+                    scores[rowid] += 1
+
+        cols = [c.upper() for c in columns]
+        results = []
+        with self._session._lock:
+            for rowid, score in scores.most_common(limit):
+                row = self._session._conn.execute(
+                    f"SELECT {', '.join(cols)} FROM RAG_DOCUMENTS_TMP WHERE rowid = ?", (rowid,)
+                ).fetchone()
+                record = dict(zip(cols, row))
+                record["_SCORE"] = score
+                results.append(record)
+        self._session.record("search", (time.perf_counter() - start) * 1000)
+        return type("SearchResponse", (), {"results": results})()
+
+
+class _Namespace(dict):
+    """Dict whose missing keys resolve to the same child, mimicking Root.databases[..].schemas[..]"""
+
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+
+    def __missing__(self, key):
+        value = self[key] = self._factory()
+        return value
+
+
+class FakeRoot:
+    """snowflake.core.Root stand-in exposing cortex_search_services over the fake session"""
+
+    def __init__(self, session: "FakeSession"):
+        service = session.search_service
+        schema = type("Schema", (), {})()
+        schema.cortex_search_services = _Namespace(lambda: service)
+        database = type("Database", (), {})()
+        database.schemas = _Namespace(lambda: schema)
+        self.databases = _Namespace(lambda: database)
+
+
+class FakeStreamingBackend:
+    """llm_streaming backend serving token streams from FakeCortex; the whole stream counts as the llm stage"""
+    name = "fake"
+
+    def __init__(self, session: "FakeSession"):
+        self._session = session
+
+    def stream(
+        self,
+        session: Any,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        max_tokens: int
+    ) -> Iterator[str]:
+        import llm_streaming
+
+        messages = llm_streaming.chat_messages(system_prompt, user_prompt)
+        start = time.perf_counter()
+        try:
+            yield from self._session.cortex.stream(messages, max_tokens)
+        finally:
+            self._session.record("llm", (time.perf_counter() - start) * 1000)
+
+
+class FakeRow(tuple):
+    """Tuple with Snowpark Row style access by column name"""
+
+    def __new__(cls, values: Sequence[Any], columns: Sequence[str]):
+        row = super().__new__(cls, values)
+        row._columns = list(columns)
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._columns.index(key.upper()))
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except ValueError:
+            raise AttributeError(name)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._columns, self))
+
+    def asDict(self) -> Dict[str, Any]:
+        return self.as_dict()
+
+
+class FakeDataFrame:
+    """Result of FakeSession.create_dataframe(); only supports writing to a table"""
+
+    def __init__(self, session: "FakeSession", rows: Sequence[Sequence[Any]], schema: Sequence[str]):
+        self._session = session
+        self._rows = [list(row) for row in rows]
+        self._schema = list(schema)
+        self.write = self
+
+    def save_as_table(self, table: str, mode: str = "errorifexists", table_type: str = "") -> None:
+        start = time.perf_counter()
+        table = table.replace("TESTDB.MYSCHEMA.", "")
+        with self._session._lock:
+            conn = self._session._conn
+            if mode == "overwrite":
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(self._schema)})")
+            conn.executemany(
+                f"INSERT INTO {table} VALUES ({', '.join('?' * len(self._schema))})", self._rows
+            )
+            conn.commit()
+        self._session.record("other", (time.perf_counter() - start) * 1000)
+
+
+class FakeAsyncJob:
+    """Snowpark AsyncJob stand-in; the statement runs on the session's job pool like a server-side query"""
+
+    def __init__(self, future: Future):
+        self._future = future
+
+    def is_done(self) -> bool:
+        return self._future.done()
+
+    def result(self) -> List["FakeRow"]:
+        return self._future.result()
+
+    def cancel(self) -> None:
+        self._future.cancel()
+
+
+class FakeQuery:
+    """Result of FakeSession.sql(); executes lazily like a Snowpark DataFrame"""
+
+    def __init__(self, session: "FakeSession", query: str, params: Optional[Sequence[Any]]):
+        self._session = session
+        self._query = query
+        self._params = params
+
+    def collect(self) -> List[FakeRow]:
+        return self._session._execute(self._query, self._params)
+
+    def collect_nowait(self) -> "FakeAsyncJob":
+        return FakeAsyncJob(self._session._jobs.submit(self.collect))
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame([row.as_dict() for row in self.collect()])
+
+
+class FakeSession:
+    """In-memory SQLite stand-in for a Snowpark Session"""
+
+    def __init__(self, verbose: bool = False, cortex: Optional[FakeCortex] = None):
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.RLock()
+        self.verbose = verbose
+        self.queries: List[str] = []
+        self.timings: List[Tuple[str, float]] = []
+        # "<statement kind>: <SQLite error>" -> count of statements the fake could not run
+        self.failures: Counter = Counter()
+        self._failures_lock = threading.Lock()
+        self.cortex = cortex or FakeCortex()
+        self.search_service = FakeSearchService(self)
+        # Async jobs, and their table-free Cortex calls, run concurrently like separate server queries
+        self._jobs = ThreadPoolExecutor(max_workers=ASYNC_JOB_WORKERS, thread_name_prefix="fake-job")
+        self._local = threading.local()
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._register_functions(self._conn)
+
+    def _register_functions(self, conn: sqlite3.Connection) -> None:
+        cortex = self.cortex
+        functions = {
+            "CORTEX_COMPLETE": cortex.complete,
+            "CORTEX_EMBED": cortex.embed,
+            "ARRAY_CONSTRUCT": _array_construct,
+            "OBJECT_CONSTRUCT": _object_construct,
+            "PARSE_JSON": lambda value: value,
+            "TO_VARIANT": lambda value: value,
+            "TO_VARCHAR": lambda value, fmt=None: value.hex() if isinstance(value, bytes) else (None if value is None else str(value)),
+            "SHA2": lambda value, bits=256: None if value is None else hashlib.sha256(
+                value if isinstance(value, bytes) else str(value).encode()).hexdigest(),
+            "HEX_ENCODE": lambda value: value.hex() if isinstance(value, bytes) else None if value is None else str(value).encode().hex(),
+            "TO_BINARY": lambda value, fmt="HEX": None if value is None else bytes.fromhex(value) if fmt.upper() == "HEX" else str(value).encode(),
+            "UUID_STRING": lambda: str(uuid.uuid4()),
+            "VECTOR_COSINE_SIMILARITY": _cosine,
+        }
+        for name, func in functions.items():
+            conn.create_function(name, -1, func)
+
+    def _scratch_conn(self) -> sqlite3.Connection:
+        """Per-thread connection for statements that read no tables, so they need not hold the lock"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(":memory:")
+            self._register_functions(conn)
+        return conn
+
+    def translate(self, query: str) -> Optional[str]:
+        """Rewrite Snowflake SQL into SQLite; None means the statement is a no-op locally"""
+        stripped = query.strip().rstrip(';')
+        if stripped.upper().startswith(("USE ", "ALTER ", "CREATE OR REPLACE STAGE", "PUT ")):
+            return None
+        for pattern, replacement in _TRANSLATIONS:
+            stripped = pattern.sub(replacement, stripped)
+        return stripped
+
+    def record(self, stage: str, elapsed_ms: float) -> None:
+        self.timings.append((stage, elapsed_ms))
+
+    def reset_timings(self) -> List[Tuple[str, float]]:
+        """Return the per-stage timings collected so far and start a new window"""
+        timings, self.timings = self.timings, []
+        return timings
+
+    def reset_failures(self) -> Counter:
+        """Return the statements that failed so far and start counting again"""
+        with self._failures_lock:
+            failures, self.failures = self.failures, Counter()
+        return failures
+
+    def _execute(self, query: str, params: Optional[Sequence[Any]]) -> List[FakeRow]:
+        start = time.perf_counter()
+        self.queries.append(query)
+        try:
+            translated = self.translate(query)
+            if translated is None:
+                return []
+            if _TABLE_FREE.match(translated):
+                return self._run(self._scratch_conn(), translated, params)
+            with self._lock:
+                return self._run(self._conn, translated, params)
+        finally:
+            self.record(classify(query), (time.perf_counter() - start) * 1000)
+
+    def _run(self, conn: sqlite3.Connection, translated: str, params: Optional[Sequence[Any]]) -> List[FakeRow]:
+        try:
+            cursor = conn.execute(translated, list(params or []))
+        except sqlite3.Error as e:
+            # Unsupported Snowflake syntax behaves like an empty result, but is counted so
+            # benchmarks can report work that was not actually measured
+            kind = translated.split(None, 1)[0].upper() if translated.strip() else "EMPTY"
+            with self._failures_lock:
+                self.failures[f"{kind}: {e}"] += 1
+            if self.verbose:
+                print(f"[fake backend] {e}: {' '.join(translated.split())[:160]}")
+            return []
+        if cursor.description is None:
+            conn.commit()
+            return []
+        columns = [d[0].upper() for d in cursor.description]
+        return [FakeRow(values, columns) for values in cursor.fetchall()]
+
+    def sql(self, query: str, params: Optional[Sequence[Any]] = None) -> FakeQuery:
+        return FakeQuery(self, query, params)
+
+    def create_dataframe(self, rows: Sequence[Sequence[Any]], schema: Sequence[str]) -> FakeDataFrame:
+        return FakeDataFrame(self, rows, schema)
+
+    def close(self) -> None:
+        # Pages close their session after each use; the shared fake stays open
+        pass
+
+
+def format_failures(failures: Counter, limit: int = 5) -> List[str]:
+    """Most common failed statements as report lines"""
+    return [f"{count}x {failure}" for failure, count in failures.most_common(limit)]
+
+
+def seed_library(session: FakeSession, books: int = 12, pages_per_book: int = 20, metrics: int = 500, seed: int = 7) -> None:
+    """Fill the fake database with synthetic books, chunks and metrics"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    conn = session._conn
+    with session._lock:
+        for b in range(books):
+            filename = f"book_{b:03d}.txt"
+            conn.execute(
+                "INSERT INTO BOOK_METADATA VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(uuid.uuid4()), filename, rng.choice(["Fiction", "Science", "History"]),
+                 (now - timedelta(days=b)).isoformat(), rng.uniform(0.1, 5.0),
+                 json.dumps({"views": rng.randint(0, 100)}), None)
+            )
+            for p in range(pages_per_book):
+                conn.execute(
+                    "INSERT INTO RAG_DOCUMENTS_TMP VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(uuid.uuid4()), filename, "text/plain",
+                     f"Page {p + 1} of {filename}. " + "Lorem ipsum dolor sit amet. " * 40,
+                     None, json.dumps({"page_number": p + 1, "chunk_number": p + 1}), now.isoformat())
+                )
+        for m in range(metrics):
+            conn.execute(
+                "INSERT INTO ANALYTICS_METRICS VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(uuid.uuid4()), (now - timedelta(minutes=m * 7)).isoformat(sep=' '),
+                 f"book_{rng.randrange(books):03d}.txt", rng.choice(["SEARCH", "SUMMARY", "FILE_UPLOAD"]),
+                 "benchmark query", "success" if rng.random() > 0.05 else "error",
+                 rng.randint(50, 800), rng.uniform(200, 900), rng.randint(300, 6000))
+            )
+        conn.commit()
+
+
+def _words(rng: random.Random, vocabulary: List[str], count: int) -> str:
+    # Zipf-like draw so a few terms are common and most are rare, as in real text
+    return " ".join(vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)] for _ in range(count))
+
+
+def seed_corpus(
+    session: FakeSession,
+    chunks: int,
+    chunks_per_book: int = 50,
+    words_per_chunk: int = 150,
+    with_embeddings: bool = False,
+    seed: int = 7
+) -> List[str]:
+    """
+    Insert a synthetic corpus of `chunks` RAG chunks spread over books of
+    `chunks_per_book` pages, and return the book filenames.
+    Embeddings are optional because 768-dim JSON vectors dominate memory at 100k chunks.
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"{rng.choice('bcdfghklmnprstvz')}{rng.choice('aeiou')}{i:x}" for i in range(5000)]
+    rng.shuffle(vocabulary)
+    now = datetime.now().isoformat()
+    books = max(1, math.ceil(chunks / chunks_per_book))
+    filenames = [f"corpus_{b:05d}.pdf" for b in range(books)]
+    conn = session._conn
+    with session._lock:
+        for b, filename in enumerate(filenames):
+            conn.execute(
+                "INSERT INTO BOOK_METADATA VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(uuid.uuid4()), filename, rng.choice(["Fiction", "Science", "History"]),
+                 now, rng.uniform(0.1, 5.0), json.dumps({"views": 0}), None)
+            )
+            pages = min(chunks_per_book, chunks - b * chunks_per_book)
+            batch = []
+            for p in range(pages):
+                content = f"Page {p + 1} of {filename}. " + _words(rng, vocabulary, words_per_chunk)
+                embedding = json.dumps([round(x, 5) for x in FakeCortex.vector(content)]) if with_embeddings else None
+                batch.append((str(uuid.uuid4()), filename, "application/pdf", content, embedding,
+                              json.dumps({"page_number": p + 1, "chunk_number": p + 1}), now))
+            conn.executemany("INSERT INTO RAG_DOCUMENTS_TMP VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.commit()
+    return filenames
+
+
+def sample_queries(session: FakeSession, count: int, words: int = 6, seed: int = 11) -> List[Tuple[str, str]]:
+    """(question, filename) pairs drawn from stored chunks so search has something to find"""
+    rng = random.Random(seed)
+    with session._lock:
+        (total,) = session._conn.execute("SELECT COUNT(*) FROM RAG_DOCUMENTS_TMP").fetchone()
+        picks = []
+        for _ in range(count):
+            filename, content = session._conn.execute(
+                "SELECT FILENAME, CONTENT FROM RAG_DOCUMENTS_TMP LIMIT 1 OFFSET ?", (rng.randrange(total),)
+            ).fetchone()
+            terms = content.split()[5:]
+            picks.append(("What does the text say about " + " ".join(rng.sample(terms, min(words, len(terms)))) + "?", filename))
+    return picks
+
+
+class NullEvaluator:
+    """TruLensEvaluator stand-in reporting itself as uninitialized, so evaluation is skipped"""
+    initialized = False
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def install(session: Optional[FakeSession] = None, skip_evaluation: bool = False) -> FakeSession:
+    """Route SnowparkManager.get_session(), Cortex Search and streamed completions to the fake backend"""
+    import back
+    import llm_streaming
+    import retrieval_cache
+
+    session = session or FakeSession()
+    back.SnowparkManager.get_session = staticmethod(lambda: session)
+    back.get_root = lambda _session: FakeRoot(session)
+    retrieval_cache.get_root = back.get_root
+    llm_streaming.set_backend(FakeStreamingBackend(session))
+    if skip_evaluation:
+        import truelens_utils
+        truelens_utils.TruLensEvaluator = NullEvaluator
+        truelens_utils.get_root = back.get_root
+    return session
@@ -0,0 +1,114 @@
+"""
+Import-time budget check.
+
+Imports each app module in a fresh interpreter with `-X importtime` and fails
+if its cumulative import time exceeds the budget, or if a heavy dependency
+that should only load on first use (TruLens, gTTS, pydub, ...) was imported.
+
+Usage:
+    python benchmarks/import_budget.py [--scale 1.5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time budget per module, in milliseconds
+IMPORT_BUDGET_MS = {
+    "lazy_deps": 20,
+    "metrics_rollups": 20,
+    "back": 1500,
+    "truelens_utils": 1600,
+}
+
+# Modules that must not be loaded just by importing the app modules
+DEFERRED_MODULES = [
+    "trulens",
+    "trulens_eval",
+    "gtts",
+    "pydub",
+    "snowflake.core",
+    "plotly",
+]
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """Parse `-X importtime` output into {module: (self_us, cumulative_us)}"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            timings[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return timings
+
+
+def measure_import(module: str) -> Dict[str, object]:
+    """Import a module in a fresh interpreter and report its timings and loaded heavy modules"""
+    probe = (
+        "import sys, json\n"
+        f"import {module}\n"
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True
+    )
+    timings = parse_importtime(result.stderr)
+    loaded: List[str] = []
+    if result.returncode == 0 and result.stdout.strip():
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        "module": module,
+        "ok": result.returncode == 0,
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode != 0 and result.stderr.strip() else None,
+        "cumulative_ms": timings.get(module, (0, 0))[1] / 1000,
+        "deferred_loaded": loaded,
+        "slowest": sorted(
+            ((name, cumulative / 1000) for name, (_, cumulative) in timings.items()),
+            key=lambda item: item[1],
+            reverse=True
+        )[:10],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget, for slow machines")
+    args = parser.parse_args()
+
+    failures = 0
+    for module, budget_ms in IMPORT_BUDGET_MS.items():
+        report = measure_import(module)
+        budget = budget_ms * args.scale
+        if not report["ok"]:
+            print(f"FAIL {module}: import failed ({report['error']})")
+            failures += 1
+            continue
+        status = "ok"
+        if report["cumulative_ms"] > budget:
+            status = "FAIL"
+            failures += 1
+        if report["deferred_loaded"]:
+            status = "FAIL"
+            failures += 1
+        print(f"{status:4} {module}: {report['cumulative_ms']:.0f} ms (budget {budget:.0f} ms)")
+        if report["deferred_loaded"]:
+            print(f"     loaded eagerly: {', '.join(report['deferred_loaded'])}")
+        if status == "FAIL":
+            for name, cumulative_ms in report["slowest"]:
+                print(f"     {cumulative_ms:8.1f} ms  {name}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Ingestion throughput benchmark.
+
+Generates synthetic PDF, DOCX and TXT corpora of varying page counts and
+measures, per format and size:
+  - extract:   SnowparkManager.process_pdf, as pages/s and chunks/s
+  - thumbnail: ThumbnailGenerator.generate_thumbnail, as thumbnails/s
+  - upload:    SnowparkManager.upload_documents against the fake backend
+               (fake EMBED latency included), as chunks/s
+plus the peak RSS reached during each phase. Files in a phase are processed
+by a pool of --workers; use --executor process to see how extraction scales
+past the GIL.
+
+Usage:
+    python benchmarks/ingestion.py
+    python benchmarks/ingestion.py --pages 10,100,500 --workers 1,4 --formats pdf,txt
+    python benchmarks/ingestion.py --executor process --phases extract,thumbnail --json ingestion.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import psutil  # noqa: E402
+
+import fake_backend  # noqa: E402
+
+FILE_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+PHASES = ("extract", "thumbnail", "upload")
+# Target tokens per chunk, as CHUNK_SIZE_OPTIONS["Medium"]
+DEFAULT_CHUNK_SIZE = 384
+# Paragraphs that make up one "page" of a generated DOCX or TXT document
+PARAGRAPHS_PER_PAGE = 6
+
+Document = Tuple[str, str, bytes, int]  # (filename, file_type, content, pages)
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    vocabulary = ("library", "chapter", "analysis", "system", "reader", "memory", "result", "method",
+                  "history", "science", "value", "context", "search", "model", "page", "document")
+    return " ".join(rng.choice(vocabulary) for _ in range(words)).capitalize() + "."
+
+
+def make_pdf(pages: int, words_per_page: int, rng: random.Random) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        text = f"Chapter {p + 1}\n\n" + _paragraph(rng, words_per_page)
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=10)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+def make_docx(pages: int, words_per_page: int, rng: random.Random) -> bytes:
+    import docx
+
+    document = docx.Document()
+    for p in range(pages):
+        document.add_heading(f"Chapter {p + 1}", level=2)
+        for _ in range(PARAGRAPHS_PER_PAGE - 1):
+            document.add_paragraph(_paragraph(rng, words_per_page // PARAGRAPHS_PER_PAGE))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_txt(pages: int, words_per_page: int, rng: random.Random) -> bytes:
+    lines = []
+    for p in range(pages):
+        lines.append(f"# Chapter {p + 1}")
+        lines.append(f"Summary: {_paragraph(rng, 8)}")
+        for _ in range(PARAGRAPHS_PER_PAGE - 2):
+            lines.append(_paragraph(rng, words_per_page // PARAGRAPHS_PER_PAGE))
+        lines.append(f"- {_paragraph(rng, 6)}")
+    return "\n".join(lines).encode("utf-8")
+
+
+GENERATORS: Dict[str, Callable[[int, int, random.Random], bytes]] = {
+    "pdf": make_pdf,
+    "docx": make_docx,
+    "txt": make_txt,
+}
+
+
+def build_corpus(fmt: str, pages: int, docs: int, words_per_page: int, seed: int = 7) -> List[Document]:
+    rng = random.Random(f"{seed}-{fmt}-{pages}")
+    return [
+        (f"bench_{pages:05d}p_{i:02d}.{fmt}", FILE_TYPES[fmt], GENERATORS[fmt](pages, words_per_page, rng), pages)
+        for i in range(docs)
+    ]
+
+
+class PeakRSS:
+    """Samples the RSS of this process and its children in the background, keeping the maximum"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> int:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            with contextlib.suppress(psutil.Error):
+                total += child.memory_info().rss
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakRSS":
+        self.peak_bytes = self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._sample())
+
+
+def _quiet(func: Callable, *args) -> Any:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def extract_one(document: Document, chunk_size: int) -> int:
+    """Run process_pdf on one document and return the number of chunks"""
+    from back import SnowparkManager
+
+    filename, file_type, content, _ = document
+    ok, error, chunks = _quiet(SnowparkManager.process_pdf, content, filename, file_type, chunk_size)
+    if not ok:
+        raise RuntimeError(error)
+    return len(chunks)
+
+
+def thumbnail_one(document: Document, chunk_size: int) -> int:
+    from thumbnail_generator import ThumbnailGenerator
+
+    filename, file_type, content, _ = document
+    return int(_quiet(ThumbnailGenerator.generate_thumbnail, content, file_type, filename) is not None)
+
+
+def upload_one(document: Document, chunk_size: int) -> int:
+    """Extract and upload one document to the fake backend; returns chunks uploaded"""
+    from back import SnowparkManager
+
+    filename, file_type, content, _ = document
+    _, _, chunks = _quiet(SnowparkManager.process_pdf, content, filename, file_type, chunk_size)
+    session = SnowparkManager.get_session()
+    ok = _quiet(SnowparkManager.upload_documents, session, chunks, filename, file_type, "", content)
+    if not ok:
+        raise RuntimeError(f"upload_documents failed for {filename}")
+    return len(chunks)
+
+
+PHASE_FUNCTIONS = {
+    "extract": extract_one,
+    "thumbnail": thumbnail_one,
+    "upload": upload_one,
+}
+
+
+def run_phase(phase: str, corpus: List[Document], workers: int, executor_kind: str, chunk_size: int) -> Dict[str, Any]:
+    func = PHASE_FUNCTIONS[phase]
+    # The fake backend lives in this process, so uploads always use threads
+    pool_class = ProcessPoolExecutor if executor_kind == "process" and phase != "upload" else ThreadPoolExecutor
+    errors: List[str] = []
+    outputs = 0
+    with PeakRSS() as rss:
+        pool: Executor = pool_class(max_workers=workers)
+        with pool:
+            start = time.perf_counter()
+            futures = [pool.submit(func, document, chunk_size) for document in corpus]
+            for future in futures:
+                try:
+                    outputs += future.result()
+                except Exception as e:
+                    errors.append(str(e))
+            elapsed = time.perf_counter() - start
+
+    pages = sum(document[3] for document in corpus)
+    report = {
+        "files": len(corpus),
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(pages / elapsed, 1) if elapsed else 0.0,
+        "files_per_s": round(len(corpus) / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": round(rss.peak_bytes / (1024 * 1024), 1),
+        "errors": errors[:3],
+    }
+    key = {"extract": "chunks", "thumbnail": "thumbnails", "upload": "chunks"}[phase]
+    report[key] = outputs
+    report[f"{key}_per_s"] = round(outputs / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+def install_backend(embed_ms: float) -> fake_backend.FakeSession:
+    """Fake backend plus the Streamlit session state upload_documents reads"""
+    import streamlit as st
+
+    session = fake_backend.FakeSession(cortex=fake_backend.FakeCortex(embed_ms=embed_ms))
+    fake_backend.install(session, skip_evaluation=True)
+    st.session_state.files = []
+    return session
+
+
+def register_files(corpus: Sequence[Document]) -> None:
+    import streamlit as st
+
+    st.session_state.files = [{"name": d[0], "category": "Benchmark"} for d in corpus]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", default="pdf,docx,txt", help="Subset of pdf,docx,txt")
+    parser.add_argument("--pages", default="1,10,100", help="Comma separated page counts per document")
+    parser.add_argument("--docs", type=int, default=4, help="Documents per format and page count")
+    parser.add_argument("--words-per-page", type=int, default=350)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Chunk size in tokens passed to process_pdf")
+    parser.add_argument("--workers", default="1", help="Comma separated worker counts to compare")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread")
+    parser.add_argument("--phases", default=",".join(PHASES), help="Subset of extract,thumbnail,upload")
+    parser.add_argument("--embed-ms", type=float, default=2.0, help="Fake EMBED_TEXT_768 latency per chunk")
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    phases = [p.strip() for p in args.phases.split(",") if p.strip()]
+    for name, chosen, allowed in (("formats", formats, FILE_TYPES), ("phases", phases, PHASES)):
+        unknown = set(chosen) - set(allowed)
+        if unknown:
+            parser.error(f"unknown {name}: {', '.join(sorted(unknown))}")
+
+    session = install_backend(args.embed_ms) if "upload" in phases else None
+    results: List[Dict[str, Any]] = []
+    print(f"{'format':<6}{'pages':>7}{'workers':>9}  {'phase':<10}{'pages/s':>10}{'out/s':>10}{'peak MB':>10}")
+    for fmt in formats:
+        for pages in (int(p) for p in args.pages.split(",")):
+            start = time.perf_counter()
+            corpus = build_corpus(fmt, pages, args.docs, args.words_per_page)
+            generate_s = time.perf_counter() - start
+            if session is not None:
+                register_files(corpus)
+            for workers in (int(w) for w in args.workers.split(",")):
+                for phase in phases:
+                    if session is not None:
+                        session.reset_failures()
+                    report = run_phase(phase, corpus, workers, args.executor, args.chunk_size)
+                    if session is not None:
+                        failures = session.reset_failures()
+                        report["sql_failures"] = dict(failures)
+                        report["errors"].extend(f"fake backend: {line}" for line in fake_backend.format_failures(failures))
+                    rate = report.get("chunks_per_s", report.get("thumbnails_per_s"))
+                    print(f"{fmt:<6}{pages:>7}{workers:>9}  {phase:<10}{report['pages_per_s']:>10.1f}"
+                          f"{rate:>10.1f}{report['peak_rss_mb']:>10.0f}")
+                    for error in report["errors"]:
+                        print(f"      error: {error}")
+                    results.append({
+                        "format": fmt,
+                        "pages_per_doc": pages,
+                        "bytes_per_doc": sum(len(d[2]) for d in corpus) // len(corpus),
+                        "generate_s": round(generate_s, 3),
+                        "workers": workers,
+                        "executor": args.executor,
+                        "phase": phase,
+                        **report,
+                    })
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"\nReport written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
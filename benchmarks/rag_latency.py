@@ -0,0 +1,239 @@
+"""
+End-to-end RAG latency benchmark.
+
+Runs semantic_search_with_llm, get_document_summary and
+PAL.get_chatbot_response against the local fake backend over synthetic
+corpora, with deterministic fake COMPLETE / EMBED / Cortex Search calls of
+configurable latency. Reports throughput and p50/p95/p99 per stage
+(retrieval, search, llm, metrics_write, ...) and end to end, where "app" is
+the time spent in Python outside any backend call. With --stream the answers
+are consumed as token streams and "first_token" reports the time from the
+request to its first token, the latency a reader actually perceives.
+The answer and retrieval caches are cleared before every call unless
+--warm-caches is given, in which case repeated questions are served from
+them and their hit rates are reported.
+
+Usage:
+    python benchmarks/rag_latency.py
+    python benchmarks/rag_latency.py --sizes 10,1000 --iterations 5 --complete-ms 0 --output-token-ms 0
+    python benchmarks/rag_latency.py --operations search --json results.json
+    python benchmarks/rag_latency.py --stream --sizes 1000
+    python benchmarks/rag_latency.py --operations search --warm-caches
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Sequence
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_backend  # noqa: E402
+
+DEFAULT_SIZES = "10,1000,10000,100000"
+OPERATIONS = ("search", "summary", "pal")
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _load_pal():
+    """Import pages/PAL.py as a module and return an instance without rendering the page"""
+    spec = importlib.util.spec_from_file_location("PAL", os.path.join(REPO_ROOT, "pages", "PAL.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return object.__new__(module.PAL)
+
+
+def _drain(stream: Any) -> Any:
+    """Consume a completion stream like the page would; plain results pass through"""
+    if stream is not None and hasattr(stream, "read"):
+        stream.read()
+    return stream
+
+
+def build_operations(names: Sequence[str], stream: bool = False) -> Dict[str, Callable[[str, str], Any]]:
+    from back import SnowparkManager
+
+    if stream:
+        operations = {
+            "search": lambda question, filename: _drain(
+                (SnowparkManager.semantic_search_with_llm(question, filename=filename, stream=True) or {}).get("answer_stream")
+            ),
+            "summary": lambda question, filename: _drain(
+                (SnowparkManager.get_document_summary(filename, stream=True) or {}).get("summary_stream")
+            ),
+        }
+    else:
+        operations = {
+            "search": lambda question, filename: SnowparkManager.semantic_search_with_llm(question, filename=filename),
+            "summary": lambda question, filename: SnowparkManager.get_document_summary(filename),
+        }
+    if "pal" in names:
+        pal = _load_pal()
+        operations["pal"] = lambda question, filename: _drain(pal.get_chatbot_response(question, filename, stream=stream))
+    return {name: operations[name] for name in names}
+
+
+def run_operation(
+    session: fake_backend.FakeSession,
+    operation: Callable[[str, str], Any],
+    queries: List[Any],
+    iterations: int,
+    warmup: int,
+    verbose: bool,
+    warm_caches: bool = False
+) -> Dict[str, Any]:
+    """Call an operation `iterations` times and collect end-to-end and per-stage timings in ms"""
+    from back import SnowparkManager
+    from semantic_cache import SemanticCache
+    from retrieval_cache import RetrievalCache
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    failures = 0
+    wall_start = None
+
+    for i in range(warmup + iterations):
+        if i == warmup:
+            wall_start = time.perf_counter()
+            session.reset_failures()
+        question, filename = queries[i % len(queries)]
+        if not warm_caches:
+            SnowparkManager.invalidate_document_caches()
+        elif i == warmup:
+            answers_before, searches_before = SemanticCache.stats(), RetrievalCache.stats()
+        session.reset_timings()
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if verbose else output):
+            result = operation(question, filename)
+        total_ms = (time.perf_counter() - start) * 1000
+        if i < warmup:
+            continue
+
+        failures += result is None
+        stages: Dict[str, float] = defaultdict(float)
+        for stage, elapsed_ms in session.reset_timings():
+            stages[stage] += elapsed_ms
+        samples["end_to_end"].append(total_ms)
+        if getattr(result, "ttft_ms", None) is not None:
+            # Request start to first token: the time spent after the first token is excluded
+            samples["first_token"].append(max(0.0, total_ms - (result.total_ms - result.ttft_ms)))
+        samples["app"].append(max(0.0, total_ms - sum(stages.values())))
+        for stage in fake_backend.STAGES:
+            samples[stage].append(stages.get(stage, 0.0))
+
+    wall_s = time.perf_counter() - wall_start if wall_start else 0.0
+    report = {
+        "iterations": iterations,
+        "failures": failures,
+        "sql_failures": dict(session.reset_failures()),
+        "throughput_per_s": round(iterations / wall_s, 3) if wall_s else 0.0,
+        "stages_ms": {
+            stage: {f"p{p}": round(percentile(values, p), 2) for p in PERCENTILES}
+            for stage, values in samples.items()
+            if any(values)
+        },
+    }
+    if warm_caches and wall_start:
+        answers_after, searches_after = SemanticCache.stats(), RetrievalCache.stats()
+        hits = sum(answers_after[k] - answers_before[k] for k in ("exact_hits", "semantic_hits"))
+        lookups = hits + answers_after["misses"] - answers_before["misses"]
+        report["answer_cache_hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        hits = searches_after["hits"] - searches_before["hits"]
+        lookups = hits + searches_after["misses"] - searches_before["misses"]
+        report["retrieval_cache_hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+    return report
+
+
+def print_report(size: int, name: str, report: Dict[str, Any]) -> None:
+    failed = f", {report['failures']} failed" if report["failures"] else ""
+    cache = (
+        f", cache hits {report['answer_cache_hit_rate']:.0%} answers / {report['retrieval_cache_hit_rate']:.0%} searches"
+        if "answer_cache_hit_rate" in report else ""
+    )
+    print(f"\n{name} @ {size} chunks: {report['throughput_per_s']:.2f} ops/s{failed}{cache}")
+    sql_failures = Counter(report["sql_failures"])
+    if sql_failures:
+        print(f"    {sum(sql_failures.values())} statements failed in the fake backend and were not measured:")
+        for line in fake_backend.format_failures(sql_failures):
+            print(f"      {line}")
+    print(f"    {'stage':<14}" + "".join(f"{'p' + str(p):>10}" for p in PERCENTILES))
+    for stage, values in report["stages_ms"].items():
+        print(f"    {stage:<14}" + "".join(f"{values['p' + str(p)]:>10.1f}" for p in PERCENTILES))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma separated corpus sizes in chunks")
+    parser.add_argument("--operations", default=",".join(OPERATIONS), help="Subset of search,summary,pal")
+    parser.add_argument("--iterations", type=int, default=10, help="Measured calls per operation and size")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured calls before measuring")
+    parser.add_argument("--chunks-per-book", type=int, default=50)
+    parser.add_argument("--complete-ms", type=float, default=400.0, help="Fixed COMPLETE latency")
+    parser.add_argument("--prompt-token-ms", type=float, default=0.02, help="COMPLETE latency per prompt token")
+    parser.add_argument("--output-token-ms", type=float, default=8.0, help="COMPLETE latency per generated token")
+    parser.add_argument("--embed-ms", type=float, default=30.0, help="EMBED_TEXT_768 latency")
+    parser.add_argument("--search-ms", type=float, default=60.0, help="Cortex Search latency")
+    parser.add_argument("--embeddings", action="store_true", help="Store chunk embeddings (slow for large corpora)")
+    parser.add_argument("--stream", action="store_true", help="Stream answers and report time to first token")
+    parser.add_argument("--warm-caches", action="store_true", help="Keep the answer and retrieval caches between calls")
+    parser.add_argument("--json", help="Write the full report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's debug output")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.operations.split(",") if n.strip()]
+    unknown = set(names) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"unknown operations: {', '.join(sorted(unknown))}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        cortex = fake_backend.FakeCortex(
+            complete_ms=args.complete_ms,
+            prompt_token_ms=args.prompt_token_ms,
+            output_token_ms=args.output_token_ms,
+            embed_ms=args.embed_ms,
+            search_ms=args.search_ms
+        )
+        session = fake_backend.FakeSession(verbose=args.verbose, cortex=cortex)
+        start = time.perf_counter()
+        fake_backend.seed_corpus(session, size, chunks_per_book=args.chunks_per_book, with_embeddings=args.embeddings)
+        seed_s = time.perf_counter() - start
+        fake_backend.install(session, skip_evaluation=True)
+        operations = build_operations(names, stream=args.stream)
+        queries = fake_backend.sample_queries(session, max(args.iterations, 1) + args.warmup)
+        print(f"\n=== {size} chunks (seeded in {seed_s:.1f} s) ===")
+
+        results[str(size)] = {}
+        for name, operation in operations.items():
+            report = run_operation(
+                session, operation, queries, args.iterations, args.warmup, args.verbose, args.warm_caches
+            )
+            results[str(size)][name] = report
+            print_report(size, name, report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"\nReport written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
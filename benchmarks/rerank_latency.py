@@ -0,0 +1,157 @@
+"""
+Reranking latency and quality benchmark.
+
+Builds synthetic candidate sets like the ones Cortex Search returns for
+reranking.candidate_count(k) and measures reranking.rerank on CPU, per
+candidate count, in three modes:
+  - lexical: BM25 and the retrieval score only (no embeddings)
+  - warm:    plus cosine similarity on embeddings already in EmbeddingCache
+  - cold:    embeddings read from RAG_DOCUMENTS_TMP in the fake backend,
+             as for chunks not seen since the server started
+Each set hides one relevant chunk among distractors with noisy retrieval
+scores; "gold@k" is how often it survives to the final k, against keeping
+the top k by retrieval score alone.
+
+Usage:
+    python benchmarks/rerank_latency.py
+    python benchmarks/rerank_latency.py --candidates 8,16,24,48 --k 4 --iterations 200
+    python benchmarks/rerank_latency.py --modes lexical,warm --json rerank.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_backend  # noqa: E402
+import reranking  # noqa: E402
+from reranking import EmbeddingCache  # noqa: E402
+
+MODES = ("lexical", "warm", "cold")
+PERCENTILES = (50, 95, 99)
+
+Case = Tuple[str, List[Dict[str, Any]], int]  # (question, candidates, index of the relevant one)
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def build_cases(count: int, candidates: int, words: int, seed: int) -> List[Case]:
+    """Candidate sets sharing vocabulary with the question; one chunk covers most of its terms"""
+    rng = random.Random(seed)
+    vocabulary = [f"{rng.choice('bcdfghklmnprstvz')}{rng.choice('aeiou')}{i:x}" for i in range(3000)]
+    cases = []
+    for _ in range(count):
+        topic = rng.sample(vocabulary, 6)
+        question = "What does the book say about " + " ".join(topic) + "?"
+        chunks = []
+        for _ in range(candidates):
+            # Distractors mention one or two question terms, as lexical search results do
+            text = rng.sample(topic, rng.randint(1, 2)) + [rng.choice(vocabulary) for _ in range(words)]
+            rng.shuffle(text)
+            chunks.append({'CONTENT': " ".join(text), 'FILENAME': 'bench.pdf', 'SIMILARITY_SCORE': rng.uniform(0.5, 0.9)})
+        gold = rng.randrange(candidates)
+        text = topic[:5] + [rng.choice(vocabulary) for _ in range(words)]
+        rng.shuffle(text)
+        # The search score of the relevant chunk is no better than average
+        chunks[gold] = {'CONTENT': " ".join(text), 'FILENAME': 'bench.pdf', 'SIMILARITY_SCORE': rng.uniform(0.5, 0.8)}
+        cases.append((question, chunks, gold))
+    return cases
+
+
+def store_embeddings(session: Any, cases: List[Case]) -> None:
+    """Insert every candidate with its embedding, as ingestion would"""
+    rows = [
+        (str(i), chunk['FILENAME'], "application/pdf", chunk['CONTENT'],
+         json.dumps(fake_backend.FakeCortex.vector(chunk['CONTENT'])), "{}", "")
+        for i, (_, chunks, _) in enumerate(cases) for chunk in chunks
+    ]
+    with session._lock:
+        session._conn.executemany("INSERT INTO RAG_DOCUMENTS_TMP VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        session._conn.commit()
+
+
+def measure(mode: str, cases: List[Case], k: int, session: Any) -> Dict[str, Any]:
+    timings: List[float] = []
+    kept = baseline = 0
+    for question, chunks, gold in cases:
+        query_embedding = None
+        if mode == "warm":
+            query_embedding = fake_backend.FakeCortex.vector(question)
+            for chunk in chunks:
+                EmbeddingCache.put(chunk['CONTENT'], fake_backend.FakeCortex.vector(chunk['CONTENT']))
+        elif mode == "cold":
+            query_embedding = fake_backend.FakeCortex.vector(question)
+            EmbeddingCache._vectors.clear()
+
+        start = time.perf_counter()
+        ranked = reranking.rerank(
+            question, chunks, k,
+            session=session if mode == "cold" else None,
+            query_embedding=query_embedding
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+
+        kept += any(r['CONTENT'] == chunks[gold]['CONTENT'] for r in ranked)
+        by_score = sorted(range(len(chunks)), key=lambda i: -chunks[i]['SIMILARITY_SCORE'])[:k]
+        baseline += gold in by_score
+
+    return {
+        "latency_ms": {f"p{p}": round(percentile(timings, p), 3) for p in PERCENTILES},
+        "gold_at_k": round(kept / len(cases), 3),
+        "gold_at_k_retrieval_order": round(baseline / len(cases), 3),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", default="8,16,24,48", help="Comma separated candidate set sizes")
+    parser.add_argument("--k", type=int, default=4, help="Results kept after reranking")
+    parser.add_argument("--iterations", type=int, default=100, help="Candidate sets per size")
+    parser.add_argument("--words", type=int, default=150, help="Words per candidate chunk")
+    parser.add_argument("--modes", default=",".join(MODES), help="Subset of lexical,warm,cold")
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    session = fake_backend.FakeSession() if "cold" in modes else None
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'candidates':>10}  {'mode':<8}" + "".join(f"{'p' + str(p) + ' ms':>10}" for p in PERCENTILES)
+          + f"{'gold@k':>9}{'search':>9}")
+    for size in (int(s) for s in args.candidates.split(",")):
+        cases = build_cases(args.iterations, size, args.words, seed=size)
+        if session is not None:
+            store_embeddings(session, cases)
+        results[str(size)] = {}
+        for mode in modes:
+            report = measure(mode, cases, args.k, session)
+            results[str(size)][mode] = report
+            print(f"{size:>10}  {mode:<8}" + "".join(f"{report['latency_ms']['p' + str(p)]:>10.2f}" for p in PERCENTILES)
+                  + f"{report['gold_at_k']:>9.2f}{report['gold_at_k_retrieval_order']:>9.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"\nReport written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Startup benchmark for the Streamlit entry points.
+
+Each entry point runs in a fresh interpreter with `-X importtime`, rendered
+headlessly by Streamlit's AppTest against the local fake backend. For every
+entry point the harness records import time per module, first-render time and
+peak RSS. Timings depend on the machine, so no baseline is committed: record
+one locally before a change and compare against it after.
+
+Usage:
+    python benchmarks/startup.py                                          # run and report
+    python benchmarks/startup.py --baseline startup.json --update-baseline # store a baseline
+    python benchmarks/startup.py --baseline startup.json                  # compare with it
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_backend  # noqa: E402
+from import_budget import parse_importtime  # noqa: E402
+
+ENTRY_POINTS = [
+    "Home.py",
+    "pages/PAL.py",
+    "pages/Dashboard.py",
+    "pages/Admin_Panel.py",
+]
+# A metric regresses when it grows by more than this fraction over the baseline
+REGRESSION_TOLERANCE = 0.2
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(entry_point: str, timeout: float) -> Dict[str, Any]:
+    """Render one entry point in this process and report timings as JSON on stdout"""
+    from streamlit.testing.v1 import AppTest
+
+    start = time.perf_counter()
+    session = fake_backend.FakeSession()
+    fake_backend.seed_library(session)
+    fake_backend.install(session)
+    backend_ms = (time.perf_counter() - start) * 1000
+
+    app = AppTest.from_file(os.path.join(REPO_ROOT, entry_point), default_timeout=timeout)
+    for key, value in fake_backend.FAKE_SECRETS.items():
+        app.secrets[key] = value
+
+    start = time.perf_counter()
+    app.run()
+    first_render_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "entry_point": entry_point,
+        "backend_setup_ms": round(backend_ms, 1),
+        "first_render_ms": round(first_render_ms, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "exceptions": [str(e.value) for e in app.exception],
+        "queries": len(session.queries),
+        "sql_failures": dict(session.failures),
+    }
+
+
+def measure(entry_point: str, timeout: float) -> Dict[str, Any]:
+    """Run an entry point in a fresh interpreter and combine its report with import timings"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child", entry_point,
+         "--timeout", str(timeout)],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        return {
+            "entry_point": entry_point,
+            "error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed",
+        }
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    timings = parse_importtime(result.stderr)
+    top_level = {name: cumulative for name, (_, cumulative) in timings.items() if "." not in name.strip()}
+    report["import_total_ms"] = round(sum(top_level.values()) / 1000, 1)
+    report["imports_ms"] = {
+        name: round(cumulative / 1000, 1)
+        for name, cumulative in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:25]
+    }
+    return report
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any]) -> int:
+    """Print per-entry-point deltas against the baseline and count regressions"""
+    regressions = 0
+    for report in results:
+        previous = baseline.get(report["entry_point"])
+        if "error" in report:
+            print(f"{report['entry_point']}: ERROR {report['error']}")
+            regressions += 1
+            continue
+        line = (
+            f"{report['entry_point']}: imports {report['import_total_ms']:.0f} ms, "
+            f"first render {report['first_render_ms']:.0f} ms, peak RSS {report['peak_rss_mb']:.0f} MB"
+        )
+        if previous and "error" not in previous:
+            deltas = []
+            for metric in ("import_total_ms", "first_render_ms", "peak_rss_mb"):
+                before, after = previous[metric], report[metric]
+                change = (after - before) / before if before else 0.0
+                marker = " REGRESSION" if change > REGRESSION_TOLERANCE else ""
+                regressions += bool(marker)
+                deltas.append(f"{metric} {change:+.0%}{marker}")
+            line += f"  [{', '.join(deltas)}]"
+        print(line)
+        if report["exceptions"]:
+            print(f"    render raised: {report['exceptions'][0]}")
+        failures = Counter(report.get("sql_failures", {}))
+        if failures:
+            print(f"    {sum(failures.values())} statements failed in the fake backend:")
+            for failure in fake_backend.format_failures(failures):
+                print(f"      {failure}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds allowed for the first render")
+    parser.add_argument("--entry", action="append", help="Entry point to measure (repeatable)")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="Write results to --baseline instead of comparing")
+    args = parser.parse_args()
+    if args.update_baseline and not args.baseline:
+        parser.error("--update-baseline needs --baseline")
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.timeout)))
+        return 0
+
+    results = [measure(entry, args.timeout) for entry in (args.entry or ENTRY_POINTS)]
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif args.baseline and not args.update_baseline:
+        print(f"Baseline {args.baseline} not found; record one with --update-baseline")
+        return 1
+
+    regressions = compare(results, baseline)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        baseline.update({report["entry_point"]: report for report in results})
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Text-to-speech pipeline check and benchmark.
+
+Runs tts_pipeline.TTSPipeline with the offline SilentWavEngine (optionally
+slowed down to mimic network synthesis) over synthetic chapters and:
+  - fails if the joined track is not a valid WAV whose duration is the sum
+    of its segments, or if segments come back out of order
+  - fails if more than PREFETCH_SEGMENTS segments were ever in flight, or if
+    closing the stream early left segments to be synthesized
+  - reports time to first segment and total time per chapter length
+
+Usage:
+    python benchmarks/tts_pipeline.py
+    python benchmarks/tts_pipeline.py --chapters 2000,20000,100000 --latency-ms 50
+"""
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+import wave
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import tts_pipeline  # noqa: E402
+from tts_pipeline import SilentWavEngine, TTSPipeline, SegmentCache  # noqa: E402
+
+
+class SlowSilentEngine(SilentWavEngine):
+    """SilentWavEngine with a fixed delay per call, counting calls in flight"""
+
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls: List[str] = []
+        self._lock = threading.Lock()
+
+    def synthesize(self, text: str, accent: str) -> bytes:
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.calls.append(text)
+        try:
+            time.sleep(self.latency_ms / 1000)
+            return super().synthesize(text, accent)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def chapter(chars: int) -> str:
+    sentences = []
+    i = 0
+    while sum(len(s) + 1 for s in sentences) < chars:
+        sentences.append(f"Sentence number {i} of the chapter talks about reading aloud.")
+        i += 1
+    return " ".join(sentences)
+
+
+def wav_frames(audio: bytes) -> int:
+    with wave.open(io.BytesIO(audio), 'rb') as wav:
+        return wav.getnframes()
+
+
+def check(chars: int, latency_ms: float) -> Dict[str, object]:
+    SegmentCache._entries.clear()
+    SegmentCache._total_bytes = 0
+    engine = SlowSilentEngine(latency_ms)
+    pipeline = TTSPipeline(engine)
+    text = chapter(chars)
+    expected = tts_pipeline.split_sentences(text)
+    failures = []
+
+    start = time.perf_counter()
+    first_ms = None
+    segments = []
+    for index, total, audio in pipeline.stream(text, "com"):
+        if first_ms is None:
+            first_ms = (time.perf_counter() - start) * 1000
+        if index != len(segments) or total != len(expected):
+            failures.append(f"segment {index} of {total} arrived out of order")
+        segments.append(audio)
+    total_ms = (time.perf_counter() - start) * 1000
+
+    joined = pipeline.join(segments)
+    if wav_frames(joined) != sum(wav_frames(s) for s in segments):
+        failures.append("joined track length differs from its segments")
+    if engine.max_in_flight > tts_pipeline.PREFETCH_SEGMENTS:
+        failures.append(f"{engine.max_in_flight} segments in flight, limit {tts_pipeline.PREFETCH_SEGMENTS}")
+
+    # A reader who stops after the first part should not pay for the whole chapter
+    SegmentCache._entries.clear()
+    SegmentCache._total_bytes = 0
+    early = SlowSilentEngine(latency_ms)
+    stream = TTSPipeline(early).stream(text, "com")
+    next(stream)
+    stream.close()
+    time.sleep(2 * latency_ms / 1000 + 0.05)
+    if len(expected) > tts_pipeline.PREFETCH_SEGMENTS + 1 and len(early.calls) > tts_pipeline.PREFETCH_SEGMENTS + tts_pipeline.TTS_WORKERS:
+        failures.append(f"closing the stream early still synthesized {len(early.calls)} of {len(expected)} segments")
+
+    return {
+        "segments": len(expected),
+        "first_ms": first_ms or 0.0,
+        "total_ms": total_ms,
+        "max_in_flight": engine.max_in_flight,
+        "seconds_of_audio": wav_frames(joined) / SilentWavEngine.SAMPLE_RATE,
+        "failures": failures,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", default="500,5000,30000", help="Comma separated chapter lengths in characters")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Simulated synthesis time per segment")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'chars':>8}{'segments':>10}{'first ms':>10}{'total ms':>10}{'in flight':>11}{'audio s':>9}  status")
+    for chars in (int(c) for c in args.chapters.split(",")):
+        report = check(chars, args.latency_ms)
+        status = "ok" if not report["failures"] else "FAIL " + "; ".join(report["failures"])
+        failed = failed or bool(report["failures"])
+        print(f"{chars:>8}{report['segments']:>10}{report['first_ms']:>10.1f}{report['total_ms']:>10.1f}"
+              f"{report['max_in_flight']:>11}{report['seconds_of_audio']:>9.1f}  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
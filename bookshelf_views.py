@@ -4,6 +4,7 @@ import uuid
 import random
 import json
 from back import SnowparkManager
+import statements
 from typing import List, Dict, Optional
 import os
 from st_clickable_images import clickable_images
@@ -289,12 +290,7 @@ def get_thumbnail(filename: str) -> str:
         return None
         
     try:
-        query = f"""
-        SELECT THUMBNAIL
-        FROM TESTDB.MYSCHEMA.BOOK_METADATA
-        WHERE FILENAME = '{filename.replace("'", "''")}'
-        """
-        result = session.sql(query).collect()
+        result = statements.BOOK_METADATA_THUMBNAIL.collect(session, filename)
         return result[0]['THUMBNAIL'] if result and len(result) > 0 else None
     finally:
         session.close()
@@ -309,14 +305,7 @@ def get_first_page_content(filename: str) -> Optional[str]:
         return None
         
     try:
-        query = f"""
-        SELECT BINARY_CONTENT, METADATA, FILE_TYPE
-        FROM {SnowparkManager.RAG_TABLE}
-        WHERE FILENAME = '{filename.replace("'", "''")}'
-        ORDER BY METADATA:chunk_number
-        LIMIT 1
-        """
-        result = session.sql(query).collect()
+        result = statements.RAG_FIRST_CHUNK.collect(session, filename)
         if result and len(result) > 0:
             binary_content = result[0]['BINARY_CONTENT']
             file_type = result[0]['FILE_TYPE']
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Sequence, Tuple
+
+# Default chart width used when charts stretch to the container width
+DEFAULT_CHART_WIDTH_PX = 700
+# Points plotted per horizontal pixel; more than ~1 per pixel is invisible
+POINTS_PER_PIXEL = 1.0
+MIN_POINTS = 50
+
+
+def target_points(width_px: Optional[int] = None, points_per_pixel: float = POINTS_PER_PIXEL) -> int:
+    """Number of points worth drawing for a chart of the given pixel width"""
+    return max(MIN_POINTS, int((width_px or DEFAULT_CHART_WIDTH_PX) * points_per_pixel))
+
+
+def _as_float(values) -> np.ndarray:
+    """Convert x values (numbers or datetimes) to float64 for the bucket maths"""
+    series = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype('int64').to_numpy(dtype=np.float64)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: pick n_out indices that preserve the visual
+    shape of the series, including peaks and troughs.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    # Interior points are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs(
+            (x[previous] - avg_x) * (bucket_y - y[previous])
+            - (x[previous] - bucket_x) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Keep the minimum and maximum of each bucket; cheap and never drops a spike"""
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    buckets = max(1, n_out // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    picked = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        chunk = y[start:end]
+        picked.append(start + int(np.argmin(chunk)))
+        picked.append(start + int(np.argmax(chunk)))
+    return np.unique(np.array(picked, dtype=np.int64))
+
+
+def downsample_indices(x, y, n_out: int, method: str = "lttb") -> np.ndarray:
+    """Indices of the points to keep for one series; NaNs are treated as gaps"""
+    x_values = _as_float(x)
+    y_values = _as_float(y)
+    valid = np.flatnonzero(~(np.isnan(x_values) | np.isnan(y_values)))
+    if len(valid) <= n_out:
+        return valid
+    if method == "minmax":
+        keep = minmax_indices(y_values[valid], n_out)
+    else:
+        keep = lttb_indices(x_values[valid], y_values[valid], n_out)
+    return valid[keep]
+
+
+def downsample_series(x, y, width_px: Optional[int] = None, method: str = "lttb") -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce one (x, y) series to the point budget of a chart of width_px pixels"""
+    x_array = np.asarray(x)
+    y_array = np.asarray(y)
+    keep = downsample_indices(x_array, y_array, target_points(width_px), method)
+    return x_array[keep], y_array[keep]
+
+
+def downsample_frame(
+    df: pd.DataFrame,
+    x_column: str,
+    y_columns: Sequence[str],
+    width_px: Optional[int] = None,
+    method: str = "lttb"
+) -> pd.DataFrame:
+    """
+    Reduce a frame to roughly the chart's point budget. Each y column picks its
+    own points and the union is kept, so no series loses its peaks.
+    """
+    if df is None or df.empty:
+        return df
+    df = df.sort_values(x_column).reset_index(drop=True)
+    n_out = target_points(width_px)
+    if len(df) <= n_out:
+        return df
+
+    per_series = max(3, n_out // max(1, len(y_columns)))
+    keep: List[np.ndarray] = [
+        downsample_indices(df[x_column], df[column], per_series, method)
+        for column in y_columns
+    ]
+    return df.iloc[np.unique(np.concatenate(keep))].reset_index(drop=True)
@@ -0,0 +1,273 @@
+import io
+import re
+from typing import Any, Dict, List, Optional
+
+from context_budget import count_tokens
+
+# Tokens repeated from the end of one chunk at the start of the next within a section
+DEFAULT_OVERLAP_TOKENS = 48
+# A heading closes the running chunk only once it holds this share of the target
+MIN_CHUNK_SHARE = 0.25
+# Plain text without form feeds is given a page number every this many characters
+TEXT_PAGE_CHARS = 3000
+
+DOCX_TYPES = ("application/msword", "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_NUMBERED_HEADING = re.compile(r"^(chapter|part|section|appendix)\b|^\d+(\.\d+)*\.?\s+\S", re.I)
+_TERMINAL = (".", ",", ";", ":", "!", "?")
+
+Block = Dict[str, Any]  # {'text': str, 'page': int, 'heading': bool}
+
+
+def _is_heading(line: str) -> bool:
+    """Short unpunctuated lines in title or upper case, or numbered like '2.1 Methods', read as headings"""
+    words = line.split()
+    if not words or len(line) > 80 or len(words) > 10 or line.endswith(_TERMINAL):
+        return False
+    return line.isupper() or line.istitle() or bool(_NUMBERED_HEADING.match(line))
+
+
+def _paragraph_blocks(text: str, page: int) -> List[Block]:
+    """Split extracted page text into heading and paragraph blocks"""
+    blocks: List[Block] = []
+    paragraph: List[str] = []
+
+    def flush():
+        if paragraph:
+            blocks.append({'text': " ".join(paragraph), 'page': page, 'heading': False})
+            paragraph.clear()
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            flush()
+        elif line.startswith("#") or _is_heading(line):
+            flush()
+            blocks.append({'text': line if line.startswith("#") else f"## {line}", 'page': page, 'heading': True})
+        elif line.startswith(("-", "*", "•")):
+            flush()
+            blocks.append({'text': line, 'page': page, 'heading': False})
+        else:
+            paragraph.append(line)
+            # PDF text often has no blank lines; a line ending a sentence ends the paragraph
+            if line.endswith((".", "!", "?", ":")) and len(line) < 60:
+                flush()
+    flush()
+    return blocks
+
+
+def pdf_blocks(file_content: bytes) -> List[Block]:
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    blocks: List[Block] = []
+    for page_num, page in enumerate(reader.pages, 1):
+        blocks.extend(_paragraph_blocks(page.extract_text() or "", page_num))
+    return blocks
+
+
+def docx_blocks(file_content: bytes) -> List[Block]:
+    import docx
+
+    document = docx.Document(io.BytesIO(file_content))
+    blocks: List[Block] = []
+    page = 1
+    for paragraph in document.paragraphs:
+        # Word records where it broke pages when the file was last laid out
+        xml = paragraph._p.xml
+        page += xml.count('w:type="page"') + xml.count("lastRenderedPageBreak")
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style_name = paragraph.style.name.lower() if paragraph.style is not None else ""
+        if 'heading' in style_name or style_name == 'title':
+            level = int(style_name[-1]) if style_name[-1].isdigit() else (1 if style_name == 'title' else 2)
+            blocks.append({'text': f"{'#' * level} {text}", 'page': page, 'heading': True})
+        elif style_name == 'list paragraph':
+            blocks.append({'text': f"* {text}", 'page': page, 'heading': False})
+        else:
+            blocks.append({'text': text, 'page': page, 'heading': False})
+    return blocks
+
+
+def text_blocks(file_content: bytes) -> List[Block]:
+    text = file_content.decode("utf-8", errors="replace")
+    if "\f" in text:
+        pages = text.split("\f")
+    else:
+        # Break at the last paragraph or line end before each virtual page boundary
+        pages, start = [], 0
+        while start < len(text):
+            end = min(len(text), start + TEXT_PAGE_CHARS)
+            if end < len(text):
+                cut = max(text.rfind("\n\n", start, end), text.rfind("\n", start, end))
+                end = cut + 1 if cut > start else end
+            pages.append(text[start:end])
+            start = end
+    blocks: List[Block] = []
+    for page_num, page_text in enumerate(pages, 1):
+        blocks.extend(_paragraph_blocks(page_text, page_num))
+    return blocks
+
+
+def extract_blocks(file_content: bytes, file_type: str) -> Optional[List[Block]]:
+    """Structural blocks of a PDF, Word or text file; None for other types"""
+    if file_type == "application/pdf":
+        return pdf_blocks(file_content)
+    if file_type in DOCX_TYPES:
+        return docx_blocks(file_content)
+    if file_type == "text/plain":
+        return text_blocks(file_content)
+    return None
+
+
+def _fit_parts(sentence: str, target_tokens: int) -> List[str]:
+    """A sentence cut at word boundaries, or by characters where it has none, into parts of about target_tokens"""
+    cost = count_tokens(sentence)
+    if cost <= target_tokens:
+        return [sentence]
+    words = sentence.split()
+    if len(words) > 1:
+        step = max(1, len(words) * target_tokens // cost)
+        parts = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+    else:
+        # Unspaced scripts, long URLs and tables flattened to one token run
+        step = max(1, len(sentence) * target_tokens // cost)
+        parts = [sentence[i:i + step] for i in range(0, len(sentence), step)]
+    if len(parts) == 1:
+        return parts
+    return [piece for part in parts for piece in _fit_parts(part, target_tokens)]
+
+
+def split_text(text: str, target_tokens: int) -> List[str]:
+    """Consecutive pieces of text of about target_tokens, cut at sentence boundaries, falling back to words, then characters"""
+    pieces: List[str] = []
+    current: List[str] = []
+    used = 0
+    for sentence in _SENTENCE_END.split(text):
+        for part in _fit_parts(sentence, target_tokens):
+            cost = count_tokens(part)
+            if current and used + cost > target_tokens:
+                pieces.append(" ".join(current))
+                current, used = [], 0
+            current.append(part)
+            used += cost
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _split_block(block: Block, target_tokens: int) -> List[Block]:
+    """Pieces of an oversized block, keeping its page and heading flag"""
+    return [dict(block, text=piece) for piece in split_text(block['text'], target_tokens)]
+
+
+def _overlap_tail(block: Block, overlap_tokens: int) -> Optional[Block]:
+    """The last sentences of a block, up to overlap_tokens"""
+    tail: List[str] = []
+    used = 0
+    for sentence in reversed(_SENTENCE_END.split(block['text'])):
+        cost = count_tokens(sentence)
+        if used + cost > overlap_tokens:
+            break
+        tail.insert(0, sentence)
+        used += cost
+    if not tail or len(tail) == len(_SENTENCE_END.split(block['text'])):
+        return None
+    return dict(block, text=" ".join(tail), overlap=True)
+
+
+def chunk_blocks(
+    blocks: List[Block],
+    target_tokens: int,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    min_tokens: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Pack blocks into chunks of about target_tokens. Headings start a new chunk
+    once the running one is big enough, so small pages merge and sections stay
+    together; oversized blocks are split at sentence boundaries. Chunks that
+    continue a section repeat its heading and the last overlap_tokens of the
+    previous chunk, both counted against target_tokens. A final chunk below
+    min_tokens joins the one before it.
+
+    Returns documents as process_pdf does: text, page_num (the first page) and
+    the page_start / page_end span, plus body_start, the offset in text where
+    the repeated heading and overlap end, so readers can rebuild the document
+    without duplicates.
+    """
+    if min_tokens is None:
+        min_tokens = int(target_tokens * MIN_CHUNK_SHARE)
+    chunks: List[Dict[str, Any]] = []
+    current: List[Block] = []
+    used = 0
+    section: Optional[str] = None
+
+    def emit(carry: bool) -> None:
+        nonlocal current, used
+        if not any(not b.get('overlap') for b in current):
+            current, used = [], 0
+            return
+        parts = [b['text'] for b in current]
+        repeated = [b['text'] for b in current if b.get('overlap')]
+        if section and not current[0]['heading']:
+            parts.insert(0, section)
+            repeated.insert(0, section)
+        pages = [b['page'] for b in current if not b.get('overlap')]
+        chunks.append({
+            "text": "\n\n".join(parts),
+            "body_start": len("\n\n".join(repeated)) + 2 if repeated else 0,
+            "page_num": min(pages),
+            "page_start": min(pages),
+            "page_end": max(pages),
+            "tokens": used,
+        })
+        tail = _overlap_tail(current[-1], overlap_tokens) if carry and overlap_tokens > 0 else None
+        current = [tail] if tail else []
+        used = count_tokens(tail['text']) if tail else 0
+
+    heading_tokens = 0
+    for block in blocks:
+        room = max(1, target_tokens - heading_tokens)
+        # Pieces of a split block leave room for the overlap carried into the next chunk
+        pieces = _split_block(block, max(1, room - overlap_tokens)) if count_tokens(block['text']) > room else [block]
+        for piece in pieces:
+            cost = count_tokens(piece['text'])
+            has_content = any(not b['heading'] and not b.get('overlap') for b in current)
+            if piece['heading']:
+                if has_content and (used >= min_tokens or used + cost > target_tokens):
+                    emit(carry=False)
+                elif not has_content:
+                    # Consecutive headings stay together; an overlap tail does not cross into a new section
+                    current = [b for b in current if not b.get('overlap')]
+                    used = sum(count_tokens(b['text']) for b in current)
+                section, heading_tokens = piece['text'], cost
+            else:
+                # The section heading is repeated at the top of a chunk that does not start with it
+                prefix = 0 if current and current[0]['heading'] else heading_tokens
+                if has_content and used + cost + prefix > target_tokens:
+                    emit(carry=True)
+                    has_content = False
+                if not has_content and current and current[0].get('overlap') and used + cost + heading_tokens > target_tokens:
+                    # The overlap tail is dropped rather than pushing the chunk over its budget
+                    current, used = [], 0
+            current.append(piece)
+            used += cost
+    emit(carry=False)
+
+    if len(chunks) > 1 and chunks[-1]['tokens'] < min_tokens and chunks[-2]['tokens'] + chunks[-1]['tokens'] <= target_tokens + min_tokens:
+        last = chunks.pop()
+        chunks[-1]['text'] += "\n\n" + last['text'][last['body_start']:]
+        chunks[-1]['page_end'] = max(chunks[-1]['page_end'], last['page_end'])
+        chunks[-1]['tokens'] += last['tokens']
+    return chunks
+
+
+def chunk_document(file_content: bytes, file_type: str, target_tokens: int,
+                   overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> Optional[List[Dict[str, Any]]]:
+    """Extract and chunk a file; None for unsupported types"""
+    blocks = extract_blocks(file_content, file_type)
+    if blocks is None:
+        return None
+    return chunk_blocks(blocks, target_tokens, overlap_tokens)
@@ -0,0 +1,240 @@
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Context windows in tokens; prompts never approach these, they bound the budgets below
+MODEL_CONTEXT_WINDOWS = {
+    'mistral-large': 32000,
+    'mistral-large2': 128000,
+    'mistral-7b': 32000,
+    'mixtral-8x7b': 32000,
+    'llama3.1-70b': 128000,
+    'llama3.1-8b': 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 8000
+# Evidence tokens a RAG prompt may carry, whatever the window; more rarely helps the answer
+DEFAULT_EVIDENCE_BUDGET = 6000
+# Tokens held back for instructions, chat formatting and tokenizer differences between models
+PROMPT_OVERHEAD_TOKENS = 600
+TOKENIZER_SAFETY = 0.9
+# A chunk this much covered by already selected text is dropped as a duplicate
+DUPLICATE_CONTAINMENT = 0.8
+SHINGLE_WORDS = 8
+# A chunk that does not fit is cut to the remaining budget only if that leaves this many tokens
+MIN_PARTIAL_TOKENS = 150
+# Map-reduce summaries: input tokens per batch, and output per batch as a share of its input within bounds
+SUMMARY_COMPRESSION = 0.2
+SUMMARY_BATCH_TOKENS = 3000
+MIN_BATCH_OUTPUT_TOKENS = 128
+MAX_BATCH_OUTPUT_TOKENS = 600
+# Intermediate reduce passes allowed when the batch summaries do not fit the final prompt
+MAX_REDUCE_TIERS = 3
+TOKEN_CACHE_SIZE = 16384
+TOKEN_CACHE_MAX_CHARS = 20000
+
+_FALLBACK_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_encoding_lock = threading.Lock()
+_encoding: Any = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """tiktoken's cl100k_base when installed, else None; loaded on first use"""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                print(f"tiktoken unavailable, estimating token counts: {str(e)}")
+                _encoding = None
+            _encoding_loaded = True
+        return _encoding
+
+
+def _estimate_tokens(text: str) -> int:
+    """Regex estimate close to BPE counts: one token per short word or symbol, long words split every 4 chars"""
+    return sum(max(1, (len(piece) + 3) // 4) if len(piece) > 6 else 1 for piece in _FALLBACK_TOKEN.findall(text))
+
+
+def _count_uncached(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _estimate_tokens(text)
+
+
+_count_cached = lru_cache(maxsize=TOKEN_CACHE_SIZE)(_count_uncached)
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Token count of a text; chunk-sized texts are cached, since the same chunks are counted on every request"""
+    if not text:
+        return 0
+    if len(text) > TOKEN_CACHE_MAX_CHARS:
+        return _count_uncached(text)
+    return _count_cached(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of whole sentences within max_tokens; falls back to whole words"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept: List[str] = []
+    used = 0
+    for sentence in _SENTENCE_END.split(text):
+        cost = count_tokens(sentence + " ")
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return " ".join(kept)
+    words = text.split()
+    while words and count_tokens(" ".join(words)) > max_tokens:
+        words = words[:max(1, int(len(words) * 0.8))] if len(words) > 1 else []
+    return " ".join(words)
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def evidence_budget(model: str, max_output_tokens: int, instruction_tokens: int = 0,
+                    cap: int = DEFAULT_EVIDENCE_BUDGET) -> int:
+    """Tokens left for retrieved evidence once output, instructions and overhead are reserved"""
+    available = int(context_window(model) * TOKENIZER_SAFETY) - max_output_tokens - instruction_tokens - PROMPT_OVERHEAD_TOKENS
+    return max(0, min(cap, available))
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def pack_context(
+    chunks: Sequence[Dict[str, Any]],
+    budget: int,
+    text_key: str = 'CONTENT',
+    score_key: Optional[str] = None,
+    header: Optional[Callable[[Dict[str, Any]], str]] = None,
+    keep_order: bool = False
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Greedily choose chunks by descending score (input order when score_key is
+    None) until the token budget is spent; the header line of each section
+    counts against the budget. Chunks mostly covered by text already chosen
+    are skipped, a chunk that does not fit is skipped in favour of smaller
+    ones, and only the last gap is filled with a sentence-trimmed partial.
+
+    Returns copies of the chosen chunks, with text_key possibly trimmed and
+    'TOKENS' set, in score order or, with keep_order, in input order; and the
+    tokens used.
+    """
+    ranked = list(enumerate(chunks))
+    if score_key:
+        ranked.sort(key=lambda item: item[1].get(score_key) or 0.0, reverse=True)
+
+    selected: List[Tuple[int, Dict[str, Any]]] = []
+    seen_shingles: set = set()
+    used = 0
+    skipped: List[Tuple[int, Dict[str, Any], int]] = []
+    for position, chunk in ranked:
+        text = (chunk.get(text_key) or "").strip()
+        if not text:
+            continue
+        shingles = _shingles(text)
+        if shingles and len(shingles & seen_shingles) / len(shingles) >= DUPLICATE_CONTAINMENT:
+            continue
+        header_tokens = count_tokens(header(chunk)) if header else 0
+        cost = count_tokens(text) + header_tokens
+        if used + cost > budget:
+            skipped.append((position, chunk, header_tokens))
+            continue
+        selected.append((position, dict(chunk, **{text_key: text, 'TOKENS': cost})))
+        seen_shingles |= shingles
+        used += cost
+
+    # Fill what is left with the best chunk that did not fit, trimmed at a sentence boundary
+    for position, chunk, header_tokens in skipped:
+        remaining = budget - used - header_tokens
+        if remaining < MIN_PARTIAL_TOKENS:
+            break
+        text = truncate_to_tokens(chunk.get(text_key).strip(), remaining)
+        if text:
+            cost = count_tokens(text) + header_tokens
+            selected.append((position, dict(chunk, **{text_key: text, 'TOKENS': cost})))
+            used += cost
+        break
+
+    if keep_order:
+        selected.sort(key=lambda item: item[0])
+    return [chunk for _, chunk in selected], used
+
+
+def pack_batches(chunks: Sequence[Dict[str, Any]], batch_budget: int, text_key: str = 'CONTENT') -> List[List[Dict[str, Any]]]:
+    """
+    Split chunks, in order, into consecutive batches of at most batch_budget
+    tokens each. A chunk larger than batch_budget is split into pieces that
+    continue in the following batches, so none of its text is dropped.
+    """
+    from chunking import split_text
+
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for chunk in chunks:
+        text = chunk.get(text_key) or ""
+        cost = count_tokens(text)
+        pieces = [dict(chunk, **{text_key: piece}) for piece in split_text(text, batch_budget)] if cost > batch_budget else [chunk]
+        for piece in pieces:
+            cost = count_tokens(piece.get(text_key) or "") if len(pieces) > 1 else cost
+            if current and used + cost > batch_budget:
+                batches.append(current)
+                current, used = [], 0
+            current.append(piece)
+            used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_output_tokens(input_tokens: int, reduce_budget: int, batches: int) -> int:
+    """
+    Output budget for one map-step summary: a fixed share of its input, within
+    bounds, and small enough that all batch summaries together fit the reduce
+    prompt's budget. Splitting the final answer's max_tokens instead falls
+    towards zero on long documents. With so many batches that this cap drops
+    below MIN_BATCH_OUTPUT_TOKENS the minimum wins, and reduce_groups() then
+    asks for an intermediate pass.
+    """
+    share = int(input_tokens * SUMMARY_COMPRESSION)
+    upper = min(MAX_BATCH_OUTPUT_TOKENS, reduce_budget // max(1, batches))
+    return max(MIN_BATCH_OUTPUT_TOKENS, min(upper, share))
+
+
+def reduce_groups(summaries: Sequence[str], reduce_budget: int) -> Optional[List[List[str]]]:
+    """
+    Consecutive groups of batch summaries to summarize again before the final
+    pass, or None when they already fit reduce_budget together.
+    """
+    if len(summaries) < 2 or count_tokens("\n\n".join(summaries)) <= reduce_budget:
+        return None
+    batches = pack_batches([{'CONTENT': summary} for summary in summaries], SUMMARY_BATCH_TOKENS)
+    return [[chunk['CONTENT'] for chunk in batch] for batch in batches]
+
+
+def relevance_scores(question: str, chunks: Sequence[Dict[str, Any]], text_key: str = 'CONTENT') -> List[float]:
+    """Share of the question's distinct terms found in each chunk, for chunks without a retrieval score"""
+    terms = {t for t in re.findall(r"\w+", question.lower()) if len(t) > 2}
+    if not terms:
+        return [0.0] * len(chunks)
+    return [
+        len(terms & set(re.findall(r"\w+", (chunk.get(text_key) or "").lower()))) / len(terms)
+        for chunk in chunks
+    ]
@@ -0,0 +1,218 @@
+import os
+import mmap
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Union
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+# Bytes of document binaries kept in process memory
+MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+# Bytes of document binaries kept in memory-mapped spill files on local disk
+DISK_BUDGET_BYTES = 2 * 1024 * 1024 * 1024
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "smart_library_doc_cache")
+
+
+class DocumentCache:
+    """
+    Process-wide LRU cache of document binaries keyed by content hash.
+
+    Hot documents live in memory; documents evicted from memory are spilled to
+    local files and served through mmap. Readers always get read-only
+    memoryviews over the single cached buffer, so nothing is copied per reader.
+    """
+    _memory: "OrderedDict[str, Buffer]" = OrderedDict()
+    _memory_bytes = 0
+    _spilled: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+    # Every spill file counted against DISK_BUDGET_BYTES, mapped here or not, coldest first
+    _spill_files: "OrderedDict[str, int]" = OrderedDict()
+    _spilled_bytes = 0
+    _scanned = False
+    _spilling: Dict[str, Buffer] = {}
+    _loading: Dict[str, threading.Event] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _spill_path(content_hash: str) -> str:
+        return os.path.join(SPILL_DIR, f"{content_hash}.bin")
+
+    @staticmethod
+    def _map_file(path: str) -> Optional[mmap.mmap]:
+        """Memory-map a spill file read-only"""
+        try:
+            if os.path.getsize(path) == 0:
+                return None
+            with open(path, "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            print(f"Document cache could not map {path}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _write_spill(content_hash: str, data: Buffer) -> Optional[mmap.mmap]:
+        """Write an evicted document to disk and map it (lock not held: files can be hundreds of MB)"""
+        if len(data) > DISK_BUDGET_BYTES:
+            return None
+        try:
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            path = DocumentCache._spill_path(content_hash)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            return DocumentCache._map_file(path)
+        except OSError as e:
+            print(f"Document cache spill failed for {content_hash}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _scan_spill_dir() -> None:
+        """Count spill files left by earlier runs and other app processes, oldest first (lock held)"""
+        if DocumentCache._scanned:
+            return
+        DocumentCache._scanned = True
+        try:
+            entries = [(e.name[:-len(".bin")], e.stat()) for e in os.scandir(SPILL_DIR)
+                       if e.is_file() and e.name.endswith(".bin")]
+        except OSError:
+            return
+        for content_hash, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+            if content_hash not in DocumentCache._spill_files:
+                DocumentCache._spill_files[content_hash] = stat.st_size
+                DocumentCache._spilled_bytes += stat.st_size
+        DocumentCache._evict_spilled()
+
+    @staticmethod
+    def _evict_spilled() -> None:
+        """Delete the coldest spill files while over DISK_BUDGET_BYTES (lock held)"""
+        while DocumentCache._spilled_bytes > DISK_BUDGET_BYTES and len(DocumentCache._spill_files) > 1:
+            old_hash, old_size = DocumentCache._spill_files.popitem(last=False)
+            DocumentCache._spilled_bytes -= old_size
+            # Readers may still hold views of the mapping; dropping our reference
+            # and unlinking the file is safe, the pages go away with the last view.
+            DocumentCache._spilled.pop(old_hash, None)
+            try:
+                os.remove(DocumentCache._spill_path(old_hash))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _add_spilled(content_hash: str, mapped: mmap.mmap) -> None:
+        """Register a mapped spill file and evict the coldest ones over DISK_BUDGET_BYTES (lock held)"""
+        DocumentCache._scan_spill_dir()
+        if content_hash in DocumentCache._spilled:
+            return
+        DocumentCache._spilled[content_hash] = mapped
+        if content_hash in DocumentCache._spill_files:
+            DocumentCache._spill_files.move_to_end(content_hash)
+        else:
+            DocumentCache._spill_files[content_hash] = len(mapped)
+            DocumentCache._spilled_bytes += len(mapped)
+        DocumentCache._evict_spilled()
+
+    @staticmethod
+    def _store(content_hash: str, data: Buffer) -> None:
+        """Insert a document into the memory tier and spill the coldest ones to disk"""
+        evicted = []
+        with DocumentCache._lock:
+            if content_hash in DocumentCache._memory:
+                return
+            DocumentCache._memory[content_hash] = data
+            DocumentCache._memory_bytes += len(data)
+            while DocumentCache._memory_bytes > MEMORY_BUDGET_BYTES and DocumentCache._memory:
+                old_hash, old_data = DocumentCache._memory.popitem(last=False)
+                DocumentCache._memory_bytes -= len(old_data)
+                # Still served from here while its spill file is written
+                DocumentCache._spilling[old_hash] = old_data
+                evicted.append((old_hash, old_data))
+
+        for old_hash, old_data in evicted:
+            mapped = DocumentCache._write_spill(old_hash, old_data)
+            with DocumentCache._lock:
+                DocumentCache._spilling.pop(old_hash, None)
+                if mapped is not None:
+                    DocumentCache._add_spilled(old_hash, mapped)
+
+    @staticmethod
+    def _lookup(content_hash: str) -> Optional[memoryview]:
+        """Find a cached document in memory, in the spill tier or on disk (lock held)"""
+        DocumentCache._scan_spill_dir()
+        if content_hash in DocumentCache._memory:
+            DocumentCache._memory.move_to_end(content_hash)
+            return memoryview(DocumentCache._memory[content_hash]).toreadonly()
+
+        if content_hash in DocumentCache._spilling:
+            return memoryview(DocumentCache._spilling[content_hash]).toreadonly()
+
+        if content_hash in DocumentCache._spilled:
+            DocumentCache._spilled.move_to_end(content_hash)
+            DocumentCache._spill_files.move_to_end(content_hash)
+            return memoryview(DocumentCache._spilled[content_hash])
+
+        # Spill files survive restarts and are shared by every app process on the host
+        path = DocumentCache._spill_path(content_hash)
+        if os.path.exists(path):
+            mapped = DocumentCache._map_file(path)
+            if mapped is not None:
+                DocumentCache._add_spilled(content_hash, mapped)
+                return memoryview(mapped)
+        return None
+
+    @staticmethod
+    def get(content_hash: str) -> Optional[memoryview]:
+        """Return a read-only view of a cached document, or None"""
+        with DocumentCache._lock:
+            return DocumentCache._lookup(content_hash)
+
+    @staticmethod
+    def get_or_load(content_hash: str, loader: Callable[[], Optional[Buffer]]) -> Optional[memoryview]:
+        """
+        Return a read-only view of the document, calling loader() on a miss.
+        Concurrent misses for the same hash share a single load.
+        """
+        while True:
+            with DocumentCache._lock:
+                view = DocumentCache._lookup(content_hash)
+                if view is not None:
+                    return view
+                pending = DocumentCache._loading.get(content_hash)
+                if pending is None:
+                    pending = threading.Event()
+                    DocumentCache._loading[content_hash] = pending
+                    break
+            # Another reader is fetching this document; wait and look again
+            pending.wait()
+            with DocumentCache._lock:
+                view = DocumentCache._lookup(content_hash)
+            if view is not None:
+                return view
+
+        try:
+            data = loader()
+            if data is None:
+                return None
+            if isinstance(data, memoryview):
+                data = data.obj if isinstance(data.obj, (bytes, bytearray)) and len(data.obj) == len(data) else data.tobytes()
+            DocumentCache._store(content_hash, data)
+            with DocumentCache._lock:
+                view = DocumentCache._lookup(content_hash)
+            # Too large for either tier, or the spill failed: serve what was loaded, uncached
+            return view if view is not None else memoryview(data).toreadonly()
+        finally:
+            with DocumentCache._lock:
+                DocumentCache._loading.pop(content_hash, None)
+            pending.set()
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Current cache occupancy"""
+        with DocumentCache._lock:
+            DocumentCache._scan_spill_dir()
+            return {
+                "memory_documents": len(DocumentCache._memory),
+                "memory_bytes": DocumentCache._memory_bytes,
+                "spilled_documents": len(DocumentCache._spill_files),
+                "spilled_bytes": DocumentCache._spilled_bytes,
+            }
@@ -1,7 +1,19 @@
 import streamlit as st
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, List
+from collections import OrderedDict
+import threading
 import docx
 import io
+import fitz  # PyMuPDF
+from render_cache import RenderCache, content_hash
+
+# Number of PDF pages sent to the browser at once
+PDF_WINDOW_PAGES = 10
+# Maximum number of extracted page ranges kept in memory
+PDF_RANGE_CACHE_SIZE = 64
+# Parsed PDFs kept open for paging, and page counts remembered
+PDF_OPEN_DOCUMENTS = 4
+PDF_PAGE_COUNT_CACHE_SIZE = 256
 
 def get_theme_colors(theme: str) -> Dict[str, str]:
     """Get color scheme for different themes"""
@@ -60,230 +72,307 @@ def pdf_viewer(
         st.error(f"Error displaying PDF: {str(e)}")
         print(f"PDF viewer error details: {str(e)}")
 
-def docx_viewer(
-    binary_content: bytes,
-    width: int = 800,
-    theme: str = "Light",
-    font_size: int = 16,
-    show_headings: bool = True,
-    show_paragraphs: bool = True,
-    show_lists: bool = True
-) -> None:
+
+class PDFPageWindow:
     """
-    Dedicated viewer for DOCX files with rich formatting support.
-    
-    Args:
-        binary_content: Raw bytes of the DOCX file
-        width: Display width in pixels
-        theme: Color theme ("Light", "Dark", "Sepia")
-        font_size: Base font size in pixels
-        show_headings: Whether to show heading structure
-        show_paragraphs: Whether to show paragraph structure
-        show_lists: Whether to show list structure
+    Splits PDFs into small page ranges so the viewer only receives the visible pages.
+
+    Only the payload sent to the browser is windowed: the caller still loads
+    the whole file from RAG_METADATA.BINARY_CONTENT (once per content hash,
+    through DocumentCache), so time to first page still grows with the size
+    of the book. Parsed documents are kept open per doc_key so paging does
+    not re-parse the file.
     """
-    try:
-        # Create document object
-        doc = docx.Document(io.BytesIO(binary_content))
-        theme_colors = get_theme_colors(theme)
-        
-        # Create container for document
-        doc_container = st.container()
-        
-        with doc_container:
-            # Main document container
-            st.markdown(f"""
-                <div style="
-                    background-color: {theme_colors['bg']};
-                    padding: 2rem;
-                    border-radius: 8px;
-                    width: {width}px;
-                    margin: 0 auto;
-                    color: {theme_colors['text']};
-                    font-family: 'Georgia', serif;
-                    border: 1px solid {theme_colors['border']};
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                ">
-            """, unsafe_allow_html=True)
-            
-            # Process each paragraph
-            for para in doc.paragraphs:
-                if not para.text.strip():
-                    continue
-                
-                style_name = para.style.name.lower()
-                
-                # Handle headings
-                if 'heading' in style_name and show_headings:
-                    level = style_name[-1] if style_name[-1].isdigit() else '2'
-                    font_size_heading = font_size + (4 - int(level)) * 2
-                    
-                    st.markdown(f"""
-                        <h{level} style="
-                            color: {theme_colors['heading']};
-                            font-size: {font_size_heading}px;
-                            margin: 1em 0 0.5em 0;
-                            font-weight: bold;
-                            border-bottom: 1px solid {theme_colors['border']};
-                            padding-bottom: 0.2em;
-                        ">
-                            {para.text}
-                        </h{level}>
-                    """, unsafe_allow_html=True)
-                
-                # Handle lists
-                elif show_lists and (para.text.strip().startswith('-') or 
-                                   para.text.strip().startswith('•') or
-                                   para.text.strip().startswith('*')):
-                    st.markdown(f"""
-                        <ul style="
-                            margin-left: 1.5em;
-                            margin-bottom: 0.5em;
-                            font-size: {font_size}px;
-                            color: {theme_colors['text']};
-                        ">
-                            <li style="margin-bottom: 0.3em;">
-                                {para.text.lstrip('- •*')}
-                            </li>
-                        </ul>
-                    """, unsafe_allow_html=True)
-                
-                # Handle regular paragraphs
-                elif show_paragraphs:
-                    st.markdown(f"""
-                        <p style="
-                            margin-bottom: 1.2em;
-                            font-size: {font_size}px;
-                            line-height: 1.6;
-                            color: {theme_colors['text']};
-                            text-align: justify;
-                        ">
-                            {para.text}
-                        </p>
-                    """, unsafe_allow_html=True)
-            
-            # Close main container
-            st.markdown("</div>", unsafe_allow_html=True)
-            
-    except Exception as e:
-        st.error(f"Error displaying DOCX: {str(e)}")
-        print(f"DOCX viewer error details: {str(e)}")
+    _ranges: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+    _documents: "OrderedDict[str, fitz.Document]" = OrderedDict()
+    _page_counts: "OrderedDict[str, int]" = OrderedDict()
+    _pending: set = set()
+    _lock = threading.Lock()
+    # PyMuPDF is not thread-safe, so every use of an open document goes through this lock
+    _fitz_lock = threading.Lock()
 
+    @staticmethod
+    def _document(binary_content: bytes, doc_key: str) -> "fitz.Document":
+        """Open document for doc_key; call with _fitz_lock held"""
+        doc = PDFPageWindow._documents.get(doc_key)
+        if doc is None:
+            doc = fitz.open(stream=binary_content, filetype="pdf")
+            PDFPageWindow._documents[doc_key] = doc
+            while len(PDFPageWindow._documents) > PDF_OPEN_DOCUMENTS:
+                _, evicted = PDFPageWindow._documents.popitem(last=False)
+                evicted.close()
+        PDFPageWindow._documents.move_to_end(doc_key)
+        return doc
 
-def text_viewer(
+    @staticmethod
+    def page_count(binary_content: bytes, doc_key: str) -> int:
+        """Return the number of pages in the PDF, cached per document"""
+        with PDFPageWindow._lock:
+            if doc_key in PDFPageWindow._page_counts:
+                PDFPageWindow._page_counts.move_to_end(doc_key)
+                return PDFPageWindow._page_counts[doc_key]
+
+        with PDFPageWindow._fitz_lock:
+            count = PDFPageWindow._document(binary_content, doc_key).page_count
+
+        with PDFPageWindow._lock:
+            PDFPageWindow._page_counts[doc_key] = count
+            while len(PDFPageWindow._page_counts) > PDF_PAGE_COUNT_CACHE_SIZE:
+                PDFPageWindow._page_counts.popitem(last=False)
+        return count
+
+    @staticmethod
+    def get_range(binary_content: bytes, doc_key: str, start_page: int, end_page: int) -> bytes:
+        """
+        Get a standalone PDF containing pages start_page..end_page (1-based, inclusive).
+        Extracted ranges are cached so paging back and forth is instant.
+        """
+        key = (doc_key, start_page, end_page)
+        with PDFPageWindow._lock:
+            if key in PDFPageWindow._ranges:
+                PDFPageWindow._ranges.move_to_end(key)
+                return PDFPageWindow._ranges[key]
+
+        with PDFPageWindow._fitz_lock:
+            source = PDFPageWindow._document(binary_content, doc_key)
+            window = fitz.open()
+            try:
+                window.insert_pdf(source, from_page=start_page - 1, to_page=end_page - 1)
+                range_bytes = window.tobytes(garbage=1, deflate=True)
+            finally:
+                window.close()
+
+        with PDFPageWindow._lock:
+            PDFPageWindow._ranges[key] = range_bytes
+            while len(PDFPageWindow._ranges) > PDF_RANGE_CACHE_SIZE:
+                PDFPageWindow._ranges.popitem(last=False)
+        return range_bytes
+
+    @staticmethod
+    def prefetch(binary_content: bytes, doc_key: str, start_page: int, end_page: int) -> None:
+        """Extract a page range in the background so it is ready when the reader gets there"""
+        key = (doc_key, start_page, end_page)
+        with PDFPageWindow._lock:
+            if key in PDFPageWindow._ranges or key in PDFPageWindow._pending:
+                return
+            PDFPageWindow._pending.add(key)
+
+        def _extract():
+            try:
+                PDFPageWindow.get_range(binary_content, doc_key, start_page, end_page)
+            except Exception as e:
+                print(f"PDF prefetch error for {doc_key} pages {start_page}-{end_page}: {str(e)}")
+            finally:
+                with PDFPageWindow._lock:
+                    PDFPageWindow._pending.discard(key)
+
+        threading.Thread(target=_extract, daemon=True).start()
+
+
+def paged_pdf_viewer(
     binary_content: bytes,
+    doc_key: str,
     width: int = 800,
-    theme: str = "Light",
-    font_size: int = 16,
-    line_spacing: float = 1.6
+    enable_text: bool = True,
+    pages_vertical_spacing: int = 2,
+    resolution_boost: int = 1,
+    window_pages: int = PDF_WINDOW_PAGES
 ) -> None:
     """
-    Dedicated viewer for text files with enhanced readability.
-    
+    PDF viewer that only sends a window of pages to the browser. binary_content
+    is still the whole file; only the browser payload is windowed.
+
     Args:
-        binary_content: Raw bytes of the text file
+        binary_content: Raw bytes of the PDF file
+        doc_key: Stable identifier of this version of the document, used for caching
         width: Display width in pixels
-        theme: Color theme ("Light", "Dark", "Sepia")
-        font_size: Font size in pixels
-        line_spacing: Line height multiplier
+        enable_text: Whether to enable text selection
+        pages_vertical_spacing: Space between pages in pixels
+        resolution_boost: Quality multiplier for rendering
+        window_pages: Number of pages rendered at once
     """
     try:
-        content = binary_content.decode('utf-8')
-        theme_colors = get_theme_colors(theme)
-        
-        # Split content into paragraphs
-        paragraphs = [p for p in content.split('\n\n') if p.strip()]
-        
-        # Container for text content
-        text_container = st.container()
-        
-        with text_container:
-            st.markdown(f"""
-                <div style="
-                    background-color: {theme_colors['bg']};
-                    padding: 2rem;
-                    border-radius: 8px;
-                    width: {width}px;
-                    margin: 0 auto;
-                    color: {theme_colors['text']};
-                    font-family: 'Georgia', serif;
-                    border: 1px solid {theme_colors['border']};
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                ">
-            """, unsafe_allow_html=True)
-            
-            for para in paragraphs:
-                # Check if paragraph is a header (starts with #)
-                if para.strip().startswith('#'):
-                    level = len(para.split()[0])  # Count number of # symbols
-                    text = ' '.join(para.split()[1:])
-                    font_size_heading = font_size + (4 - level) * 2
-                    
-                    st.markdown(f"""
-                        <h{level} style="
-                            color: {theme_colors['heading']};
-                            font-size: {font_size_heading}px;
-                            margin: 1em 0 0.5em 0;
-                            font-weight: bold;
-                            border-bottom: 1px solid {theme_colors['border']};
-                            padding-bottom: 0.2em;
-                        ">{text}</h{level}>
-                    """, unsafe_allow_html=True)
-                    
-                # Check if paragraph is a list item
-                elif para.strip().startswith(('-', '*', '•')):
-                    st.markdown(f"""
-                        <ul style="
-                            margin-left: 1.5em;
-                            margin-bottom: 0.5em;
-                            font-size: {font_size}px;
-                            color: {theme_colors['text']};
-                        ">
-                            <li style="margin-bottom: 0.3em;">
-                                {para.strip().lstrip('- *•')}
-                            </li>
-                        </ul>
-                    """, unsafe_allow_html=True)
-                    
-                # Regular paragraph
-                else:
-                    st.markdown(f"""
-                        <p style="
-                            margin-bottom: 1.2em;
-                            font-size: {font_size}px;
-                            line-height: {line_spacing};
-                            color: {theme_colors['text']};
-                            text-align: justify;
-                        ">{para}</p>
-                    """, unsafe_allow_html=True)
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-            
+        total_pages = PDFPageWindow.page_count(binary_content, doc_key)
+        if total_pages == 0:
+            st.warning("This PDF has no pages.")
+            return
+
+        window_pages = max(1, window_pages)
+        start_key = f"pdf_window_start_{doc_key}"
+        if start_key not in st.session_state:
+            st.session_state[start_key] = 1
+
+        nav_prev, nav_page, nav_next = st.columns([1, 2, 1])
+        with nav_prev:
+            if st.button("◀ Previous", key=f"pdf_prev_{doc_key}", use_container_width=True,
+                         disabled=st.session_state[start_key] <= 1):
+                st.session_state[start_key] = max(1, st.session_state[start_key] - window_pages)
+        with nav_next:
+            if st.button("Next ▶", key=f"pdf_next_{doc_key}", use_container_width=True,
+                         disabled=st.session_state[start_key] + window_pages > total_pages):
+                st.session_state[start_key] = min(total_pages, st.session_state[start_key] + window_pages)
+        with nav_page:
+            st.number_input(
+                f"Start page (of {total_pages})",
+                min_value=1,
+                max_value=total_pages,
+                key=start_key
+            )
+
+        start_page = st.session_state[start_key]
+        end_page = min(total_pages, start_page + window_pages - 1)
+        st.caption(f"Showing pages {start_page}–{end_page} of {total_pages}")
+
+        window_bytes = PDFPageWindow.get_range(binary_content, doc_key, start_page, end_page)
+
+        # Warm up the next window while the current one is being read
+        if end_page < total_pages:
+            PDFPageWindow.prefetch(
+                binary_content,
+                doc_key,
+                end_page + 1,
+                min(total_pages, end_page + window_pages)
+            )
+
+        pdf_viewer(
+            binary_content=window_bytes,
+            width=width,
+            enable_text=enable_text,
+            pages_vertical_spacing=pages_vertical_spacing,
+            resolution_boost=resolution_boost
+        )
     except Exception as e:
-        st.error(f"Error displaying text: {str(e)}")
+        st.error(f"Error displaying PDF: {str(e)}")
+        print(f"Paged PDF viewer error details: {str(e)}")
 
-def get_theme_colors(theme: str) -> Dict[str, str]:
-    """Get color scheme for different themes"""
-    themes = {
-        "Light": {
-            "bg": "#FFFFFF",
-            "text": "#000000",
-            "heading": "#333333",
-            "border": "#E0E0E0"
-        },
-        "Dark": {
-            "bg": "#1E1E1E",
-            "text": "#E0E0E0",
-            "heading": "#FFFFFF",
-            "border": "#333333"
-        },
-        "Sepia": {
-            "bg": "#F4ECD8",
-            "text": "#5C4B51",
-            "heading": "#2C1810",
-            "border": "#C4A484"
-        }
-    }
-    return themes.get(theme, themes["Light"])
+
+def _section_pager(total_pages: int, doc_key: str) -> int:
+    """Render previous/next controls for paginated documents and return the current page"""
+    page_key = f"doc_section_page_{doc_key}"
+    if page_key not in st.session_state or st.session_state[page_key] > total_pages:
+        st.session_state[page_key] = 1
+    if total_pages <= 1:
+        return 1
+
+    nav_prev, nav_page, nav_next = st.columns([1, 2, 1])
+    with nav_prev:
+        if st.button("◀ Previous", key=f"doc_prev_{doc_key}", use_container_width=True,
+                     disabled=st.session_state[page_key] <= 1):
+            st.session_state[page_key] -= 1
+    with nav_next:
+        if st.button("Next ▶", key=f"doc_next_{doc_key}", use_container_width=True,
+                     disabled=st.session_state[page_key] >= total_pages):
+            st.session_state[page_key] += 1
+    with nav_page:
+        st.number_input(
+            f"Section (of {total_pages})",
+            min_value=1,
+            max_value=total_pages,
+            key=page_key
+        )
+    return st.session_state[page_key]
+
+def _render_sections(blocks, doc_key: str, width: int, theme_colors: Dict[str, str]) -> None:
+    """Send the visible window of pre-rendered blocks as a single HTML fragment"""
+    page = _section_pager(RenderCache.page_count(blocks), doc_key)
+    st.markdown(f"""
+        <div style="
+            background-color: {theme_colors['bg']};
+            padding: 2rem;
+            border-radius: 8px;
+            width: {width}px;
+            margin: 0 auto;
+            color: {theme_colors['text']};
+            font-family: 'Georgia', serif;
+            border: 1px solid {theme_colors['border']};
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        ">
+        {RenderCache.get_page(blocks, page)}
+        </div>
+    """, unsafe_allow_html=True)
+
+def _build_docx_blocks(
+    binary_content: bytes,
+    theme_colors: Dict[str, str],
+    font_size: int,
+    show_headings: bool,
+    show_paragraphs: bool,
+    show_lists: bool
+) -> List[str]:
+    """Convert a DOCX file into HTML blocks, one per heading, list item or paragraph"""
+    doc = docx.Document(io.BytesIO(binary_content))
+    blocks = []
+
+    for para in doc.paragraphs:
+        if not para.text.strip():
+            continue
+
+        style_name = para.style.name.lower()
+
+        # Handle headings
+        if 'heading' in style_name and show_headings:
+            level = style_name[-1] if style_name[-1].isdigit() else '2'
+            font_size_heading = font_size + (4 - int(level)) * 2
+            blocks.append(
+                f'<h{level} style="color: {theme_colors["heading"]}; font-size: {font_size_heading}px; '
+                f'margin: 1em 0 0.5em 0; font-weight: bold; border-bottom: 1px solid {theme_colors["border"]}; '
+                f'padding-bottom: 0.2em;">{para.text}</h{level}>'
+            )
+
+        # Handle lists
+        elif show_lists and para.text.strip().startswith(('-', '•', '*')):
+            blocks.append(
+                f'<ul style="margin-left: 1.5em; margin-bottom: 0.5em; font-size: {font_size}px; '
+                f'color: {theme_colors["text"]};">'
+                f'<li style="margin-bottom: 0.3em;">{para.text.lstrip("- •*")}</li></ul>'
+            )
+
+        # Handle regular paragraphs
+        elif show_paragraphs:
+            blocks.append(
+                f'<p style="margin-bottom: 1.2em; font-size: {font_size}px; line-height: 1.6; '
+                f'color: {theme_colors["text"]}; text-align: justify;">{para.text}</p>'
+            )
+
+    return blocks
+
+def _build_text_blocks(
+    content: str,
+    theme_colors: Dict[str, str],
+    font_size: int,
+    line_spacing: float
+) -> List[str]:
+    """Convert plain text into HTML blocks, one per heading, list item or paragraph"""
+    blocks = []
+
+    for para in (p for p in content.split('\n\n') if p.strip()):
+        # Check if paragraph is a header (starts with #)
+        if para.strip().startswith('#'):
+            level = len(para.split()[0])  # Count number of # symbols
+            text = ' '.join(para.split()[1:])
+            font_size_heading = font_size + (4 - level) * 2
+            blocks.append(
+                f'<h{level} style="color: {theme_colors["heading"]}; font-size: {font_size_heading}px; '
+                f'margin: 1em 0 0.5em 0; font-weight: bold; border-bottom: 1px solid {theme_colors["border"]}; '
+                f'padding-bottom: 0.2em;">{text}</h{level}>'
+            )
+
+        # Check if paragraph is a list item
+        elif para.strip().startswith(('-', '*', '•')):
+            blocks.append(
+                f'<ul style="margin-left: 1.5em; margin-bottom: 0.5em; font-size: {font_size}px; '
+                f'color: {theme_colors["text"]};">'
+                f'<li style="margin-bottom: 0.3em;">{para.strip().lstrip("- *•")}</li></ul>'
+            )
+
+        # Regular paragraph
+        else:
+            blocks.append(
+                f'<p style="margin-bottom: 1.2em; font-size: {font_size}px; line-height: {line_spacing}; '
+                f'color: {theme_colors["text"]}; text-align: justify;">{para}</p>'
+            )
+
+    return blocks
 
 def docx_viewer(
     binary_content: bytes,
@@ -307,77 +396,18 @@ def docx_viewer(
         show_lists: Whether to show list structure
     """
     try:
-        doc = docx.Document(io.BytesIO(binary_content))
         theme_colors = get_theme_colors(theme)
-        
-        # Container for document content
-        doc_container = st.container()
-        
-        with doc_container:
-            st.markdown(f"""
-                <div style="
-                    background-color: {theme_colors['bg']};
-                    padding: 2rem;
-                    border-radius: 8px;
-                    width: {width}px;
-                    margin: 0 auto;
-                    color: {theme_colors['text']};
-                    font-family: 'Georgia', serif;
-                    border: 1px solid {theme_colors['border']};
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                ">
-            """, unsafe_allow_html=True)
-            
-            for para in doc.paragraphs:
-                if not para.text.strip():
-                    continue
-                
-                style_name = para.style.name.lower()
-                
-                # Handle headings
-                if 'heading' in style_name and show_headings:
-                    level = style_name[-1] if style_name[-1].isdigit() else '2'
-                    font_size_heading = font_size + (4 - int(level)) * 2
-                    
-                    st.markdown(f"""
-                        <h{level} style="
-                            color: {theme_colors['heading']};
-                            font-size: {font_size_heading}px;
-                            margin: 1em 0 0.5em 0;
-                            font-weight: bold;
-                            border-bottom: 1px solid {theme_colors['border']};
-                            padding-bottom: 0.2em;
-                        ">{para.text}</h{level}>
-                    """, unsafe_allow_html=True)
-                
-                # Handle lists
-                elif show_lists and (para.text.strip().startswith('-') or 
-                                   para.text.strip().startswith('•') or
-                                   para.text.strip().startswith('*')):
-                    st.markdown(f"""
-                        <ul style="
-                            margin-left: 1.5em;
-                            margin-bottom: 0.5em;
-                            font-size: {font_size}px;
-                            color: {theme_colors['text']};
-                        ">
-                            <li style="margin-bottom: 0.3em;">{para.text.lstrip('- •*')}</li>
-                        </ul>
-                    """, unsafe_allow_html=True)
-                
-                # Handle regular paragraphs
-                elif show_paragraphs:
-                    st.markdown(f"""
-                        <p style="
-                            margin-bottom: 1.2em;
-                            font-size: {font_size}px;
-                            line-height: 1.6;
-                            color: {theme_colors['text']};
-                            text-align: justify;
-                        ">{para.text}</p>
-                    """, unsafe_allow_html=True)
-            
-            st.markdown("</div>", unsafe_allow_html=True)
+        doc_hash = content_hash(binary_content)
+        renderer = f"docx:{int(show_headings)}{int(show_paragraphs)}{int(show_lists)}"
+
+        blocks = RenderCache.get_blocks(
+            doc_hash, renderer, theme, font_size,
+            lambda: _build_docx_blocks(
+                binary_content, theme_colors, font_size,
+                show_headings, show_paragraphs, show_lists
+            )
+        )
+        _render_sections(blocks, doc_hash, width, theme_colors)
             
     except Exception as e:
         st.error(f"Error displaying DOCX: {str(e)}")
@@ -400,76 +430,16 @@ def text_viewer(
         line_spacing: Line height multiplier
     """
     try:
-        content = binary_content.decode('utf-8')
         theme_colors = get_theme_colors(theme)
-        
-        # Split content into paragraphs
-        paragraphs = [p for p in content.split('\n\n') if p.strip()]
-        
-        # Container for text content
-        text_container = st.container()
-        
-        with text_container:
-            st.markdown(f"""
-                <div style="
-                    background-color: {theme_colors['bg']};
-                    padding: 2rem;
-                    border-radius: 8px;
-                    width: {width}px;
-                    margin: 0 auto;
-                    color: {theme_colors['text']};
-                    font-family: 'Georgia', serif;
-                    border: 1px solid {theme_colors['border']};
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                ">
-            """, unsafe_allow_html=True)
-            
-            for para in paragraphs:
-                # Check if paragraph is a header (starts with #)
-                if para.strip().startswith('#'):
-                    level = len(para.split()[0])  # Count number of # symbols
-                    text = ' '.join(para.split()[1:])
-                    font_size_heading = font_size + (4 - level) * 2
-                    
-                    st.markdown(f"""
-                        <h{level} style="
-                            color: {theme_colors['heading']};
-                            font-size: {font_size_heading}px;
-                            margin: 1em 0 0.5em 0;
-                            font-weight: bold;
-                            border-bottom: 1px solid {theme_colors['border']};
-                            padding-bottom: 0.2em;
-                        ">{text}</h{level}>
-                    """, unsafe_allow_html=True)
-                    
-                # Check if paragraph is a list item
-                elif para.strip().startswith(('-', '*', '•')):
-                    st.markdown(f"""
-                        <ul style="
-                            margin-left: 1.5em;
-                            margin-bottom: 0.5em;
-                            font-size: {font_size}px;
-                            color: {theme_colors['text']};
-                        ">
-                            <li style="margin-bottom: 0.3em;">
-                                {para.strip().lstrip('- *•')}
-                            </li>
-                        </ul>
-                    """, unsafe_allow_html=True)
-                    
-                # Regular paragraph
-                else:
-                    st.markdown(f"""
-                        <p style="
-                            margin-bottom: 1.2em;
-                            font-size: {font_size}px;
-                            line-height: {line_spacing};
-                            color: {theme_colors['text']};
-                            text-align: justify;
-                        ">{para}</p>
-                    """, unsafe_allow_html=True)
-            
-            st.markdown("</div>", unsafe_allow_html=True)
+        doc_hash = content_hash(binary_content)
+
+        blocks = RenderCache.get_blocks(
+            doc_hash, f"text:{line_spacing}", theme, font_size,
+            lambda: _build_text_blocks(
+                bytes(binary_content).decode('utf-8'), theme_colors, font_size, line_spacing
+            )
+        )
+        _render_sections(blocks, doc_hash, width, theme_colors)
             
     except Exception as e:
         st.error(f"Error displaying text: {str(e)}")
@@ -0,0 +1,86 @@
+# Deferred loading of heavy optional dependencies (TruLens, Snowflake Core).
+# Methods are decorated with the `instrument` shim below; the real TruLens
+# instrumentation is attached only when an evaluator is created.
+import inspect
+import threading
+from typing import Any, Callable, Dict, Optional
+
+_lock = threading.Lock()
+# Keyed by module and qualified name, so a script rerun replaces its methods instead of adding more
+_pending_methods: Dict[str, Callable] = {}
+_tru = None
+
+
+class _DeferredInstrument:
+    """Stand-in for trulens.apps.custom.instrument that records methods for later"""
+
+    def __call__(self, func: Callable) -> Callable:
+        # The class is still being defined here, so its methods are registered
+        # at the next apply_instrumentation(), never from the decorator itself
+        original = inspect.unwrap(func)
+        with _lock:
+            _pending_methods[f"{original.__module__}.{original.__qualname__}"] = func
+        return func
+
+    @staticmethod
+    def method(owner: type, name: str) -> None:
+        """Mirror of instrument.method(cls, name) for methods that cannot be decorated"""
+        func = getattr(owner, name)
+        func = getattr(func, '__func__', func)
+        instrument(func)
+
+
+instrument = _DeferredInstrument()
+
+
+def _owner_of(func: Callable) -> Optional[type]:
+    """
+    Find the class a recorded function was defined in from its qualified name,
+    starting at the globals of the module that defined it. Works for scripts
+    run as __main__, whose module name does not lead back to their classes.
+    None while the class is not defined yet, e.g. during a Streamlit rerun.
+    """
+    original = inspect.unwrap(func)
+    owner: Any = None
+    for i, part in enumerate(original.__qualname__.split('.')[:-1]):
+        owner = original.__globals__.get(part) if i == 0 else getattr(owner, part, None)
+        if owner is None:
+            break
+    return owner if isinstance(owner, type) else None
+
+
+def apply_instrumentation() -> None:
+    """
+    Register methods decorated so far with TruLens. Methods whose class is not
+    defined yet stay queued for the next call; evaluators call this each time
+    they are created.
+    """
+    from trulens.apps.custom import instrument as trulens_instrument
+
+    with _lock:
+        for key, func in list(_pending_methods.items()):
+            if '<locals>' in inspect.unwrap(func).__qualname__:
+                print(f"Cannot instrument {inspect.unwrap(func).__qualname__}: @instrument only supports methods of module-level classes")
+                del _pending_methods[key]
+                continue
+            owner = _owner_of(func)
+            if owner is None:
+                continue
+            trulens_instrument.method(owner, func.__name__)
+            del _pending_methods[key]
+
+
+def get_tru():
+    """The process-wide TruLens session, created on first use"""
+    global _tru
+    with _lock:
+        if _tru is None:
+            from trulens_eval import Tru
+            _tru = Tru()
+        return _tru
+
+
+def get_root(session):
+    """Snowflake Core API root for a session; snowflake.core is only imported when search runs"""
+    from snowflake.core import Root
+    return Root(session)
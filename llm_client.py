@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Dict, List, Optional, Sequence, Tuple
+
+import statements
+from statements import json_param
+from llm_streaming import response_text
+from tracing import span
+
+# Cortex calls in flight at once across every user of this server process
+MAX_CONCURRENT_CALLS = 8
+# Optional requests-per-minute limits, for accounts with a Cortex quota to stay under:
+# SMART_LIBRARY_LLM_RATE_LIMITS="mistral-large=60,mistral-large2=60" limits those models,
+# SMART_LIBRARY_LLM_RATE_DEFAULT=120 limits every other model. Unset means unlimited.
+RATE_LIMITS_ENV = "SMART_LIBRARY_LLM_RATE_LIMITS"
+RATE_DEFAULT_ENV = "SMART_LIBRARY_LLM_RATE_DEFAULT"
+
+
+def _parse_rate_limits(text: str) -> Dict[str, float]:
+    limits = {}
+    for item in text.split(","):
+        model, _, rate = item.partition("=")
+        if model.strip() and rate.strip():
+            limits[model.strip()] = float(rate)
+    return limits
+
+
+MODEL_RATE_LIMITS: Dict[str, float] = _parse_rate_limits(os.environ.get(RATE_LIMITS_ENV, ""))
+DEFAULT_RATE_PER_MINUTE: Optional[float] = float(os.environ[RATE_DEFAULT_ENV]) if os.environ.get(RATE_DEFAULT_ENV) else None
+# Async job polling backs off from the first interval to the last
+POLL_INITIAL_SECONDS = 0.02
+POLL_MAX_SECONDS = 0.25
+CALL_TIMEOUT_SECONDS = 300
+
+
+class TokenBucket:
+    """Requests-per-minute limiter for one model; only used from the client's event loop"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        # Up to ten seconds' worth of requests may go out in a burst
+        self.capacity = capacity or max(1.0, per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> float:
+        """Take one request slot, sleeping until one is free; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            delay = (1 - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+
+class LLMClient:
+    """
+    Process-wide asyncio client for COMPLETE and EMBED calls.
+
+    Calls run as Snowpark async jobs on one event loop thread, so a fan-out of
+    many prompts costs no thread per call. A global semaphore caps concurrent
+    calls, a token bucket per model enforces its configured rate limit, and identical
+    requests already in flight, from any user, share a single call.
+    The blocking helpers are for the Streamlit script thread; the a* coroutines
+    are for code already running on the client's loop.
+    """
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _thread: Optional[threading.Thread] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _buckets: Dict[str, TokenBucket] = {}
+    # Job status checks and result fetches are blocking round trips, kept off the loop thread
+    _poller = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS, thread_name_prefix="llm-poll")
+    _in_flight: Dict[str, "asyncio.Future"] = {}
+    _stats: Counter = Counter()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _ensure_loop() -> asyncio.AbstractEventLoop:
+        with LLMClient._lock:
+            if LLMClient._loop is None:
+                loop = asyncio.new_event_loop()
+                LLMClient._semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+                LLMClient._thread = threading.Thread(target=loop.run_forever, name="llm-client", daemon=True)
+                LLMClient._thread.start()
+                LLMClient._loop = loop
+            return LLMClient._loop
+
+    @staticmethod
+    def _run(coroutine: Awaitable) -> Any:
+        loop = LLMClient._ensure_loop()
+        if threading.current_thread() is LLMClient._thread:
+            raise RuntimeError("LLMClient blocking calls cannot run on the client loop; await the a* methods")
+        # Each Cortex call has its own CALL_TIMEOUT_SECONDS, so a throttled fan-out can take longer
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    @staticmethod
+    def set_rate_limit(model: str, per_minute: float) -> None:
+        """Change a model's limit; takes effect for the next request"""
+        MODEL_RATE_LIMITS[model] = per_minute
+        LLMClient._buckets.pop(model, None)
+
+    @staticmethod
+    def _bucket(model: str) -> Optional[TokenBucket]:
+        """The model's limiter, or None when no limit is configured for it"""
+        bucket = LLMClient._buckets.get(model)
+        if bucket is None:
+            per_minute = MODEL_RATE_LIMITS.get(model, DEFAULT_RATE_PER_MINUTE)
+            if not per_minute:
+                return None
+            bucket = LLMClient._buckets[model] = TokenBucket(per_minute)
+        return bucket
+
+    @staticmethod
+    async def _execute(session, model: str, statement: statements.Statement, params: Sequence[Any]) -> List[Any]:
+        bucket = LLMClient._bucket(model)
+        if bucket is not None and await bucket.acquire():
+            LLMClient._stats['rate_limited'] += 1
+        async with LLMClient._semaphore:
+            LLMClient._stats['calls'] += 1
+            # Timed from the moment the call runs, not while it waits for a slot
+            try:
+                return await asyncio.wait_for(LLMClient._collect(session, statement, params), CALL_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{statement.name} on {model} took longer than {CALL_TIMEOUT_SECONDS}s") from None
+
+    @staticmethod
+    async def _collect(session, statement: statements.Statement, params: Sequence[Any]) -> List[Any]:
+        """Submit the statement as an async job and poll it; a timed out job is cancelled"""
+        loop = asyncio.get_running_loop()
+        job = await loop.run_in_executor(LLMClient._poller, statement.query(session, *params).collect_nowait)
+        try:
+            delay = POLL_INITIAL_SECONDS
+            while not await loop.run_in_executor(LLMClient._poller, job.is_done):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, POLL_MAX_SECONDS)
+            return await loop.run_in_executor(LLMClient._poller, job.result)
+        except asyncio.CancelledError:
+            LLMClient._poller.submit(job.cancel)
+            raise
+
+    @staticmethod
+    async def _call(session, model: str, statement: statements.Statement, params: Sequence[Any]) -> List[Any]:
+        """Run a statement through the limits, joining an identical call that is already in flight"""
+        key = hashlib.sha256(json.dumps([statement.name, list(params)], default=str).encode()).hexdigest()
+        LLMClient._stats['requests'] += 1
+        task = LLMClient._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(LLMClient._execute(session, model, statement, params))
+            LLMClient._in_flight[key] = task
+            task.add_done_callback(lambda _task: LLMClient._in_flight.pop(key, None))
+        else:
+            LLMClient._stats['coalesced'] += 1
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def acomplete_raw(
+        session,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 500,
+        options: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """COMPLETE response as returned by Cortex (JSON text with choices)"""
+        call_options = {'temperature': float(temperature), 'max_tokens': int(max_tokens), **(options or {})}
+        rows = await LLMClient._call(
+            session, model, statements.COMPLETE_CHAT_OPTIONS,
+            [model, system_prompt, user_prompt, json_param(call_options)]
+        )
+        return statements.first_value(rows, 'RESPONSE')
+
+    @staticmethod
+    async def acomplete(session, model: str, system_prompt: str, user_prompt: str,
+                        temperature: float = 0.3, max_tokens: int = 500,
+                        options: Optional[Dict[str, Any]] = None) -> str:
+        raw = await LLMClient.acomplete_raw(session, model, system_prompt, user_prompt, temperature, max_tokens, options)
+        return response_text(raw)
+
+    @staticmethod
+    async def aembed(session, text: str, model: str = statements.EMBED_MODEL) -> List[float]:
+        rows = await LLMClient._call(session, model, statements.EMBED_TEXT, [model, text])
+        embedding = statements.first_value(rows, 'EMBEDDING')
+        if isinstance(embedding, str):
+            embedding = json.loads(embedding)
+        return [float(x) for x in embedding or []]
+
+    @staticmethod
+    async def _gather(coroutines: Sequence[Awaitable]) -> List[Any]:
+        """Results in order; a failed call yields None instead of failing the batch"""
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error in LLM call: {str(result)}")
+        return [None if isinstance(r, Exception) else r for r in results]
+
+    @staticmethod
+    def run_all(coroutines: Sequence[Awaitable]) -> List[Any]:
+        """Blocking fan-out of a* coroutines built by the caller, for requests that differ in options"""
+        with span("llm.run_all", requests=len(coroutines)):
+            return LLMClient._run(LLMClient._gather(coroutines))
+
+    @staticmethod
+    def complete(session, model: str, system_prompt: str, user_prompt: str,
+                 temperature: float = 0.3, max_tokens: int = 500,
+                 options: Optional[Dict[str, Any]] = None) -> str:
+        """Blocking COMPLETE returning the answer text"""
+        with span("llm.complete", model=model, max_tokens=max_tokens):
+            return LLMClient._run(
+                LLMClient.acomplete(session, model, system_prompt, user_prompt, temperature, max_tokens, options)
+            )
+
+    @staticmethod
+    def complete_many(
+        session,
+        model: str,
+        prompts: Sequence[Tuple[str, str]],
+        temperature: float = 0.3,
+        max_tokens: int = 500,
+        options: Optional[Dict[str, Any]] = None,
+        raw: bool = False
+    ) -> List[Optional[str]]:
+        """
+        Run (system_prompt, user_prompt) pairs concurrently and return their
+        answers in order; None marks a failed call. raw=True returns Cortex's
+        JSON responses instead of answer text.
+        """
+        call = LLMClient.acomplete_raw if raw else LLMClient.acomplete
+        with span("llm.complete_many", model=model, requests=len(prompts)):
+            return LLMClient._run(LLMClient._gather([
+                call(session, model, system_prompt, user_prompt, temperature, max_tokens, options)
+                for system_prompt, user_prompt in prompts
+            ]))
+
+    @staticmethod
+    def embed(session, text: str, model: str = statements.EMBED_MODEL) -> List[float]:
+        with span("llm.embed", model=model):
+            return LLMClient._run(LLMClient.aembed(session, text, model))
+
+    @staticmethod
+    def embed_many(session, texts: Sequence[str], model: str = statements.EMBED_MODEL) -> List[Optional[List[float]]]:
+        with span("llm.embed_many", model=model, requests=len(texts)):
+            return LLMClient._run(LLMClient._gather([LLMClient.aembed(session, text, model) for text in texts]))
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """requests made, calls actually sent, requests coalesced and requests delayed by a rate limit"""
+        return {name: LLMClient._stats[name] for name in ('requests', 'calls', 'coalesced', 'rate_limited')}
@@ -0,0 +1,304 @@
+import re
+import json
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import statements
+from tracing import Span, current_span, export_span
+
+# Cortex REST endpoint used for streamed completions
+CORTEX_COMPLETE_PATH = "/api/v2/cortex/inference:complete"
+REST_TIMEOUT_SECONDS = 120
+# Completions kept for the time-to-first-token percentiles
+STATS_WINDOW = 500
+
+_WORD_CHUNK = re.compile(r"\S+\s*|\s+")
+
+
+def chat_messages(system_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def response_text(raw: Any) -> str:
+    """Answer text from a COMPLETE result, which is JSON with choices when called with messages"""
+    if raw is None:
+        return ""
+    try:
+        data = json.loads(raw) if isinstance(raw, str) else raw
+    except json.JSONDecodeError:
+        return str(raw).strip()
+    if isinstance(data, dict) and data.get('choices'):
+        choice = data['choices'][0]
+        if isinstance(choice, dict):
+            if 'messages' in choice:
+                return str(choice['messages']).strip()
+            if 'message' in choice:
+                return str(choice['message'].get('content', '')).strip()
+        return str(choice).strip()
+    return str(data).strip()
+
+
+class StreamStats:
+    """Recent time-to-first-token and total completion times, in ms"""
+    _recent: deque = deque(maxlen=STATS_WINDOW)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(backend: str, model: str, ttft_ms: Optional[float], total_ms: float, chunks: int) -> None:
+        with StreamStats._lock:
+            StreamStats._recent.append({
+                'backend': backend,
+                'model': model,
+                'ttft_ms': ttft_ms,
+                'total_ms': total_ms,
+                'chunks': chunks,
+            })
+
+    @staticmethod
+    def summary() -> Dict[str, Any]:
+        with StreamStats._lock:
+            recent = list(StreamStats._recent)
+        ttfts = sorted(r['ttft_ms'] for r in recent if r['ttft_ms'] is not None)
+        totals = sorted(r['total_ms'] for r in recent)
+
+        def pct(values: List[float], p: float) -> Optional[float]:
+            return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else None
+
+        return {
+            'completions': len(recent),
+            'ttft_p50_ms': pct(ttfts, 50),
+            'ttft_p95_ms': pct(ttfts, 95),
+            'total_p50_ms': pct(totals, 50),
+            'total_p95_ms': pct(totals, 95),
+        }
+
+    @staticmethod
+    def reset() -> None:
+        with StreamStats._lock:
+            StreamStats._recent.clear()
+
+
+class CompletionStream:
+    """
+    Iterator of text deltas from one completion, suitable for st.write_stream().
+    Records time to first token and total time in a completion.stream span that
+    belongs to the request that started it, and calls on_complete(stream) exactly
+    once, when the stream is exhausted, abandoned or closed.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterator[str],
+        backend: str,
+        model: str,
+        on_complete: Optional[Callable[["CompletionStream"], None]] = None
+    ):
+        self._chunks = chunks
+        self._on_complete = on_complete
+        self._finished = False
+        self.backend = backend
+        self.model = model
+        self.parts: List[str] = []
+        self.completed = False
+        self.error: Optional[str] = None
+        self.ttft_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self._started = time.perf_counter()
+        self._span = Span("completion.stream", current_span(), {"backend": backend, "model": model})
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for chunk in self._chunks:
+                if not chunk:
+                    continue
+                if self.ttft_ms is None:
+                    self.ttft_ms = (time.perf_counter() - self._started) * 1000
+                self.parts.append(chunk)
+                yield chunk
+            self.completed = True
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Error while streaming completion: {self.error}")
+            raise
+        finally:
+            self._finish()
+
+    def read(self) -> str:
+        """Consume the whole stream and return the answer"""
+        for _ in self:
+            pass
+        return self.text
+
+    def close(self) -> None:
+        """Finish a stream that will not be consumed"""
+        close = getattr(self._chunks, "close", None)
+        if close:
+            close()
+        self._finish()
+
+    def _finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        self.total_ms = (time.perf_counter() - self._started) * 1000
+        self._span.set(
+            ttft_ms=round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            chunks=len(self.parts),
+            completed=self.completed
+        )
+        if self.error:
+            self._span.set(error=self.error)
+        export_span(self._span)
+        StreamStats.record(self.backend, self.model, self.ttft_ms, self.total_ms, len(self.parts))
+        if self._on_complete:
+            try:
+                self._on_complete(self)
+            except Exception as e:
+                print(f"Error in completion stream callback: {str(e)}")
+
+
+class CortexRestBackend:
+    """
+    Streams tokens from the Cortex REST API as server-sent events, authenticated
+    with the Snowpark session's token. The request is sent before stream()
+    returns, so the session may be closed while the answer is still arriving.
+    """
+    name = "cortex_rest"
+
+    @staticmethod
+    def available(session) -> bool:
+        try:
+            connection = session.connection
+            return bool(connection.host and connection.rest.token)
+        except Exception:
+            return False
+
+    def stream(
+        self,
+        session,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        max_tokens: int
+    ) -> Iterator[str]:
+        import requests
+
+        connection = session.connection
+        response = requests.post(
+            f"https://{connection.host}{CORTEX_COMPLETE_PATH}",
+            headers={
+                "Authorization": f'Snowflake Token="{connection.rest.token}"',
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream",
+            },
+            json={
+                "model": model,
+                "messages": chat_messages(system_prompt, user_prompt),
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "stream": True,
+            },
+            stream=True,
+            timeout=REST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        return CortexRestBackend._events(response)
+
+    @staticmethod
+    def _events(response) -> Iterator[str]:
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                event = json.loads(payload)
+                for choice in event.get("choices", []):
+                    delta = choice.get("delta") or {}
+                    text = delta.get("content") or delta.get("text")
+                    if text:
+                        yield text
+        finally:
+            response.close()
+
+
+class SqlCompleteBackend:
+    """
+    Fallback through SNOWFLAKE.CORTEX.COMPLETE in SQL. The answer arrives all at
+    once, so it is replayed word by word to keep one rendering path.
+    """
+    name = "sql"
+
+    def stream(
+        self,
+        session,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        max_tokens: int
+    ) -> Iterator[str]:
+        rows = statements.complete(session, model, system_prompt, user_prompt, temperature, max_tokens)
+        answer = response_text(statements.first_value(rows, 'RESPONSE'))
+        return iter(_WORD_CHUNK.findall(answer))
+
+
+def render_incrementally(stream: CompletionStream, render: Callable[[str], None], min_interval: float = 0.05) -> str:
+    """Call render(text so far) as tokens arrive, at most every min_interval seconds, and once at the end"""
+    last = 0.0
+    for _ in stream:
+        now = time.perf_counter()
+        if now - last >= min_interval:
+            render(stream.text)
+            last = now
+    render(stream.text)
+    return stream.text
+
+
+_backend_override: Optional[Any] = None
+_rest_backend = CortexRestBackend()
+_sql_backend = SqlCompleteBackend()
+
+
+def set_backend(backend: Optional[Any]) -> None:
+    """Use this backend for every stream (the benchmarks' fake); None restores auto-selection"""
+    global _backend_override
+    _backend_override = backend
+
+
+def stream_completion(
+    session,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.3,
+    max_tokens: int = 500,
+    on_complete: Optional[Callable[[CompletionStream], None]] = None
+) -> CompletionStream:
+    """Start a completion and return its token stream; REST streaming when possible, SQL otherwise"""
+    if _backend_override is not None:
+        backends = [_backend_override]
+    elif CortexRestBackend.available(session):
+        backends = [_rest_backend, _sql_backend]
+    else:
+        backends = [_sql_backend]
+
+    for i, backend in enumerate(backends):
+        try:
+            chunks = backend.stream(session, model, system_prompt, user_prompt, temperature, max_tokens)
+            return CompletionStream(chunks, backend.name, model, on_complete)
+        except Exception as e:
+            if i == len(backends) - 1:
+                raise
+            print(f"Streaming backend {backend.name} failed, falling back: {str(e)}")
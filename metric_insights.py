@@ -0,0 +1,185 @@
+import json
+import math
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from llm_client import LLMClient
+
+INSIGHT_MODEL = 'mistral-large'
+# Cards queued within this many seconds are explained by the same LLM call
+BATCH_WINDOW_SECONDS = 0.25
+MAX_CACHED_INSIGHTS = 1000
+# Cards explained per LLM call; larger batches are split and run concurrently
+INSIGHT_GROUP_SIZE = 6
+UNAVAILABLE = "Analysis unavailable"
+# Cards whose analysis failed show UNAVAILABLE for this long, then are asked for again
+FAILURE_RETRY_SECONDS = 60
+
+InsightKey = Tuple[str, str, str]
+
+
+def round_metric_value(value) -> str:
+    """Round to two significant figures so small fluctuations reuse the same explanation"""
+    try:
+        number = float(str(value).replace('%', '').replace(',', '').rstrip('sMB'))
+    except (TypeError, ValueError):
+        return str(value)
+    if number == 0 or math.isnan(number):
+        return "0"
+    digits = 1 - int(math.floor(math.log10(abs(number))))
+    return f"{round(number, digits):g}"
+
+
+class MetricInsights:
+    """
+    Process-wide cache of short LLM explanations for dashboard metric cards.
+    Cards ask for an insight and get whatever is cached; misses are queued and
+    explained together in the background, a few cards per COMPLETE call.
+    """
+    _cache: "OrderedDict[InsightKey, str]" = OrderedDict()
+    _queued: Dict[InsightKey, Dict[str, str]] = {}
+    _in_flight: set = set()
+    _failed: Dict[InsightKey, float] = {}
+    _timer: Optional[threading.Timer] = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def key(title: str, value, trend_value) -> InsightKey:
+        return (title, round_metric_value(value), round_metric_value(trend_value))
+
+    @staticmethod
+    def get(title: str, value, trend_value) -> Optional[str]:
+        """Return the cached explanation, queueing a batched request on a miss"""
+        key = MetricInsights.key(title, value, trend_value)
+        with MetricInsights._lock:
+            if key in MetricInsights._cache:
+                MetricInsights._cache.move_to_end(key)
+                return MetricInsights._cache[key]
+            if key in MetricInsights._failed:
+                if time.time() < MetricInsights._failed[key]:
+                    return UNAVAILABLE
+                del MetricInsights._failed[key]
+            if key not in MetricInsights._queued and key not in MetricInsights._in_flight:
+                MetricInsights._queued[key] = {
+                    'title': title, 'value': str(value), 'trend': str(trend_value)
+                }
+                if MetricInsights._timer is None:
+                    MetricInsights._timer = threading.Timer(BATCH_WINDOW_SECONDS, MetricInsights._flush)
+                    MetricInsights._timer.daemon = True
+                    MetricInsights._timer.start()
+        return None
+
+    @staticmethod
+    def _store(key: InsightKey, analysis: str) -> None:
+        MetricInsights._cache[key] = analysis
+        MetricInsights._cache.move_to_end(key)
+        while len(MetricInsights._cache) > MAX_CACHED_INSIGHTS:
+            MetricInsights._cache.popitem(last=False)
+
+    @staticmethod
+    def _flush() -> None:
+        """Explain every queued card with structured COMPLETE calls"""
+        with MetricInsights._lock:
+            batch = dict(MetricInsights._queued)
+            MetricInsights._queued.clear()
+            MetricInsights._in_flight.update(batch)
+            MetricInsights._timer = None
+        if not batch:
+            return
+
+        ids = {f"m{i}": key for i, key in enumerate(batch)}
+        cards = [dict(id=card_id, **batch[key]) for card_id, key in ids.items()]
+        try:
+            results = MetricInsights._complete(cards)
+        except Exception as e:
+            print(f"Error generating metric insights: {str(e)}")
+            results = {}
+
+        # Only real explanations are cached; failed cards are retried after FAILURE_RETRY_SECONDS
+        retry_at = time.time() + FAILURE_RETRY_SECONDS
+        with MetricInsights._lock:
+            for card_id, key in ids.items():
+                analysis = MetricInsights._clean(results.get(card_id))
+                if analysis == UNAVAILABLE:
+                    MetricInsights._failed[key] = retry_at
+                else:
+                    MetricInsights._store(key, analysis)
+                MetricInsights._in_flight.discard(key)
+            for key in [k for k, expiry in MetricInsights._failed.items() if expiry < time.time()]:
+                del MetricInsights._failed[key]
+
+    @staticmethod
+    def _complete(cards: List[Dict[str, str]]) -> Dict[str, str]:
+        """
+        Ask the LLM for JSON objects mapping card id to a one-sentence analysis;
+        cards are explained in groups that run concurrently.
+        """
+        from back import SnowparkManager
+
+        system_prompt = (
+            "You are an analytics expert providing extremely concise metric analysis. "
+            "For every metric, give one key insight of 20-25 words maximum. "
+            "Respond only with a JSON object mapping each metric id to its analysis."
+        )
+        groups = [cards[i:i + INSIGHT_GROUP_SIZE] for i in range(0, len(cards), INSIGHT_GROUP_SIZE)]
+
+        session = SnowparkManager.get_session()
+        try:
+            responses = LLMClient.run_all([
+                LLMClient.acomplete_raw(
+                    session,
+                    INSIGHT_MODEL,
+                    system_prompt,
+                    "\n".join(
+                        f"{card['id']}: {card['title']} = {card['value']} (Trend: {card['trend']}%)"
+                        for card in group
+                    ),
+                    temperature=0.3,
+                    max_tokens=60 * len(group),
+                    options={'response_format': {'type': 'json', 'schema': {
+                        'type': 'object',
+                        'properties': {card['id']: {'type': 'string'} for card in group},
+                        'required': [card['id'] for card in group]
+                    }}}
+                )
+                for group in groups
+            ])
+        finally:
+            session.close()
+
+        results: Dict[str, str] = {}
+        for response in responses:
+            results.update(MetricInsights._parse(response))
+        return results
+
+    @staticmethod
+    def _parse(response: Optional[str]) -> Dict[str, str]:
+        """
+        Card analyses from a COMPLETE response: with response_format the object
+        is under structured_output[0].raw_message, otherwise it is JSON inside
+        choices[0].messages
+        """
+        if not response:
+            return {}
+        data = json.loads(response)
+        structured = data.get('structured_output') or [{}]
+        content = structured[0].get('raw_message')
+        if content is None:
+            content = (data.get('choices') or [{}])[0].get('messages', '')
+        if isinstance(content, dict):
+            return content
+        match = re.search(r'\{.*\}', content or '', re.DOTALL)
+        return json.loads(match.group(0)) if match else {}
+
+    @staticmethod
+    def _clean(analysis: Optional[str]) -> str:
+        """Trim to a short, complete sentence that is safe inside an HTML attribute"""
+        if not analysis or not isinstance(analysis, str):
+            return UNAVAILABLE
+        analysis = analysis[:160].strip()
+        if not analysis.endswith('.') and '.' in analysis:
+            analysis = '. '.join(analysis.split('.')[:-1]) + '.'
+        return analysis.replace('"', '&quot;').replace("'", "&#39;")
@@ -0,0 +1,189 @@
+import os
+import glob
+import time
+import tempfile
+import threading
+import importlib.util
+import pandas as pd
+from typing import Dict, List
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "smart_library_metrics_cache")
+# Merge delta files into the base file after this many deltas or this many seconds
+COMPACT_AFTER_DELTAS = 20
+COMPACT_INTERVAL_SECONDS = 3600
+
+_HAS_PARQUET = importlib.util.find_spec("pyarrow") is not None
+_EXTENSION = "parquet" if _HAS_PARQUET else "pkl"
+
+
+def _write_frame(df: pd.DataFrame, path: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if _HAS_PARQUET:
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    if _HAS_PARQUET:
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+class IncrementalMetricsLoader:
+    """
+    Keeps a local columnar copy of a metrics table and only fetches rows newer
+    than the last TIMESTAMP watermark on each refresh.
+    """
+    _frames: Dict[str, pd.DataFrame] = {}
+    # _lock only guards the dicts; each table's refresh (queries and files) runs under its own lock
+    _lock = threading.Lock()
+    _refresh_locks: Dict[str, threading.Lock] = {}
+
+    def __init__(
+        self,
+        table: str,
+        columns: List[str],
+        key_column: str = "METRIC_ID",
+        timestamp_column: str = "TIMESTAMP"
+    ):
+        self.table = table
+        self.columns = list(dict.fromkeys([key_column, timestamp_column] + columns))
+        self.key_column = key_column
+        self.timestamp_column = timestamp_column
+        self.name = table.replace(".", "_").lower()
+
+    @property
+    def _base_path(self) -> str:
+        return os.path.join(CACHE_DIR, f"{self.name}.base.{_EXTENSION}")
+
+    def _delta_paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(CACHE_DIR, f"{self.name}.delta-*.{_EXTENSION}")))
+
+    def _read_local(self) -> pd.DataFrame:
+        """Load the base file plus any delta files from disk"""
+        frames = []
+        paths = ([self._base_path] if os.path.exists(self._base_path) else []) + self._delta_paths()
+        for path in paths:
+            try:
+                frames.append(_read_frame(path))
+            except Exception as e:
+                print(f"Metrics cache could not read {path}: {str(e)}")
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        df = pd.concat(frames, ignore_index=True)
+        return self._dedupe(df)
+
+    def _dedupe(self, df: pd.DataFrame) -> pd.DataFrame:
+        return (
+            df.drop_duplicates(subset=[self.key_column], keep="last")
+            .sort_values(self.timestamp_column)
+            .reset_index(drop=True)
+        )
+
+    def _compact(self, df: pd.DataFrame) -> None:
+        """Rewrite the base file with everything and drop the delta files"""
+        _write_frame(df, self._base_path)
+        for path in self._delta_paths():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _needs_compaction(self) -> bool:
+        deltas = self._delta_paths()
+        if len(deltas) >= COMPACT_AFTER_DELTAS:
+            return True
+        if deltas and os.path.exists(self._base_path):
+            return time.time() - os.path.getmtime(self._base_path) > COMPACT_INTERVAL_SECONDS
+        return bool(deltas) and not os.path.exists(self._base_path)
+
+    def _fetch(self, session, watermark=None) -> pd.DataFrame:
+        column_list = ", ".join(self.columns)
+        if watermark is None:
+            rows = session.sql(
+                f"SELECT {column_list} FROM {self.table} ORDER BY {self.timestamp_column}"
+            ).collect()
+        else:
+            # >= so rows sharing the watermark timestamp are not missed; duplicates are dropped by key
+            rows = session.sql(
+                f"SELECT {column_list} FROM {self.table} WHERE {self.timestamp_column} >= ? ORDER BY {self.timestamp_column}",
+                params=[watermark]
+            ).collect()
+        return pd.DataFrame([row.as_dict() for row in rows], columns=self.columns)
+
+    def _refresh_lock(self) -> threading.Lock:
+        with IncrementalMetricsLoader._lock:
+            return IncrementalMetricsLoader._refresh_locks.setdefault(self.table, threading.Lock())
+
+    def load(self, session) -> pd.DataFrame:
+        """
+        Return the full metrics history, fetching only rows newer than the local watermark.
+        While another thread is refreshing this table, its last loaded copy is returned instead of waiting.
+        """
+        refresh_lock = self._refresh_lock()
+        if not refresh_lock.acquire(blocking=False):
+            with IncrementalMetricsLoader._lock:
+                cached = IncrementalMetricsLoader._frames.get(self.table)
+            if cached is not None:
+                return cached
+            refresh_lock.acquire()
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with IncrementalMetricsLoader._lock:
+                df = IncrementalMetricsLoader._frames.get(self.table)
+            if df is None:
+                df = self._read_local()
+
+            if not df.empty:
+                # Local copy is stale if rows were deleted upstream; start over in that case
+                remote = session.sql(
+                    f"SELECT COUNT(*) AS ROW_COUNT FROM {self.table}"
+                ).collect()
+                if remote and remote[0]['ROW_COUNT'] < len(df):
+                    print(f"Metrics cache for {self.table} is ahead of the table, reloading")
+                    df = pd.DataFrame(columns=self.columns)
+
+            if df.empty:
+                df = self._dedupe(self._fetch(session))
+                self._compact(df)
+            else:
+                watermark = df[self.timestamp_column].max()
+                if hasattr(watermark, "to_pydatetime"):
+                    watermark = watermark.to_pydatetime()
+                delta = self._fetch(session, watermark)
+                if not delta.empty:
+                    new_rows = delta[~delta[self.key_column].isin(df[self.key_column])]
+                    if not new_rows.empty:
+                        _write_frame(
+                            new_rows,
+                            os.path.join(CACHE_DIR, f"{self.name}.delta-{time.time_ns()}.{_EXTENSION}")
+                        )
+                        df = pd.concat([df, new_rows], ignore_index=True)
+                if self._needs_compaction():
+                    self._compact(df)
+
+            with IncrementalMetricsLoader._lock:
+                IncrementalMetricsLoader._frames[self.table] = df
+            return df
+        finally:
+            refresh_lock.release()
+
+    def reset(self) -> None:
+        """Forget the local copy so the next load fetches everything"""
+        with self._refresh_lock():
+            with IncrementalMetricsLoader._lock:
+                IncrementalMetricsLoader._frames.pop(self.table, None)
+            for path in [self._base_path] + self._delta_paths():
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+TRULENS_METRICS_LOADER = IncrementalMetricsLoader(
+    "TESTDB.MYSCHEMA.TRULENS_METRICS",
+    [
+        "OPERATION_TYPE", "CONTEXT_RELEVANCE", "RELEVANCE_SCORE", "SOURCE_DIVERSITY_SCORE",
+        "COHERENCE_SCORE", "TOKEN_EFFICIENCY", "OUTPUT_TOKEN_COUNT"
+    ]
+)
@@ -0,0 +1,241 @@
+import time
+import threading
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ROLLUP_TABLE = "TESTDB.MYSCHEMA.ANALYTICS_ROLLUPS"
+METRICS_TABLE = "TESTDB.MYSCHEMA.ANALYTICS_METRICS"
+GRAINS = ("MINUTE", "HOUR", "DAY")
+ALL_ACTIONS = "ALL"
+# Skip MERGEs when the rollups were refreshed this recently; dashboard reruns happen on every widget change
+REFRESH_INTERVAL_SECONDS = 30
+
+# Dashboard time range -> (rollup grain, window length; None means all history)
+TIME_WINDOWS = {
+    "Last 24 Hours": ("MINUTE", timedelta(hours=24)),
+    "Last 7 Days": ("HOUR", timedelta(days=7)),
+    "Last 30 Days": ("HOUR", timedelta(days=30)),
+    "All Time": ("DAY", None),
+}
+
+
+class MetricsRollups:
+    """Pre-aggregated per-minute/hour/day buckets of ANALYTICS_METRICS maintained in Snowflake"""
+    _table_ready = False
+    _last_refresh = 0.0
+    _refresh_lock = threading.Lock()
+    # Called without arguments after each refresh, e.g. to regenerate content derived from the rollups
+    _listeners: List[Callable[[], None]] = []
+
+    @staticmethod
+    def add_listener(callback: Callable[[], None]) -> None:
+        if callback not in MetricsRollups._listeners:
+            MetricsRollups._listeners.append(callback)
+
+    @staticmethod
+    def ensure_table(session) -> None:
+        """Create the rollup table once per process"""
+        if MetricsRollups._table_ready:
+            return
+        session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+            GRAIN VARCHAR,
+            BUCKET_START TIMESTAMP_NTZ,
+            ACTION_TYPE VARCHAR,
+            EVENT_COUNT NUMBER,
+            SUCCESS_COUNT NUMBER,
+            AVG_RESPONSE_MS FLOAT,
+            P50_RESPONSE_MS FLOAT,
+            P95_RESPONSE_MS FLOAT,
+            RESPONSE_EVENTS NUMBER,
+            SUM_TOKENS NUMBER,
+            TOKEN_EVENTS NUMBER,
+            AVG_MEMORY_MB FLOAT,
+            MEMORY_EVENTS NUMBER,
+            RESPONSE_PCT_STATE VARIANT,
+            UPDATED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+        )
+        """).collect()
+        # Tables created before percentile states were kept
+        session.sql(f"ALTER TABLE {ROLLUP_TABLE} ADD COLUMN IF NOT EXISTS RESPONSE_PCT_STATE VARIANT").collect()
+        MetricsRollups._table_ready = True
+
+    @staticmethod
+    def _merge_sql(grain: str) -> str:
+        """
+        Recompute every bucket from the newest existing bucket of this grain onwards.
+        Older buckets are closed, so each refresh only scans the most recent rows.
+        """
+        return f"""
+        MERGE INTO {ROLLUP_TABLE} t
+        USING (
+            SELECT
+                '{grain}' AS GRAIN,
+                DATE_TRUNC('{grain}', TIMESTAMP) AS BUCKET_START,
+                IFF(GROUPING(ACTION) = 1, '{ALL_ACTIONS}', ACTION) AS ACTION_TYPE,
+                COUNT(*) AS EVENT_COUNT,
+                COUNT_IF(STATUS = 'success') AS SUCCESS_COUNT,
+                AVG(RESPONSE_TIME_MS) AS AVG_RESPONSE_MS,
+                PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY RESPONSE_TIME_MS) AS P50_RESPONSE_MS,
+                PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY RESPONSE_TIME_MS) AS P95_RESPONSE_MS,
+                COUNT(RESPONSE_TIME_MS) AS RESPONSE_EVENTS,
+                SUM(IFF(TOKEN_COUNT > 0, TOKEN_COUNT, 0)) AS SUM_TOKENS,
+                COUNT_IF(TOKEN_COUNT > 0) AS TOKEN_EVENTS,
+                AVG(MEMORY_USAGE_MB) AS AVG_MEMORY_MB,
+                COUNT(MEMORY_USAGE_MB) AS MEMORY_EVENTS,
+                -- Mergeable t-digest state, so any window's percentiles come from its buckets
+                APPROX_PERCENTILE_ACCUMULATE(RESPONSE_TIME_MS) AS RESPONSE_PCT_STATE
+            FROM (
+                SELECT TIMESTAMP, COALESCE(ACTION_TYPE, 'UNKNOWN') AS ACTION, STATUS,
+                       RESPONSE_TIME_MS, TOKEN_COUNT, MEMORY_USAGE_MB
+                FROM {METRICS_TABLE}
+                WHERE TIMESTAMP >= COALESCE(
+                    (SELECT MAX(BUCKET_START) FROM {ROLLUP_TABLE} WHERE GRAIN = '{grain}'),
+                    '1970-01-01'::TIMESTAMP_NTZ
+                )
+            )
+            GROUP BY GROUPING SETS ((DATE_TRUNC('{grain}', TIMESTAMP), ACTION), (DATE_TRUNC('{grain}', TIMESTAMP)))
+        ) s
+        ON t.GRAIN = s.GRAIN AND t.BUCKET_START = s.BUCKET_START AND t.ACTION_TYPE = s.ACTION_TYPE
+        WHEN MATCHED THEN UPDATE SET
+            EVENT_COUNT = s.EVENT_COUNT,
+            SUCCESS_COUNT = s.SUCCESS_COUNT,
+            AVG_RESPONSE_MS = s.AVG_RESPONSE_MS,
+            P50_RESPONSE_MS = s.P50_RESPONSE_MS,
+            P95_RESPONSE_MS = s.P95_RESPONSE_MS,
+            RESPONSE_EVENTS = s.RESPONSE_EVENTS,
+            SUM_TOKENS = s.SUM_TOKENS,
+            TOKEN_EVENTS = s.TOKEN_EVENTS,
+            AVG_MEMORY_MB = s.AVG_MEMORY_MB,
+            MEMORY_EVENTS = s.MEMORY_EVENTS,
+            RESPONSE_PCT_STATE = s.RESPONSE_PCT_STATE,
+            UPDATED_AT = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (
+            GRAIN, BUCKET_START, ACTION_TYPE, EVENT_COUNT, SUCCESS_COUNT,
+            AVG_RESPONSE_MS, P50_RESPONSE_MS, P95_RESPONSE_MS, RESPONSE_EVENTS,
+            SUM_TOKENS, TOKEN_EVENTS, AVG_MEMORY_MB, MEMORY_EVENTS, RESPONSE_PCT_STATE, UPDATED_AT
+        ) VALUES (
+            s.GRAIN, s.BUCKET_START, s.ACTION_TYPE, s.EVENT_COUNT, s.SUCCESS_COUNT,
+            s.AVG_RESPONSE_MS, s.P50_RESPONSE_MS, s.P95_RESPONSE_MS, s.RESPONSE_EVENTS,
+            s.SUM_TOKENS, s.TOKEN_EVENTS, s.AVG_MEMORY_MB, s.MEMORY_EVENTS, s.RESPONSE_PCT_STATE, CURRENT_TIMESTAMP()
+        )
+        """
+
+    @staticmethod
+    def refresh(session, wait: bool = True, force: bool = False) -> bool:
+        """
+        Fold new ANALYTICS_METRICS rows into the rollups, at most once per
+        REFRESH_INTERVAL_SECONDS unless force is set. Returns False when skipped or failed.
+        With wait=False the MERGEs are submitted asynchronously so metric writers are not slowed down.
+        """
+        with MetricsRollups._refresh_lock:
+            now = time.monotonic()
+            if not force and now - MetricsRollups._last_refresh < REFRESH_INTERVAL_SECONDS:
+                return False
+            MetricsRollups._last_refresh = now
+        try:
+            MetricsRollups.ensure_table(session)
+            for grain in GRAINS:
+                query = session.sql(MetricsRollups._merge_sql(grain))
+                if wait:
+                    query.collect()
+                else:
+                    query.collect_nowait()
+        except Exception as e:
+            print(f"Error refreshing metric rollups: {str(e)}")
+            MetricsRollups._last_refresh = 0.0
+            return False
+
+        for callback in list(MetricsRollups._listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error notifying rollup listener: {str(e)}")
+        return True
+
+    @staticmethod
+    def load_window(session, time_filter: str, action_type: str = ALL_ACTIONS) -> Tuple['pd.DataFrame', 'pd.DataFrame']:
+        """
+        Read rollup rows for the selected dashboard window and for the window before it.
+        Returns (current, previous) frames ordered by BUCKET_START. Every row also
+        carries WINDOW_P95_MS, the p95 of its whole window combined from the
+        buckets' percentile states.
+        """
+        import pandas as pd
+        grain, window = TIME_WINDOWS.get(time_filter, TIME_WINDOWS["Last 24 Hours"])
+        if window is None:
+            rows = session.sql(f"""
+            WITH buckets AS (
+                SELECT * FROM {ROLLUP_TABLE}
+                WHERE GRAIN = ? AND ACTION_TYPE = ?
+            ),
+            totals AS (
+                SELECT APPROX_PERCENTILE_ESTIMATE(APPROX_PERCENTILE_COMBINE(RESPONSE_PCT_STATE), 0.95) AS WINDOW_P95_MS
+                FROM buckets
+            )
+            SELECT b.* EXCLUDE (RESPONSE_PCT_STATE), t.WINDOW_P95_MS
+            FROM buckets b CROSS JOIN totals t
+            ORDER BY b.BUCKET_START
+            """, params=[grain, action_type]).collect()
+            current = pd.DataFrame([row.as_dict() for row in rows])
+            return current, pd.DataFrame(columns=current.columns)
+
+        window_seconds = int(window.total_seconds())
+        rows = session.sql(f"""
+        WITH buckets AS (
+            SELECT *,
+                   BUCKET_START >= DATEADD('second', ?, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ) AS IN_WINDOW
+            FROM {ROLLUP_TABLE}
+            WHERE GRAIN = ? AND ACTION_TYPE = ?
+              AND BUCKET_START >= DATEADD('second', ?, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)
+        ),
+        windows AS (
+            SELECT IN_WINDOW,
+                   APPROX_PERCENTILE_ESTIMATE(APPROX_PERCENTILE_COMBINE(RESPONSE_PCT_STATE), 0.95) AS WINDOW_P95_MS
+            FROM buckets
+            GROUP BY IN_WINDOW
+        )
+        SELECT b.* EXCLUDE (RESPONSE_PCT_STATE), w.WINDOW_P95_MS
+        FROM buckets b JOIN windows w ON b.IN_WINDOW = w.IN_WINDOW
+        ORDER BY b.BUCKET_START
+        """, params=[-window_seconds, grain, action_type, -2 * window_seconds]).collect()
+        df = pd.DataFrame([row.as_dict() for row in rows])
+        if df.empty:
+            return df, df
+        current = df[df['IN_WINDOW']].drop(columns=['IN_WINDOW']).reset_index(drop=True)
+        previous = df[~df['IN_WINDOW']].drop(columns=['IN_WINDOW']).reset_index(drop=True)
+        return current, previous
+
+    @staticmethod
+    def summarize(df: 'pd.DataFrame') -> Optional[Dict[str, Any]]:
+        """
+        Combine rollup buckets into window-level figures, weighting each bucket by
+        its event count. p95_response_ms is the window's own p95 from
+        load_window(); max_bucket_p95_response_ms is the worst single bucket.
+        """
+        if df is None or df.empty:
+            return None
+        import pandas as pd
+
+        numeric_columns = [
+            'EVENT_COUNT', 'SUCCESS_COUNT', 'AVG_RESPONSE_MS', 'P95_RESPONSE_MS', 'RESPONSE_EVENTS',
+            'SUM_TOKENS', 'TOKEN_EVENTS', 'AVG_MEMORY_MB', 'MEMORY_EVENTS'
+        ]
+        numeric = df[numeric_columns].apply(pd.to_numeric, errors='coerce').fillna(0)
+        events = numeric['EVENT_COUNT'].sum()
+        response_events = numeric['RESPONSE_EVENTS'].sum()
+        memory_events = numeric['MEMORY_EVENTS'].sum()
+        token_events = numeric['TOKEN_EVENTS'].sum()
+
+        return {
+            'events': int(events),
+            'avg_response_ms': float((numeric['AVG_RESPONSE_MS'] * numeric['RESPONSE_EVENTS']).sum() / response_events) if response_events else 0.0,
+            'p95_response_ms': float(pd.to_numeric(df['WINDOW_P95_MS'], errors='coerce').fillna(0).iloc[0]) if 'WINDOW_P95_MS' in df else 0.0,
+            'max_bucket_p95_response_ms': float(numeric['P95_RESPONSE_MS'].max()),
+            'avg_memory_mb': float((numeric['AVG_MEMORY_MB'] * numeric['MEMORY_EVENTS']).sum() / memory_events) if memory_events else 0.0,
+            'success_rate': float(numeric['SUCCESS_COUNT'].sum() / events * 100) if events else 0.0,
+            'avg_tokens': float(numeric['SUM_TOKENS'].sum() / token_events) if token_events else 0.0,
+        }
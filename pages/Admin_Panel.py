@@ -1,10 +1,15 @@
 import streamlit as st
 from back import SnowparkManager
+import statements
 import time
 import uuid
 from datetime import datetime
 import json
 import pandas as pd
+from query_log import QueryLog, SLOW_QUERY_MS
+from llm_streaming import StreamStats
+from semantic_cache import SemanticCache
+from retrieval_cache import RetrievalCache
   # "https://i.postimg.cc/qM6yd5mJ/Picture117.png"
 class AdminPanel:
     def __init__(self):
@@ -152,7 +157,7 @@ class AdminPanel:
         main_col, sidebar_col = st.columns([2, 1], gap="large")
         
         with main_col:
-            upload_tab, delete_tab = st.tabs(["📥 Upload Documents", "🗑️ Delete Document"])
+            upload_tab, delete_tab, query_log_tab = st.tabs(["📥 Upload Documents", "🗑️ Delete Document", "📈 Query Log"])
             
             with upload_tab:
                 uploaded_files = st.file_uploader(
@@ -166,6 +171,13 @@ class AdminPanel:
                     "Category",
                     ["Book", "PDF", "Research Paper", "Article", "Other"]
                 )
+
+                chunk_size_name = st.select_slider(
+                    "Chunk size",
+                    options=list(SnowparkManager.CHUNK_SIZE_OPTIONS),
+                    value="Medium",
+                    help="Target tokens per chunk; chunks follow headings and paragraphs"
+                )
                 
                 if uploaded_files:
                     if st.button("Add to Queue", type="primary"):
@@ -175,6 +187,7 @@ class AdminPanel:
                                     'id': str(uuid.uuid4()),
                                     'file': file,
                                     'category': category,
+                                    'chunk_size': SnowparkManager.CHUNK_SIZE_OPTIONS[chunk_size_name],
                                     'status': 'queued',
                                     'progress': 0,
                                     'message': 'Waiting in queue'
@@ -251,7 +264,7 @@ class AdminPanel:
                                         item['file'].read(),
                                         item['file'].name,
                                         item['file'].type,
-                                        chunk_size=1000
+                                        chunk_size=item.get('chunk_size', SnowparkManager.CHUNK_SIZE_OPTIONS["Medium"])
                                     )
                                     
                                     
@@ -315,18 +328,11 @@ class AdminPanel:
                             
                             try:
                                 progress_placeholder.progress(0.33, text="Removing metadata...")
-                                delete_metadata_sql = f"""
-                                DELETE FROM TESTDB.MYSCHEMA.BOOK_METADATA 
-                                WHERE FILENAME = '{selected_filename.replace("'", "''")}'
-                                """
-                                session.sql(delete_metadata_sql).collect()
+                                statements.BOOK_METADATA_DELETE_BY_FILENAME.collect(session, selected_filename)
                                 
                                 progress_placeholder.progress(0.66, text="Removing document content...")
-                                delete_rag_sql = f"""
-                                DELETE FROM {SnowparkManager.RAG_TABLE}
-                                WHERE FILENAME = '{selected_filename.replace("'", "''")}'
-                                """
-                                session.sql(delete_rag_sql).collect()
+                                statements.RAG_DELETE_BY_FILENAME.collect(session, selected_filename)
+                                SnowparkManager.invalidate_document_caches(selected_filename)
                                 
                                 progress_placeholder.progress(1.0, text="Finalizing...")
                                 st.session_state.files = [
@@ -360,6 +366,9 @@ class AdminPanel:
                 else:
                     st.info("No documents available to delete")
 
+            with query_log_tab:
+                self.render_query_log()
+
         with sidebar_col:
             self.render_admin_trivia()
             self.render_notifications()
@@ -374,6 +383,72 @@ class AdminPanel:
         
         session.close()
         
+    def render_query_log(self):
+        """Per-statement SQL statistics and the slow-query log for this server process"""
+        stats = QueryLog.stats()
+        if not stats:
+            st.info("No queries recorded yet")
+            return
+
+        total_ms = sum(s['total_ms'] for s in stats)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Statements", sum(s['calls'] for s in stats))
+        col2.metric("Total SQL Time", f"{total_ms / 1000:.1f}s")
+        col3.metric("Data Received", f"{sum(s['bytes_received'] for s in stats) / (1024 * 1024):.1f} MB")
+
+        streaming = StreamStats.summary()
+        if streaming['completions']:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Streamed Answers", streaming['completions'])
+            col2.metric("Time to First Token (p50 / p95)",
+                        f"{streaming['ttft_p50_ms'] or 0:.0f} / {streaming['ttft_p95_ms'] or 0:.0f} ms")
+            col3.metric("Full Answer (p50 / p95)",
+                        f"{streaming['total_p50_ms'] / 1000:.1f} / {streaming['total_p95_ms'] / 1000:.1f} s")
+
+        answers = SemanticCache.stats()
+        searches = RetrievalCache.stats()
+        if answers['stores'] or searches['hits'] + searches['misses']:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Answer Cache Hit Rate", f"{answers['hit_rate']:.0%}")
+            col2.metric("Exact / Similar Hits", f"{answers['exact_hits']} / {answers['semantic_hits']}")
+            col3.metric("Search Cache Hit Rate", f"{searches['hit_rate']:.0%}")
+
+        st.markdown("#### Top Statements by Total Time")
+        stats_df = pd.DataFrame([{
+            'Statement': s['fingerprint'][:300],
+            'Calls': s['calls'],
+            'Errors': s['errors'],
+            'Total (ms)': round(s['total_ms']),
+            'Share': f"{s['total_ms'] / total_ms:.0%}" if total_ms else "0%",
+            'Mean (ms)': round(s['mean_ms'], 1),
+            'p95 (ms)': s['p95_ms'],
+            'Max (ms)': round(s['max_ms']),
+            'Rows': s['rows'],
+            'KB Received': round(s['bytes_received'] / 1024, 1),
+        } for s in stats])
+        st.dataframe(stats_df, use_container_width=True, hide_index=True)
+
+        selected = st.selectbox(
+            "Duration histogram for",
+            range(len(stats)),
+            format_func=lambda i: stats[i]['fingerprint'][:120]
+        )
+        st.bar_chart(pd.DataFrame(
+            {'Executions': stats[selected]['histogram']},
+            index=QueryLog.histogram_labels()
+        ))
+
+        st.markdown(f"#### Slow Queries (≥ {SLOW_QUERY_MS} ms)")
+        slow = QueryLog.slow_queries()
+        if slow:
+            st.dataframe(pd.DataFrame(slow), use_container_width=True, hide_index=True)
+        else:
+            st.info("No slow queries recorded")
+
+        if st.button("Reset Query Log", type="secondary"):
+            QueryLog.reset()
+            st.rerun()
+
     def render_admin_trivia(self):
         with st.container():
             st.markdown(
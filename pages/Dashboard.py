@@ -5,16 +5,20 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import uuid
 from back import SnowparkManager
-import time
 import psutil
-import json
 from typing import Dict, Any, Optional
-from gtts import gTTS
-import tempfile
-import os
-import re
-import traceback
 from truelens_utils import TruLensEvaluator
+from metrics_rollups import MetricsRollups
+from metrics_cache import TRULENS_METRICS_LOADER
+from chart_downsampling import downsample_frame
+from metric_insights import MetricInsights
+from presentation_cache import PresentationCache, presenter_metrics
+from tts_pipeline import TTSPipeline
+from audio_player import play_segments
+
+# Approximate pixel widths of full-width and two-column charts, used for point budgets
+FULL_CHART_WIDTH_PX = 1200
+HALF_CHART_WIDTH_PX = 600
 
 class DashboardPage:
     def __init__(self):
@@ -546,13 +550,11 @@ class DashboardPage:
             )    
         
 
-    def create_metric_with_info(self, title, value, trend_value, trend_direction, info_text, key_suffix=None):
-        """Create a metric card with an info button using title as part of the key"""
-        col1, col2 = st.columns([5, 1])
-        with col1:
-            st.markdown(
-                f"""
-                <div style="
+    def metric_card_html(self, title, value, trend_value, trend_direction, tooltip=None):
+        """HTML of a purple metric card; tooltip is shown when hovering the card"""
+        hover = f'title="{tooltip}"' if tooltip else ''
+        return f"""
+                <div {hover} style="
                     padding: 20px;
                     background: linear-gradient(135deg, #2D033B 0%, #810CA8 100%);
                     border-radius: 10px;
@@ -567,6 +569,7 @@ class DashboardPage:
                     flex-direction: column;
                     justify-content: space-between;
                     align-items: center;
+                    {'cursor: help;' if tooltip else ''}
                 ">
                     <h3 style="
                         color: #E5B8F4;
@@ -592,9 +595,13 @@ class DashboardPage:
                         {trend_direction == 'up' and '↑' or '↓'} {trend_value if trend_value else ''}
                     </p>
                 </div>
-                """,
-                unsafe_allow_html=True
-            )
+                """
+
+    def create_metric_with_info(self, title, value, trend_value, trend_direction, info_text, key_suffix=None):
+        """Create a metric card with an info button using title as part of the key"""
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.markdown(self.metric_card_html(title, value, trend_value, trend_direction), unsafe_allow_html=True)
         with col2:
             unique_key = f"info_{title.lower().replace(' ', '_')}_{uuid.uuid4().hex[:4]}"
             st.button("ℹ️", key=unique_key, help=info_text)
@@ -604,73 +611,33 @@ class DashboardPage:
         title: str,
         value: float,
         trend_value: float = None,
-        trend_direction: str = None
+        trend_direction: str = None,
+        info_text: str = None
     ):
-        """Create a metric card with hover analysis"""
-        
-        cache_key = f"analysis_{title}_{value}_{trend_value}"
-        if cache_key not in st.session_state:
-            try:
-                # Modified prompt to enforce brevity
-                analysis_query = f"""
-                SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                    'mistral-large',
-                    ARRAY_CONSTRUCT(
-                        OBJECT_CONSTRUCT('role', 'system', 'content', 'You are an analytics expert providing extremely concise metric analysis. Limit responses to 20-25 words maximum.'),
-                        OBJECT_CONSTRUCT('role', 'user', 'content', 'Give a very brief analysis of {title}: {value:.2f} (Trend: {trend_value}%). Focus on key insight only.')
-                    ),
-                    OBJECT_CONSTRUCT(
-                        'temperature', 0.3,
-                        'max_tokens', 30
-                    )
-                ) as response
-                """
-                
-                session = SnowparkManager.get_session()
-                response = session.sql(analysis_query).collect()
-                session.close()
-                
-                if response and response[0][0]:
-                    parsed_response = json.loads(response[0][0])
-                    analysis = parsed_response.get('choices', [])[0].get('messages', 'Analysis unavailable')
-                    # Truncate and clean the analysis text
-                    analysis = analysis[:100].strip()  # Limit length
-                    analysis = analysis.replace('"', '&quot;').replace("'", "&#39;")
-                    # Ensure the analysis ends with a complete sentence
-                    if not analysis.endswith('.'):
-                        analysis = '. '.join(analysis.split('.')[:-1]) + '.'
-                else:
-                    analysis = "Analysis unavailable"
-                    
-            except Exception as e:
-                print("Error details:", str(e))
-                analysis = "Analysis unavailable"
-                
-            st.session_state[cache_key] = analysis
-        
-        return st.markdown(
-            f"""
-            <div class="metric-card"
-                title="{st.session_state[cache_key]}"
-                style="
-                    padding: 20px;
-                    background: #374151;
-                    border-radius: 10px;
-                    text-align: center;
-                    height: 100%;
-                    position: relative;
-                    cursor: help;
-                    transition: transform 0.2s;
-                ">
-                <h3 style="color: #f9fafb; margin-bottom: 10px; font-size: 1em;">{title}</h3>
-                <p style="font-size: 1.8em; font-weight: bold; color: #60a5fa; margin: 0;">{value}</p>
-                <p style="font-size: 0.9em; color: {'#10b981' if trend_direction == 'up' else '#ef4444'}; margin-top: 5px;">
-                    {trend_direction == 'up' and '↑' or '↓'} {trend_value if trend_value else ''}
-                </p>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+        """Create a metric card whose hover text is an LLM analysis, filled in once generated, with an optional info button"""
+
+        def render_card(polling: bool):
+            analysis = MetricInsights.get(title, value, trend_value)
+            if analysis is not None and polling:
+                # Redraw the page once so this card is no longer a polling fragment
+                st.rerun()
+            st.markdown(
+                self.metric_card_html(title, value, trend_value, trend_direction, analysis or "Generating analysis..."),
+                unsafe_allow_html=True
+            )
+
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            # Cards paint immediately; only while the batched analysis is pending does the card refresh itself
+            fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+            if MetricInsights.get(title, value, trend_value) is None and fragment is not None:
+                fragment(run_every=2)(render_card)(True)
+            else:
+                render_card(False)
+        if info_text:
+            with col2:
+                unique_key = f"info_{title.lower().replace(' ', '_')}_{uuid.uuid4().hex[:4]}"
+                st.button("ℹ️", key=unique_key, help=info_text)
 
     def create_metric_card_with_trend(self, title, value, trend_value=None, trend_direction=None):
         trend_color = "#10b981" if trend_direction == "up" else "#ef4444" if trend_direction == "down" else "#6b7280"
@@ -884,24 +851,18 @@ class DashboardPage:
             return
             
         try:
-            # Fetch metrics using actual table columns
-            metrics_query = """
-            SELECT 
-                TIMESTAMP,
-                CONTEXT_RELEVANCE,
-                RELEVANCE_SCORE,
-                SOURCE_DIVERSITY_SCORE,
-                COHERENCE_SCORE,
-                TOKEN_EFFICIENCY,
-                OUTPUT_TOKEN_COUNT
-            FROM TESTDB.MYSCHEMA.TRULENS_METRICS
-            ORDER BY TIMESTAMP DESC
-            LIMIT 100
-            """
-            results = session.sql(metrics_query).collect()
+            # Fetch metrics using actual table columns, incrementally from the local cache
+            history_df = TRULENS_METRICS_LOADER.load(session)
+            metrics_df = history_df.sort_values('TIMESTAMP', ascending=False).head(100)
+            # Charts show the whole history reduced to a fixed point budget
+            chart_df = downsample_frame(
+                history_df,
+                'TIMESTAMP',
+                ['CONTEXT_RELEVANCE', 'COHERENCE_SCORE', 'SOURCE_DIVERSITY_SCORE', 'OUTPUT_TOKEN_COUNT'],
+                FULL_CHART_WIDTH_PX
+            )
             
-            if results:
-                metrics_df = pd.DataFrame(results)
+            if not metrics_df.empty:
                 
                 # Display key metrics
                 col1, col2, col3 = st.columns(3)
@@ -936,22 +897,22 @@ class DashboardPage:
                 
                 # Add multiple metrics to the chart
                 fig.add_trace(go.Scatter(
-                    x=metrics_df['TIMESTAMP'],
-                    y=metrics_df['CONTEXT_RELEVANCE'],
+                    x=chart_df['TIMESTAMP'],
+                    y=chart_df['CONTEXT_RELEVANCE'],
                     name='Context Relevance',
                     line=dict(color='#60a5fa')
                 ))
                 
                 fig.add_trace(go.Scatter(
-                    x=metrics_df['TIMESTAMP'],
-                    y=metrics_df['COHERENCE_SCORE'],
+                    x=chart_df['TIMESTAMP'],
+                    y=chart_df['COHERENCE_SCORE'],
                     name='Coherence',
                     line=dict(color='#34d399')
                 ))
                 
                 fig.add_trace(go.Scatter(
-                    x=metrics_df['TIMESTAMP'],
-                    y=metrics_df['SOURCE_DIVERSITY_SCORE'],
+                    x=chart_df['TIMESTAMP'],
+                    y=chart_df['SOURCE_DIVERSITY_SCORE'],
                     name='Source Diversity',
                     line=dict(color='#f472b6')
                 ))
@@ -976,8 +937,8 @@ class DashboardPage:
                 st.markdown("#### Token Usage Analysis")
                 token_fig = go.Figure()
                 token_fig.add_trace(go.Scatter(
-                    x=metrics_df['TIMESTAMP'],
-                    y=metrics_df['OUTPUT_TOKEN_COUNT'],
+                    x=chart_df['TIMESTAMP'],
+                    y=chart_df['OUTPUT_TOKEN_COUNT'],
                     name='Token Usage',
                     line=dict(color='#8b5cf6')
                 ))
@@ -1049,8 +1010,8 @@ class DashboardPage:
                 '>
                     <h3 style='margin-bottom: 0.5rem;'>🎙️ AI Presenter Instructions</h3>
                     <ol style='margin-top: 0;'>
-                        <li>🖱️ On the sidebar, click the <strong>"Generate Presentation"</strong> button.</li>
-                        <li>📊 Once the presentation is successfully generated, it will be displayed in this tab.</li>
+                        <li>🖱️ On the sidebar, choose the duration, audience and style of the presentation.</li>
+                        <li>📊 Presentations are prepared in the background and displayed in this tab as soon as they are ready.</li>
                         <li>🌍 Select the desired accent from the combo box on the sidebar.</li>
                         <li>🔊 Click the <strong>"AI Presenter"</strong> button to have the presentation read aloud by the PAL AI.</li>
                         <li>👀 While the presentation is being read, you can seamlessly explore other parts of the dashboard without interrupting the audio. 🎧</li>
@@ -1099,161 +1060,54 @@ class DashboardPage:
                                 index=["Professional", "Technical"]
                                 .index(st.session_state.presentation_settings['style']))
 
-            if st.button("🎯 Generate Presentation", use_container_width=True):
-                with st.spinner("Generating presentation..."):
-                    try:
-                        session = SnowparkManager.get_session()
-                        
-                        # Get system metrics and analytics
-                        metrics_query = """
-                        SELECT 
-                            TIMESTAMP,
-                            RESPONSE_TIME_MS,
-                            MEMORY_USAGE_MB,
-                            TOKEN_COUNT,
-                            STATUS,
-                            DOCUMENT_NAME
-                        FROM TESTDB.MYSCHEMA.ANALYTICS_METRICS 
-                        ORDER BY TIMESTAMP DESC
-                        """
-                        
-                        results = session.sql(metrics_query).collect()
-                        metrics_df = pd.DataFrame(results)
-                        
-                        if not metrics_df.empty:
-                            # Format metrics in the structure expected by generate_presenter_prompt
-                            current_metrics = {
-                                'response_time': metrics_df['RESPONSE_TIME_MS'].mean() / 1000,  # Convert to seconds
-                                'memory_usage': metrics_df['MEMORY_USAGE_MB'].mean(),
-                                'success_rate': (metrics_df['STATUS'] == 'success').mean() * 100,
-                                'token_usage': metrics_df['TOKEN_COUNT'].mean(),
-                                'total_documents': metrics_df['DOCUMENT_NAME'].nunique(),
-                                'total_queries': len(metrics_df)
-                            }
-                            
-                            settings = {
-                                'duration': duration,
-                                'audience': audience,
-                                'tech_level': tech_level,
-                                'style': style
-                            }
-    
-                            st.session_state.presentation_settings = settings
-                            
-                            # Generate presentation using LLM
-                            prompt = self.generate_presenter_prompt(current_metrics, settings)
-                            
-                            llm_query = f"""
-                            SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                                'mistral-large2',
-                                ARRAY_CONSTRUCT(
-                                    OBJECT_CONSTRUCT('role', 'system', 'content', 
-                                        'You are an expert AI metrics analyst presenting system performance and document analytics. 
-                                        Focus on:
-                                        1. System Performance - response times, memory usage, success rates, and token usage
-                                        2. Document Analytics - processing patterns, usage statistics, and access trends
-                                        
-                                        Provide clear insights and actionable recommendations based on the metrics.'),
-                                    OBJECT_CONSTRUCT('role', 'user', 'content', '{prompt.replace("'", "''")}')
-                                ),
-                                OBJECT_CONSTRUCT(
-                                    'temperature', 0.7,
-                                    'max_tokens', 500,
-                                    'top_p', 0.9
-                                )
-                            ) as response
-                            """
-                            
-                            response = session.sql(llm_query).collect()
-                            
-                            if response and response[0]['RESPONSE']:
-                                presentation = json.loads(response[0]['RESPONSE'])
-                                content = None
-                                
-                                if isinstance(presentation, dict) and 'choices' in presentation:
-                                    choices = presentation['choices']
-                                    if choices and isinstance(choices, list) and len(choices) > 0:
-                                        first_choice = choices[0]
-                                        if isinstance(first_choice, dict):
-                                            if 'messages' in first_choice:
-                                                content = first_choice['messages']
-                                            elif 'message' in first_choice and 'content' in first_choice['message']:
-                                                content = first_choice['message']['content']
-                                            elif 'content' in first_choice:
-                                                content = first_choice['content']
-                            
-                                if content:
-                                    st.session_state.last_presentation = content.strip()
-                                    st.success("Presentation generated successfully!")
-                                else:
-                                    st.error("No content generated from LLM")
-                            else:
-                                st.error("Failed to get response from LLM")
-                        else:
-                            st.warning("No metrics data available for presentation")
-                            
-                    except Exception as e:
-                        st.error(f"Error generating presentation: {str(e)}")
-                        print(f"Detailed error: {traceback.format_exc()}")
-                    finally:
-                        # Only close the session when we're completely done with the tab
-                        if 'session' in locals() and session is not None:
-                            session.close()
-                
+            settings = {
+                'duration': duration,
+                'audience': audience,
+                'tech_level': tech_level,
+                'style': style
+            }
+            st.session_state.presentation_settings = settings
+
             presenter_accent = st.selectbox(
                 "🌍 Choose Presenter Accent",
                 ["co.uk", "com", "com.au", "co.in", "ca"],  # List of string values
                 index=0
             )
+
+            # Presentations are generated in the background whenever the metrics move materially,
+            # now and after later rollup refreshes
+            PresentationCache.watch(settings, presenter_accent, self.generate_presenter_prompt)
+            current_metrics = self.get_presenter_metrics()
+            if current_metrics:
+                PresentationCache.ensure(
+                    current_metrics,
+                    settings,
+                    self.generate_presenter_prompt(current_metrics, settings),
+                    presenter_accent
+                )
+            else:
+                st.warning("No metrics data available for presentation")
+
+            presentation = PresentationCache.latest(settings)
+            if presentation:
+                st.session_state.last_presentation = presentation['script']
+
             # Voice playback button
-            if 'last_presentation' in st.session_state:
-                if st.button("🔊 AI Presenter", use_container_width=True):
-                    try:
-                        with st.spinner("Generating audio..."):
-                            presentation_text = st.session_state.last_presentation
-                            presentation_text = re.sub(r'\*\*|__', '', presentation_text)
-                            presentation_text = re.sub(r'\*|_', '', presentation_text)
-                            presentation_text = re.sub(r'#+\s', '', presentation_text)
-                            presentation_text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', presentation_text)
-                            presentation_text = re.sub(r'•', '', presentation_text)
-                            presentation_text = re.sub(r'\n+', ' ', presentation_text)
-                            
-                              
-                            # Create temp file with a unique name
-                            temp_dir = tempfile.gettempdir()
-                            temp_file = os.path.join(temp_dir, f'presentation_{uuid.uuid4().hex}.mp3')
-                            
-                            try:
-                                # Generate and save audio
-                                tts = gTTS(
-                                    text=presentation_text,
-                                    lang='en',
-                                    slow=False,
-                                    tld=str(presenter_accent) 
-                                )
-                                tts.save(temp_file)
-                                
-                                # Play audio
-                                with open(temp_file, 'rb') as audio_file:
-                                    audio_bytes = audio_file.read()
-                                st.audio(audio_bytes)
-                                
-                            finally:
-                                # Clean up: Try to remove file after a short delay
-                                try:
-                                    time.sleep(1)  # Give a small delay
-                                    if os.path.exists(temp_file):
-                                        os.remove(temp_file)
-                                except Exception:
-                                    pass  # Ignore cleanup errors
-                                    
-                    except Exception as e:
-                        st.error(f"Error generating voice presentation: {str(e)}")
+            if presentation and st.button("🔊 AI Presenter", use_container_width=True):
+                segments = PresentationCache.audio_segments(presentation, presenter_accent)
+                if segments:
+                    # Pre-generated narration segments play back to back in one player
+                    play_segments(
+                        ((index, len(segments), audio) for index, audio in enumerate(segments)),
+                        TTSPipeline().mime_type
+                    )
+                else:
+                    st.info("Narration for this accent is being prepared. It will be ready in a moment.")
                         
             st.markdown("<br>", unsafe_allow_html=True)  # Add space
            
         # Display presentation content in main area
-        if 'last_presentation' in st.session_state:
+        if st.session_state.get('last_presentation'):
             st.markdown("""
                 <h2 style='
                     color: #E5B8F4;
@@ -1264,7 +1118,21 @@ class DashboardPage:
             """, unsafe_allow_html=True)
             st.markdown(st.session_state.last_presentation)
             st.markdown("</div>", unsafe_allow_html=True)
-            
+        elif PresentationCache.is_generating():
+            st.info("Your presentation is being prepared in the background. Refresh in a moment to see it.")
+
+    def get_presenter_metrics(self) -> Optional[Dict[str, Any]]:
+        """All-time metrics for the presenter, read from the rollups"""
+        session = SnowparkManager.get_session()
+        if not session:
+            return None
+        try:
+            return presenter_metrics(session)
+        except Exception as e:
+            print(f"Error loading presenter metrics: {str(e)}")
+            return None
+        finally:
+            session.close()
                 
                 
     def calculate_change(self, current: float, previous: float) -> str:
@@ -1552,21 +1420,26 @@ class DashboardPage:
                 index=0
             )
         with col2:
-            if st.button("🔄 Refresh Data", use_container_width=True):
-                st.rerun()
+            # The click itself reruns the page; force the rollups past their refresh interval
+            force_refresh = st.button("🔄 Refresh Data", use_container_width=True)
         
         session = SnowparkManager.get_session()
         if session:
             try:
-                metrics_data = session.sql("SELECT * FROM ANALYTICS_METRICS ORDER BY TIMESTAMP DESC").collect()
+                # Read pre-aggregated buckets for the selected window instead of the raw history
+                MetricsRollups.refresh(session, force=force_refresh)
+                rollup_df, previous_rollup_df = MetricsRollups.load_window(session, time_filter)
+                current_summary = MetricsRollups.summarize(rollup_df)
+                previous_summary = MetricsRollups.summarize(previous_rollup_df) or current_summary
+                df = rollup_df
                 
-                if metrics_data:  
-                    df = pd.DataFrame(metrics_data)
-                    
-                    tabs = st.tabs(["💻 System Performance", "📚 Document Analytics", "🎙️ AI Presenter"])
+                tabs = st.tabs(["💻 System Performance", "📚 Document Analytics", "🎙️ AI Presenter"])
 
-                    
-                    with tabs[0]:
+                
+                with tabs[0]:
+                    if current_summary is None:
+                        st.info("No activity recorded in this time range yet")
+                    else:
                         st.markdown("""                             
                         <div style="                                 
                             padding: 10px;                                 
@@ -1585,65 +1458,47 @@ class DashboardPage:
                         col1, col2, col3, col4 = st.columns(4)
                         
                         with col1:
-                            avg_response = df['RESPONSE_TIME_MS'].mean()
-                            prev_avg = df['RESPONSE_TIME_MS'].iloc[1:].mean() if len(df) > 1 else avg_response  
+                            avg_response = current_summary['avg_response_ms']
+                            prev_avg = previous_summary['avg_response_ms']
                             trend = ((avg_response - prev_avg) / prev_avg * 100) if prev_avg != 0 else 0
-                            self.create_metric_with_info(
+                            self.create_metric_with_hover_analysis(
                                 "Avg Response Time", 
                                 f"{avg_response / 1000:.1f}s",
                                 f"{abs(trend):.1f}%",
                                 "up" if trend > 0 else "down",
                                 "Average time taken to process queries and generate responses. Lower values indicate better performance."
-                                "qa_tokens_metric"  # Added this parameter
                             )
                         
                         with col2:
-                            avg_memory = df['MEMORY_USAGE_MB'].mean()
-                            prev_memory = df['MEMORY_USAGE_MB'].iloc[1:].mean() if len(df) > 1 else avg_memory
+                            avg_memory = current_summary['avg_memory_mb']
+                            prev_memory = previous_summary['avg_memory_mb']
                             trend = ((avg_memory - prev_memory) / prev_memory * 100) if prev_memory != 0 else 0  
-                            self.create_metric_with_info(
+                            self.create_metric_with_hover_analysis(
                                 "Avg Memory Usage",
                                 f"{avg_memory:.1f}MB", 
                                 f"{abs(trend):.1f}%",
                                 "up" if trend > 0 else "down",
                                 "Average RAM usage during operations. Shows system resource consumption."
-                                "qa_tokens_metric"  # Added this parameter
                             )
                         
                         with col3:
-                            success_rate = (df['STATUS'] == 'success').mean() * 100
-                            prev_success = (df['STATUS'].iloc[1:] == 'success').mean() * 100 if len(df) > 1 else success_rate
+                            success_rate = current_summary['success_rate']
+                            prev_success = previous_summary['success_rate']
                             trend = success_rate - prev_success
-                            self.create_metric_with_info(
+                            self.create_metric_with_hover_analysis(
                                 "Success Rate",
                                 f"{success_rate:.1f}%",
                                 f"{abs(trend):.1f}%",  
                                 "up" if trend > 0 else "down",
                                 "Percentage of successful operations. Higher values indicate better reliability."
-                                "qa_tokens_metric"  # Added this parameter
                             )
                         
                         with col4:
-                           
-                            # Print all token counts for debugging
-                            # print("\nDEBUG: All Token Counts:")
-                            # print(df['TOKEN_COUNT'].tolist())
-                            
-                            # Explicitly handle token count calculation
-                            df['TOKEN_COUNT'] = pd.to_numeric(df['TOKEN_COUNT'], errors='coerce')
-                            mask = (df['TOKEN_COUNT'].notna()) & (df['TOKEN_COUNT'] > 0)
-                            valid_tokens = df.loc[mask, 'TOKEN_COUNT']
+                            avg_tokens = current_summary['avg_tokens']
+                            prev_tokens = previous_summary['avg_tokens']
+                            trend = ((avg_tokens - prev_tokens) / prev_tokens * 100) if prev_tokens != 0 else 0
                             
-                            if not valid_tokens.empty:
-                                avg_tokens = valid_tokens.mean()
-                                recent_tokens = valid_tokens.head(max(int(len(valid_tokens) * 0.2), 1)).mean()
-                                older_tokens = valid_tokens.tail(max(int(len(valid_tokens) * 0.2), 1)).mean()
-                                trend = ((recent_tokens - older_tokens) / older_tokens * 100) if older_tokens != 0 else 0
-                            else:
-                                avg_tokens = 0
-                                trend = 0
-                            
-                            self.create_metric_with_info(
+                            self.create_metric_with_hover_analysis(
                                 "Avg Token Usage",
                                 f"{int(avg_tokens):,d}",  # Format as integer with thousand separator
                                 f"{abs(trend):.1f}%",
@@ -1655,18 +1510,22 @@ class DashboardPage:
                         
                         col1, col2 = st.columns(2)
                         with col1:
-                            response_df = df.copy()
-                            # Convert response time to numeric and handle milliseconds to seconds
-                            response_df['RESPONSE_TIME_MS'] = pd.to_numeric(response_df['RESPONSE_TIME_MS'], errors='coerce') / 1000
-                            response_df = response_df.dropna(subset=['RESPONSE_TIME_MS'])
+                            response_df = df[['BUCKET_START', 'AVG_RESPONSE_MS', 'P95_RESPONSE_MS']].copy()
+                            # Convert response time from milliseconds to seconds
+                            response_df['Average'] = pd.to_numeric(response_df['AVG_RESPONSE_MS'], errors='coerce') / 1000
+                            response_df['p95'] = pd.to_numeric(response_df['P95_RESPONSE_MS'], errors='coerce') / 1000
+                            response_df = response_df.dropna(subset=['Average'])
+                            response_df = downsample_frame(response_df, 'BUCKET_START', ['Average', 'p95'], HALF_CHART_WIDTH_PX)
                             
                             if not response_df.empty:
-                                fig = px.line(response_df, x='TIMESTAMP', y='RESPONSE_TIME_MS',
-                                            template='plotly_dark')
+                                fig = px.line(response_df, x='BUCKET_START', y=['Average', 'p95'],
+                                            template='plotly_dark',
+                                            color_discrete_sequence=["#60a5fa", "#f59e0b"])
                                 fig = self.apply_modern_clean_style(fig, 'Response Time Trends')
-                                fig.update_traces(line_color="#60a5fa", line_width=2)
+                                fig.update_traces(line_width=2)
                                 # Update y-axis title to show seconds
                                 fig.update_layout(
+                                    xaxis_title="Time",
                                     yaxis_title="Response Time (seconds)",
                                     yaxis=dict(
                                         tickformat=".2f",
@@ -1678,13 +1537,13 @@ class DashboardPage:
                                 st.info("No response time data available")
                         
                         with col2:
-                            #st.write("Debug - DataFrame:", df)
-                                memory_df = df.copy()
-                                memory_df['MEMORY_USAGE_MB'] = pd.to_numeric(memory_df['MEMORY_USAGE_MB'], errors='coerce')
+                                memory_df = df[['BUCKET_START', 'AVG_MEMORY_MB']].copy()
+                                memory_df['MEMORY_USAGE_MB'] = pd.to_numeric(memory_df['AVG_MEMORY_MB'], errors='coerce')
                                 memory_df = memory_df.dropna(subset=['MEMORY_USAGE_MB'])
+                                memory_df = downsample_frame(memory_df, 'BUCKET_START', ['MEMORY_USAGE_MB'], HALF_CHART_WIDTH_PX)
                                 
                                 if not memory_df.empty:
-                                    fig = px.line(memory_df, x='TIMESTAMP', y='MEMORY_USAGE_MB',
+                                    fig = px.line(memory_df, x='BUCKET_START', y='MEMORY_USAGE_MB',
                                                 template='plotly_dark')
                                     fig = self.apply_modern_clean_style(fig, 'Memory Usage Trends')  
                                     fig.update_traces(line_color="#ef4444", line_width=2)
@@ -1697,79 +1556,85 @@ class DashboardPage:
                         col1, col2 = st.columns(2)
                         
                         with col1:
-                            fig = px.scatter(df, x='TIMESTAMP', y='TOKEN_COUNT',
+                            token_df = df[['BUCKET_START', 'SUM_TOKENS', 'TOKEN_EVENTS']].copy()
+                            token_df['TOKEN_COUNT'] = (
+                                pd.to_numeric(token_df['SUM_TOKENS'], errors='coerce') /
+                                pd.to_numeric(token_df['TOKEN_EVENTS'], errors='coerce').replace(0, float('nan'))
+                            )
+                            token_df = token_df.dropna(subset=['TOKEN_COUNT'])
+                            token_df = downsample_frame(token_df, 'BUCKET_START', ['TOKEN_COUNT'], HALF_CHART_WIDTH_PX, method='minmax')
+                            fig = px.scatter(token_df, x='BUCKET_START', y='TOKEN_COUNT',
                                             template='plotly_dark', opacity=0.7,
-                                            labels={'TIMESTAMP': 'Timestamp', 'TOKEN_COUNT': 'Tokens Used'})
+                                            labels={'BUCKET_START': 'Timestamp', 'TOKEN_COUNT': 'Tokens Used'})
                             fig = self.apply_modern_clean_style(fig, 'Token Usage Over Time')
                             fig.update_traces(marker=dict(size=10, color='#8b5cf6', line=dict(width=1, color='white')))
                             st.plotly_chart(fig, use_container_width=True)
                         
                         with col2:
-                            df['Success'] = (df['STATUS'] == 'success').astype(int)
-                            success_over_time = df.groupby(pd.Grouper(key='TIMESTAMP', freq='1h'))['Success'].mean() * 100
-                            fig = px.line(success_over_time, 
+                            success_df = df[['BUCKET_START', 'SUCCESS_COUNT', 'EVENT_COUNT']].copy()
+                            success_df['Success Rate'] = (
+                                pd.to_numeric(success_df['SUCCESS_COUNT'], errors='coerce') /
+                                pd.to_numeric(success_df['EVENT_COUNT'], errors='coerce') * 100
+                            )
+                            success_df = downsample_frame(success_df, 'BUCKET_START', ['Success Rate'], HALF_CHART_WIDTH_PX)
+                            fig = px.line(success_df, x='BUCKET_START', y='Success Rate',
                                         template='plotly_dark')  
                             fig = self.apply_modern_clean_style(fig, 'Success Rate Over Time')
                             fig.update_traces(line_color="#10b981", line_width=2)
                             st.plotly_chart(fig, use_container_width=True)
                     
-                    with tabs[1]:  # Document Analytics tab
-                        #st.markdown("### 📊 Document Quality Analysis")
-                    
-                        # Fetch quality metrics
-                            quality_metrics = self.get_quality_metrics(session)
-                            st.markdown("""                             
-                                <div style="                                 
-                                    padding: 10px;                                 
-                                    background-color: #46125;                                 
-                                    border-radius: 10px;                                   
-                                    margin-bottom: 10px;
-                                    text-align: center;  /* Added this */
-                                ">                             
-                                    <h2 style="
-                                        color: #f9fafb;
-                                        margin: 0;  /* Added this to remove default margins */
-                                    ">Document Quality Overview</h2>                             
-                                </div>                         
-                                """, unsafe_allow_html=True)
-                            
-                            # Display metrics using native Streamlit components
-                            self.render_quality_overview(quality_metrics, session)
-                            
-                            # Add explanatory text
-                            st.markdown("""                                 
-                                <div style="
-                                    padding: 20px; 
-                                    background: linear-gradient(135deg, #2D033B 0%, #810CA8 100%);
-                                    border-radius: 10px; 
-                                    margin-top: 20px;
-                                    border: 1px solid rgba(255, 255, 255, 0.1);
-                                ">
-                                    <h4 style="color: #E5B8F4;">📊 Quality Metrics Explanation</h4>
-                                    <ul style="color: #E5B8F4;">
-                                        <li><strong style="color: #C147E9;">Total Documents:</strong> Number of documents in the system</li>
-                                        <li><strong style="color: #C147E9;">Documents Accessed:</strong> Percentage of documents that have been queried</li>
-                                        <li><strong style="color: #C147E9;">Performance Score:</strong> Overall system performance rating</li>
-                                        <li><strong style="color: #C147E9;">Documents with Errors:</strong> Number of documents with processing issues</li>
-                                    </ul>
-                                </div>
+                with tabs[1]:  # Document Analytics tab
+                    #st.markdown("### 📊 Document Quality Analysis")
+                
+                    # Fetch quality metrics
+                        quality_metrics = self.get_quality_metrics(session)
+                        st.markdown("""                             
+                            <div style="                                 
+                                padding: 10px;                                 
+                                background-color: #46125;                                 
+                                border-radius: 10px;                                   
+                                margin-bottom: 10px;
+                                text-align: center;  /* Added this */
+                            ">                             
+                                <h2 style="
+                                    color: #f9fafb;
+                                    margin: 0;  /* Added this to remove default margins */
+                                ">Document Quality Overview</h2>                             
+                            </div>                         
                             """, unsafe_allow_html=True)
                         
-                      
-      
-                            
-                    with tabs[2]:
-                        #st.markdown("### 🎙️ AI Presenter")
-                        # If metrics data exists, render the AI presenter
-                        if metrics_data is not None:
-                            self.render_ai_presenter(metrics_data)
-                        else:
-                            st.warning("No metrics data available for presentation")
-                                                              
-                                            
+                        # Display metrics using native Streamlit components
+                        self.render_quality_overview(quality_metrics, session)
                         
-                else:
-                    st.info("No metrics data available yet")
+                        # Add explanatory text
+                        st.markdown("""                                 
+                            <div style="
+                                padding: 20px; 
+                                background: linear-gradient(135deg, #2D033B 0%, #810CA8 100%);
+                                border-radius: 10px; 
+                                margin-top: 20px;
+                                border: 1px solid rgba(255, 255, 255, 0.1);
+                            ">
+                                <h4 style="color: #E5B8F4;">📊 Quality Metrics Explanation</h4>
+                                <ul style="color: #E5B8F4;">
+                                    <li><strong style="color: #C147E9;">Total Documents:</strong> Number of documents in the system</li>
+                                    <li><strong style="color: #C147E9;">Documents Accessed:</strong> Percentage of documents that have been queried</li>
+                                    <li><strong style="color: #C147E9;">Performance Score:</strong> Overall system performance rating</li>
+                                    <li><strong style="color: #C147E9;">Documents with Errors:</strong> Number of documents with processing issues</li>
+                                </ul>
+                            </div>
+                        """, unsafe_allow_html=True)
+                    
+                  
+  
+                        
+                with tabs[2]:
+                    #st.markdown("### 🎙️ AI Presenter")
+                    # The presenter reads its own metrics snapshot, so it stays available without recent activity
+                    self.render_ai_presenter(df)
+                                                          
+                                        
+                    
                     
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
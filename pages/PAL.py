@@ -1,7 +1,12 @@
 import streamlit as st
 import json
 from back import SnowparkManager
+import statements
+import llm_streaming
+from llm_client import LLMClient
+import context_budget
 from truelens_utils import TruLensEvaluator
+from tracing import span, traced
 
 class PAL:
     def __init__(self):
@@ -247,30 +252,43 @@ class PAL:
         
         
 
-    def get_chatbot_response(self, user_input: str, book_name: str) -> str:
-        """Generate a response using Snowflake session with improved error handling."""
+    @traced("pal.request")
+    def get_chatbot_response(self, user_input: str, book_name: str, stream: bool = False):
+        """
+        Generate a response using Snowflake session with improved error handling.
+        With stream=True a token stream is returned in place of the answer text;
+        messages for missing content or errors are still returned as text.
+        """
+        session = None
+        close_session = True
         try:
             session = SnowparkManager.get_session()
             if not session:
                 return "I'm having trouble accessing the document. Please try again."
                 
             # Get relevant document content
-            safe_book_name = book_name.replace("'", "''")
-            content_query = f"""
-            SELECT CONTENT, METADATA:page_number::INTEGER as PAGE_NUM
-            FROM RAG_DOCUMENTS_TMP
-            WHERE FILENAME = '{safe_book_name}'
-            ORDER BY PAGE_NUM
-            """
-            results = session.sql(content_query).collect()
+            with span("retrieval") as retrieval_span:
+                results = statements.RAG_PAGES_BY_FILENAME.collect(session, book_name)
+                retrieval_span.set(pages=len(results))
             
             if not results:
                 return f"I couldn't find any content in the document '{book_name}'. Please make sure the document is properly loaded."
                 
-            # Combine content from all pages with page numbers
+            # Whole documents rarely fit: keep the pages most relevant to the question, in page order
+            with span("prompt.assemble") as prompt_span:
+                pages = [{'PAGE_NUM': row['PAGE_NUM'], 'CONTENT': row['CONTENT'] or ""} for row in results]
+                for page, score in zip(pages, context_budget.relevance_scores(user_input, pages)):
+                    page['SCORE'] = score
+                budget = context_budget.evidence_budget('mistral-large', 500, context_budget.count_tokens(user_input))
+                packed, context_tokens = context_budget.pack_context(
+                    pages, budget, score_key='SCORE', header=lambda page: f"[Page {page['PAGE_NUM']}]: ",
+                    keep_order=True
+                )
+                prompt_span.set(pages=len(packed), tokens=context_tokens, budget=budget)
+
             document_content = "\n".join([
-                f"[Page {row['PAGE_NUM']}]: {row['CONTENT']}"
-                for row in results
+                f"[Page {page['PAGE_NUM']}]: {page['CONTENT']}"
+                for page in packed
             ])
             
             # Create a focused system prompt
@@ -287,42 +305,23 @@ class PAL:
             {document_content}
             """
             
-            # Clean and escape the prompts
-            safe_user_input = user_input.replace("'", "''")
-            safe_system_prompt = system_prompt.replace("'", "''")
-            
-            # Generate response
-            query = f"""
-            SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                'mistral-large',
-                ARRAY_CONSTRUCT(
-                    OBJECT_CONSTRUCT('role', 'system', 'content', '{safe_system_prompt}'),
-                    OBJECT_CONSTRUCT('role', 'user', 'content', 'Based on the document content provided, {safe_user_input}')
-                ),
-                OBJECT_CONSTRUCT(
-                    'temperature', 0.3,
-                    'max_tokens', 500
+            user_prompt = f"Based on the document content provided, {user_input}"
+            if stream:
+                def finish_stream(answer_stream):
+                    session.close()
+
+                answer_stream = llm_streaming.stream_completion(
+                    session, 'mistral-large', system_prompt, user_prompt, 0.3, 500,
+                    on_complete=finish_stream
                 )
-            ) as response;
-            """
-            
-            result = session.sql(query).collect()
-            
-            if result and result[0]['RESPONSE']:
-                try:
-                    response_data = json.loads(result[0]['RESPONSE'])
-                    if 'choices' in response_data and response_data['choices']:
-                        if isinstance(response_data['choices'][0], dict):
-                            if 'message' in response_data['choices'][0]:
-                                return response_data['choices'][0]['message'].get('content', '').strip()
-                            elif 'messages' in response_data['choices'][0]:
-                                return response_data['choices'][0]['messages'].strip()
-                        return str(response_data['choices'][0]).strip()
-                    
-                except json.JSONDecodeError as e:
-                    print(f"JSON decode error: {str(e)}")
-                    # Try to use raw response if JSON parsing fails
-                    return str(result[0]['RESPONSE']).strip()
+                close_session = False
+                return answer_stream
+
+            # Generate response
+            with span("completion", model='mistral-large'):
+                answer = LLMClient.complete(session, 'mistral-large', system_prompt, user_prompt, 0.3, 500)
+            if answer:
+                return answer
                     
             return "I cannot generate a proper response from the document content. Please try rephrasing your question."
                 
@@ -330,15 +329,15 @@ class PAL:
             print(f"Error in get_chatbot_response: {str(e)}")
             return "I encountered an error while analyzing the document. Please try again."
         finally:
-            if session:
+            # A streamed answer closes the session once the stream finishes
+            if session and close_session:
                 session.close()
 
     def fetch_books(self):
         """Fetch books from the database using the SnowparkManager."""
         try:
             session = SnowparkManager.get_session()
-            query = "SELECT * FROM TESTDB.MYSCHEMA.BOOK_METADATA"
-            results = session.sql(query).collect()
+            results = statements.BOOK_METADATA_ALL.collect(session)
 
             books = [
                 {
@@ -541,10 +540,17 @@ class PAL:
                     # Chat input
                     user_input = st.chat_input("Ask about the book or chat with PAL...")
                     if user_input:
-                        bot_response = self.get_chatbot_response(user_input, st.session_state["selected_book"]["name"])
-                        st.session_state["history"].append((user_input, bot_response))
                         st.chat_message("user").markdown(user_input)
-                        st.chat_message("assistant").markdown(bot_response)
+                        bot_response = self.get_chatbot_response(
+                            user_input, st.session_state["selected_book"]["name"], stream=True
+                        )
+                        with span("render.chat_message"):
+                            if isinstance(bot_response, str):
+                                st.chat_message("assistant").markdown(bot_response)
+                            else:
+                                # Tokens are shown as they arrive
+                                bot_response = st.chat_message("assistant").write_stream(bot_response)
+                        st.session_state["history"].append((user_input, bot_response))
                         
                         
                         st.empty()
@@ -585,7 +591,7 @@ class PAL:
                                     operation_type="CHAT",
                                     style="Normal",
                                     format_type="Conversation",
-                                    output_token_count=len(bot_response.split())
+                                    output_token_count=context_budget.count_tokens(bot_response)
                                 )
 
                                 # Display evaluation results
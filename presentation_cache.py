@@ -0,0 +1,223 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import statements
+from llm_client import LLMClient
+from metric_insights import round_metric_value
+from metrics_rollups import MetricsRollups
+from tts_pipeline import TTSPipeline
+
+PRESENTER_MODEL = 'mistral-large2'
+PRESENTER_SYSTEM_PROMPT = (
+    "You are an expert AI metrics analyst presenting system performance and document analytics. "
+    "Focus on:\n"
+    "1. System Performance - response times, memory usage, success rates, and token usage\n"
+    "2. Document Analytics - processing patterns, usage statistics, and access trends\n\n"
+    "Provide clear insights and actionable recommendations based on the metrics."
+)
+# Keep this many generated presentations per process
+MAX_PRESENTATIONS = 20
+# Presenter settings kept up to date in the background when the rollups change
+MAX_WATCHED_SETTINGS = 10
+
+PresentationKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+
+def metrics_fingerprint(metrics: Dict[str, Any]) -> str:
+    """Quantized view of the metrics; a new presentation is only generated when this changes"""
+    return "|".join(f"{name}={round_metric_value(metrics[name])}" for name in sorted(metrics))
+
+
+def presenter_metrics(session) -> Optional[Dict[str, Any]]:
+    """All-time metrics the presenter talks about, read from the rollups"""
+    summary = MetricsRollups.summarize(MetricsRollups.load_window(session, "All Time")[0])
+    if not summary:
+        return None
+    documents = statements.ANALYTICS_DOCUMENT_COUNT.collect(session)
+    return {
+        'response_time': summary['avg_response_ms'] / 1000,  # Convert to seconds
+        'memory_usage': summary['avg_memory_mb'],
+        'success_rate': summary['success_rate'],
+        'token_usage': summary['avg_tokens'],
+        'total_documents': documents[0]['DOCUMENTS'] if documents else 0,
+        'total_queries': summary['events']
+    }
+
+
+def clean_for_speech(text: str) -> str:
+    """Strip markdown so the narration does not read out symbols"""
+    text = re.sub(r'\*\*|__', '', text)
+    text = re.sub(r'\*|_', '', text)
+    text = re.sub(r'#+\s', '', text)
+    text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
+    text = re.sub(r'•', '', text)
+    return re.sub(r'\n+', ' ', text)
+
+
+class PresentationCache:
+    """
+    Background-generated AI presentations keyed by (metrics fingerprint, settings).
+    Each entry holds the script and its narration segments per accent. One job
+    per key writes the script once, then narrates every accent requested for it.
+    """
+    _entries: Dict[PresentationKey, Dict[str, Any]] = {}
+    # Key -> accents still to narrate; present while the key's job runs
+    _jobs: Dict[PresentationKey, Set[str]] = {}
+    # Settings key -> (settings, accents, prompt builder) regenerated when the rollups change
+    _watched: "OrderedDict[Tuple[Tuple[str, Any], ...], Tuple[Dict[str, Any], Set[str], Callable]]" = OrderedDict()
+    _refreshing = threading.Event()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def key(metrics: Dict[str, Any], settings: Dict[str, Any]) -> PresentationKey:
+        return (metrics_fingerprint(metrics), tuple(sorted(settings.items())))
+
+    @staticmethod
+    def ensure(metrics: Dict[str, Any], settings: Dict[str, Any], prompt: str, accent: str) -> None:
+        """Start generating the script and narration for these metrics unless already done or running"""
+        key = PresentationCache.key(metrics, settings)
+        with PresentationCache._lock:
+            entry = PresentationCache._entries.get(key)
+            if entry and accent in entry['audio']:
+                return
+            pending = PresentationCache._jobs.get(key)
+            if pending is not None:
+                # The running job narrates this accent after the ones before it
+                pending.add(accent)
+                return
+            PresentationCache._jobs[key] = {accent}
+
+        thread = threading.Thread(
+            target=PresentationCache._generate,
+            args=(key, dict(settings), prompt),
+            daemon=True
+        )
+        thread.start()
+
+    @staticmethod
+    def watch(settings: Dict[str, Any], accent: str, build_prompt: Callable[[Dict[str, Any], Dict[str, Any]], str]) -> None:
+        """Keep presentations for these settings and accent current whenever the rollups are refreshed"""
+        settings_key = tuple(sorted(settings.items()))
+        with PresentationCache._lock:
+            watched = PresentationCache._watched.get(settings_key)
+            accents = watched[1] if watched else set()
+            accents.add(accent)
+            PresentationCache._watched[settings_key] = (dict(settings), accents, build_prompt)
+            PresentationCache._watched.move_to_end(settings_key)
+            while len(PresentationCache._watched) > MAX_WATCHED_SETTINGS:
+                PresentationCache._watched.popitem(last=False)
+
+    @staticmethod
+    def metrics_changed() -> None:
+        """Rollup listener: regenerate watched presentations in a background thread"""
+        with PresentationCache._lock:
+            if not PresentationCache._watched or PresentationCache._refreshing.is_set():
+                return
+            PresentationCache._refreshing.set()
+        threading.Thread(target=PresentationCache._refresh_watched, daemon=True).start()
+
+    @staticmethod
+    def _refresh_watched() -> None:
+        from back import SnowparkManager
+
+        session = None
+        try:
+            session = SnowparkManager.get_session()
+            metrics = presenter_metrics(session) if session else None
+            if not metrics:
+                return
+            with PresentationCache._lock:
+                watched = [(settings, set(accents), build_prompt)
+                           for settings, accents, build_prompt in PresentationCache._watched.values()]
+            for settings, accents, build_prompt in watched:
+                prompt = build_prompt(metrics, settings)
+                for accent in accents:
+                    PresentationCache.ensure(metrics, settings, prompt, accent)
+        except Exception as e:
+            print(f"Error refreshing presentations: {str(e)}")
+        finally:
+            if session is not None:
+                session.close()
+            PresentationCache._refreshing.clear()
+
+    @staticmethod
+    def latest(settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Most recent finished presentation for these settings, even if the metrics moved since"""
+        settings_key = tuple(sorted(settings.items()))
+        with PresentationCache._lock:
+            ready = [
+                entry for (_, entry_settings), entry in PresentationCache._entries.items()
+                if entry_settings == settings_key and entry.get('script')
+            ]
+        return max(ready, key=lambda entry: entry['created_at']) if ready else None
+
+    @staticmethod
+    def is_generating() -> bool:
+        with PresentationCache._lock:
+            return bool(PresentationCache._jobs)
+
+    @staticmethod
+    def audio_segments(entry: Dict[str, Any], accent: str) -> Optional[List[bytes]]:
+        with PresentationCache._lock:
+            return entry['audio'].get(accent)
+
+    @staticmethod
+    def _generate(key: PresentationKey, settings: Dict[str, Any], prompt: str) -> None:
+        try:
+            with PresentationCache._lock:
+                entry = PresentationCache._entries.get(key)
+
+            if not entry:
+                script = PresentationCache._complete(prompt)
+                if not script:
+                    with PresentationCache._lock:
+                        PresentationCache._jobs.pop(key, None)
+                    return
+                entry = {'script': script, 'audio': {}, 'settings': settings, 'created_at': time.time()}
+                with PresentationCache._lock:
+                    PresentationCache._entries[key] = entry
+                    while len(PresentationCache._entries) > MAX_PRESENTATIONS:
+                        oldest = min(PresentationCache._entries, key=lambda k: PresentationCache._entries[k]['created_at'])
+                        PresentationCache._entries.pop(oldest)
+
+            narration = clean_for_speech(entry['script'])
+            while True:
+                with PresentationCache._lock:
+                    pending = PresentationCache._jobs[key]
+                    pending.difference_update(entry['audio'])
+                    if not pending:
+                        # Checked and removed under the lock, so a later ensure() starts a new job
+                        PresentationCache._jobs.pop(key)
+                        return
+                    accent = next(iter(pending))
+                segments = TTSPipeline().synthesize(narration, accent)
+                with PresentationCache._lock:
+                    entry['audio'][accent] = segments
+        except Exception as e:
+            print(f"Error generating presentation in background: {str(e)}")
+            with PresentationCache._lock:
+                PresentationCache._jobs.pop(key, None)
+
+    @staticmethod
+    def _complete(prompt: str) -> Optional[str]:
+        """Generate the presentation script with Cortex COMPLETE through the shared client"""
+        from back import SnowparkManager
+
+        session = SnowparkManager.get_session()
+        if session is None:
+            print("Error generating presentation: no Snowflake session")
+            return None
+        try:
+            script = LLMClient.complete(
+                session, PRESENTER_MODEL, PRESENTER_SYSTEM_PROMPT, prompt,
+                temperature=0.7, max_tokens=500, options={'top_p': 0.9}
+            )
+        finally:
+            session.close()
+        return script or None
+
+
+MetricsRollups.add_listener(PresentationCache.metrics_changed)
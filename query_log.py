@@ -0,0 +1,289 @@
+import re
+import time
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from tracing import TracedQuery, TracedSession, current_span, span
+
+# Statements slower than this are kept in the slow-query log
+SLOW_QUERY_MS = 1000
+SLOW_LOG_SIZE = 200
+# Upper bounds of the duration histogram buckets in milliseconds; the last bucket is open
+HISTOGRAM_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Rows sampled when estimating result size
+SIZE_SAMPLE_ROWS = 100
+# How often pending collect_nowait() jobs are checked for completion
+ASYNC_POLL_SECONDS = 0.25
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_TEMP_TABLE = re.compile(r"\bTEMP_[0-9a-f]{8}\b", re.I)
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Statement with literals replaced by ?, so the same query shape groups together"""
+    text = _STRING_LITERAL.sub("?", statement)
+    text = _NUMBER.sub("?", text)
+    text = _TEMP_TABLE.sub("TEMP_?", text)
+    text = _VALUE_LIST.sub("(?, ...)", text)
+    return _WHITESPACE.sub(" ", text).strip().rstrip(";")
+
+
+def _value_bytes(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    if isinstance(value, (int, float, bool)):
+        return 8
+    return len(str(value))
+
+
+def estimate_bytes(rows: Optional[Sequence[Any]]) -> int:
+    """Approximate payload size of a result, extrapolated from the first rows"""
+    if not rows:
+        return 0
+    sample = rows[:SIZE_SAMPLE_ROWS]
+    sampled = sum(_value_bytes(value) for row in sample for value in row)
+    return int(sampled * len(rows) / len(sample))
+
+
+class QueryLog:
+    """
+    Process-wide statistics for every statement run through InstrumentedSession:
+    per-fingerprint counts, durations, rows, bytes and a duration histogram,
+    plus a bounded log of statements slower than SLOW_QUERY_MS.
+    """
+    _stats: Dict[str, Dict[str, Any]] = {}
+    _slow: deque = deque(maxlen=SLOW_LOG_SIZE)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(
+        statement: str,
+        duration_ms: float,
+        rows: int = 0,
+        bytes_received: int = 0,
+        bytes_sent: int = 0,
+        error: Optional[str] = None
+    ) -> None:
+        shape = fingerprint(statement)
+        key = hashlib.md5(shape.encode()).hexdigest()[:12]
+        bucket = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if duration_ms <= bound), len(HISTOGRAM_BOUNDS_MS))
+        with QueryLog._lock:
+            stats = QueryLog._stats.get(key)
+            if stats is None:
+                stats = QueryLog._stats[key] = {
+                    'fingerprint_id': key,
+                    'fingerprint': shape,
+                    'calls': 0,
+                    'errors': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'rows': 0,
+                    'bytes_received': 0,
+                    'bytes_sent': 0,
+                    'histogram': [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                    'last_seen': None,
+                }
+            stats['calls'] += 1
+            stats['errors'] += error is not None
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['rows'] += rows
+            stats['bytes_received'] += bytes_received
+            stats['bytes_sent'] += bytes_sent
+            stats['histogram'][bucket] += 1
+            stats['last_seen'] = datetime.now()
+
+            if duration_ms >= SLOW_QUERY_MS:
+                active_span = current_span()
+                QueryLog._slow.appendleft({
+                    'timestamp': datetime.now(),
+                    'fingerprint_id': key,
+                    'duration_ms': round(duration_ms, 1),
+                    'rows': rows,
+                    'bytes_received': bytes_received,
+                    'statement': " ".join(statement.split())[:2000],
+                    'trace_id': active_span.trace_id if active_span else None,
+                    'error': error,
+                })
+
+    @staticmethod
+    def add_result(statement: str, rows: int, bytes_received: int) -> None:
+        """Add the result size of an async statement, already counted by record() when it finished"""
+        key = hashlib.md5(fingerprint(statement).encode()).hexdigest()[:12]
+        with QueryLog._lock:
+            stats = QueryLog._stats.get(key)
+            if stats is not None:
+                stats['rows'] += rows
+                stats['bytes_received'] += bytes_received
+
+    @staticmethod
+    def stats() -> List[Dict[str, Any]]:
+        """Per-fingerprint statistics, most total time first"""
+        with QueryLog._lock:
+            rows = [dict(stats, histogram=list(stats['histogram'])) for stats in QueryLog._stats.values()]
+        for stats in rows:
+            stats['mean_ms'] = stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0
+            stats['p50_ms'] = QueryLog.histogram_percentile(stats['histogram'], 50)
+            stats['p95_ms'] = QueryLog.histogram_percentile(stats['histogram'], 95)
+        return sorted(rows, key=lambda stats: stats['total_ms'], reverse=True)
+
+    @staticmethod
+    def slow_queries() -> List[Dict[str, Any]]:
+        with QueryLog._lock:
+            return list(QueryLog._slow)
+
+    @staticmethod
+    def histogram_labels() -> List[str]:
+        labels = [f"≤{bound} ms" for bound in HISTOGRAM_BOUNDS_MS]
+        return labels + [f">{HISTOGRAM_BOUNDS_MS[-1]} ms"]
+
+    @staticmethod
+    def histogram_percentile(histogram: Sequence[int], pct: float) -> float:
+        """Upper bound of the bucket holding the percentile; open last bucket reports its lower bound"""
+        total = sum(histogram)
+        if not total:
+            return 0.0
+        target = total * pct / 100
+        running = 0
+        for i, count in enumerate(histogram):
+            running += count
+            if running >= target:
+                return float(HISTOGRAM_BOUNDS_MS[min(i, len(HISTOGRAM_BOUNDS_MS) - 1)])
+        return float(HISTOGRAM_BOUNDS_MS[-1])
+
+    @staticmethod
+    def reset() -> None:
+        with QueryLog._lock:
+            QueryLog._stats.clear()
+            QueryLog._slow.clear()
+
+
+class _InstrumentedAsyncJob:
+    """
+    Async job proxy. The statement is recorded when the AsyncJobWatcher sees
+    the job finish on the server (timed to within ASYNC_POLL_SECONDS), whether
+    or not its result is ever fetched; rows are added if the caller fetches them.
+    """
+
+    def __init__(self, job: Any, query: "InstrumentedQuery", started: float):
+        self._job = job
+        self._query = query
+        self._started = started
+        self._finished = threading.Event()
+        AsyncJobWatcher.watch(self)
+
+    def _check(self) -> bool:
+        """Record the job if it has finished; called from the watcher thread"""
+        try:
+            if not self._job.is_done():
+                return False
+        except Exception as e:
+            self._query._record(self._started, None, e)
+        else:
+            self._query._record(self._started, None, None)
+        self._finished.set()
+        return True
+
+    def result(self, *args, **kwargs):
+        rows = self._job.result(*args, **kwargs)
+        # Counted once the watcher has recorded the job
+        self._finished.wait(timeout=2 * ASYNC_POLL_SECONDS)
+        QueryLog.add_result(self._query._statement, len(rows) if rows is not None else 0, estimate_bytes(rows))
+        return rows
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._job, name)
+
+
+class AsyncJobWatcher:
+    """Background thread polling pending async jobs until each finishes; runs only while jobs are pending"""
+    _pending: List[_InstrumentedAsyncJob] = []
+    _thread: Optional[threading.Thread] = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def watch(job: _InstrumentedAsyncJob) -> None:
+        with AsyncJobWatcher._lock:
+            AsyncJobWatcher._pending.append(job)
+            if AsyncJobWatcher._thread is None:
+                AsyncJobWatcher._thread = threading.Thread(target=AsyncJobWatcher._run, name="query-log-async", daemon=True)
+                AsyncJobWatcher._thread.start()
+
+    @staticmethod
+    def _run() -> None:
+        while True:
+            with AsyncJobWatcher._lock:
+                jobs = list(AsyncJobWatcher._pending)
+            finished = [job for job in jobs if job._check()]
+            with AsyncJobWatcher._lock:
+                AsyncJobWatcher._pending = [job for job in AsyncJobWatcher._pending if job not in finished]
+                if not AsyncJobWatcher._pending:
+                    AsyncJobWatcher._thread = None
+                    return
+            time.sleep(ASYNC_POLL_SECONDS)
+
+
+class InstrumentedQuery(TracedQuery):
+    """Records every execution of a statement in the QueryLog, inside its sql.execute span"""
+
+    def __init__(self, query: Any, statement: str, params: Optional[Sequence[Any]]):
+        super().__init__(query, statement)
+        self._params = params
+
+    def _record(self, started: float, rows: Optional[Sequence[Any]], error: Optional[Exception]) -> None:
+        QueryLog.record(
+            self._statement,
+            (time.perf_counter() - started) * 1000,
+            rows=len(rows) if rows is not None else 0,
+            bytes_received=estimate_bytes(rows),
+            bytes_sent=len(self._statement) + sum(_value_bytes(p) for p in (self._params or [])),
+            error=f"{type(error).__name__}: {error}" if error else None
+        )
+
+    def collect(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            rows = super().collect(*args, **kwargs)
+        except Exception as e:
+            self._record(started, None, e)
+            raise
+        self._record(started, rows, None)
+        return rows
+
+    def collect_nowait(self, *args, **kwargs):
+        return _InstrumentedAsyncJob(self._query.collect_nowait(*args, **kwargs), self, time.perf_counter())
+
+    def to_pandas(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with span("sql.execute", statement=" ".join(self._statement.split())[:200]):
+                df = self._query.to_pandas(*args, **kwargs)
+        except Exception as e:
+            self._record(started, None, e)
+            raise
+        QueryLog.record(
+            self._statement,
+            (time.perf_counter() - started) * 1000,
+            rows=len(df),
+            bytes_received=int(df.memory_usage(deep=True).sum())
+        )
+        return df
+
+
+class InstrumentedSession(TracedSession):
+    """Session proxy returned by SnowparkManager.get_session(); every statement is traced and logged"""
+
+    def sql(self, query: str, params: Optional[Sequence[Any]] = None, *args, **kwargs) -> InstrumentedQuery:
+        if params is not None:
+            kwargs['params'] = params
+        return InstrumentedQuery(self._session.sql(query, *args, **kwargs), query, params)
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple, Union
+
+# Characters of pre-rendered HTML kept in memory across all documents
+RENDER_CACHE_BUDGET_CHARS = 64 * 1024 * 1024
+# Number of HTML blocks (paragraphs, headings, lists) sent to the browser per page
+SECTION_BLOCKS = 40
+
+RenderKey = Tuple[str, str, str, int]
+
+
+def content_hash(content: Union[str, bytes, bytearray, memoryview]) -> str:
+    """Stable hash of document content used in render cache keys"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+class RenderCache:
+    """
+    Process-wide LRU of pre-rendered HTML blocks keyed by
+    (document hash, renderer, theme, font size).
+    """
+    _entries: "OrderedDict[RenderKey, List[str]]" = OrderedDict()
+    _sizes: Dict[RenderKey, int] = {}
+    _total_chars = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_blocks(
+        doc_hash: str,
+        renderer: str,
+        theme: str,
+        font_size: int,
+        builder: Callable[[], List[str]]
+    ) -> List[str]:
+        """Return cached HTML blocks for a document, building them on a miss"""
+        key = (doc_hash, renderer, theme, font_size)
+        with RenderCache._lock:
+            if key in RenderCache._entries:
+                RenderCache._entries.move_to_end(key)
+                return RenderCache._entries[key]
+
+        blocks = builder()
+        size = sum(len(block) for block in blocks)
+
+        with RenderCache._lock:
+            if key not in RenderCache._entries:
+                RenderCache._entries[key] = blocks
+                RenderCache._sizes[key] = size
+                RenderCache._total_chars += size
+                while RenderCache._total_chars > RENDER_CACHE_BUDGET_CHARS and len(RenderCache._entries) > 1:
+                    old_key, _ = RenderCache._entries.popitem(last=False)
+                    RenderCache._total_chars -= RenderCache._sizes.pop(old_key)
+            return RenderCache._entries[key]
+
+    @staticmethod
+    def page_count(blocks: List[str], blocks_per_page: int = SECTION_BLOCKS) -> int:
+        """Number of pages needed to show all blocks"""
+        return max(1, -(-len(blocks) // blocks_per_page))
+
+    @staticmethod
+    def get_page(blocks: List[str], page: int, blocks_per_page: int = SECTION_BLOCKS) -> str:
+        """Join the blocks of one page (1-based) into a single HTML fragment"""
+        start = (page - 1) * blocks_per_page
+        return '\n'.join(blocks[start:start + blocks_per_page])
+
+    @staticmethod
+    def clear() -> None:
+        with RenderCache._lock:
+            RenderCache._entries.clear()
+            RenderCache._sizes.clear()
+            RenderCache._total_chars = 0
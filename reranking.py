@@ -0,0 +1,187 @@
+import re
+import json
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import statements
+from statements import json_param
+from llm_client import LLMClient
+from tracing import span
+
+# Candidates fetched per final result when reranking, and the most ever fetched
+CANDIDATE_MULTIPLIER = 4
+MAX_CANDIDATES = 24
+# Weights of the signals combined into the rerank score; each is scaled to 0..1 first
+COSINE_WEIGHT = 0.5
+BM25_WEIGHT = 0.35
+RETRIEVAL_WEIGHT = 0.15
+BM25_K1 = 1.2
+BM25_B = 0.75
+EMBEDDING_CACHE_SIZE = 5000
+
+_TERM = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what when "
+    "where which who why will with does did do about into than then there their".split()
+)
+
+
+def candidate_count(k: int) -> int:
+    """Search results to fetch so that k survive reranking"""
+    return max(k, min(MAX_CANDIDATES, k * CANDIDATE_MULTIPLIER))
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TERM.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class EmbeddingCache:
+    """
+    Unit-length chunk embeddings by content hash. Misses are read from the
+    embeddings stored at ingestion in one query; only chunks without one are
+    embedded, concurrently through LLMClient.
+    """
+    _vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        # Matches SHA2(TRIM(CONTENT, ' \n\r\t'), 256) in RAG_EMBEDDINGS_BY_CONTENT_HASH
+        return hashlib.sha256(text.strip(" \n\r\t").encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _unit(vector: Any) -> Optional[np.ndarray]:
+        if isinstance(vector, str):
+            vector = json.loads(vector)
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else None
+
+    @staticmethod
+    def _remember(key: str, vector: Optional[np.ndarray]) -> None:
+        if vector is None:
+            return
+        with EmbeddingCache._lock:
+            EmbeddingCache._vectors[key] = vector
+            EmbeddingCache._vectors.move_to_end(key)
+            while len(EmbeddingCache._vectors) > EMBEDDING_CACHE_SIZE:
+                EmbeddingCache._vectors.popitem(last=False)
+
+    @staticmethod
+    def _stored(session, keys: Sequence[str], filenames: Sequence[str]) -> Dict[str, np.ndarray]:
+        rows = statements.RAG_EMBEDDINGS_BY_CONTENT_HASH.collect(
+            session, json_param(sorted(set(filenames))), json_param(sorted(set(keys)))
+        )
+        stored = {}
+        for row in rows:
+            vector = EmbeddingCache._unit(row['EMBEDDING']) if row['EMBEDDING'] is not None else None
+            if vector is not None:
+                stored[row['CONTENT_HASH']] = vector
+        return stored
+
+    @staticmethod
+    def get_many(session, texts: Sequence[str], filenames: Optional[Sequence[str]] = None) -> List[Optional[np.ndarray]]:
+        """Embeddings in order; None where none could be found or made"""
+        keys = [EmbeddingCache._key(text) for text in texts]
+        with EmbeddingCache._lock:
+            vectors = [EmbeddingCache._vectors.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if not missing or session is None:
+            return vectors
+
+        if filenames:
+            with span("rerank.stored_embeddings", chunks=len(missing)):
+                stored = EmbeddingCache._stored(
+                    session, [keys[i] for i in missing], [filenames[i] for i in missing if filenames[i]]
+                )
+            for i in missing:
+                vectors[i] = stored.get(keys[i])
+                EmbeddingCache._remember(keys[i], vectors[i])
+            missing = [i for i in missing if vectors[i] is None]
+
+        if missing:
+            embedded = LLMClient.embed_many(session, [texts[i] for i in missing])
+            for i, embedding in zip(missing, embedded):
+                vectors[i] = EmbeddingCache._unit(embedding) if embedding else None
+                EmbeddingCache._remember(keys[i], vectors[i])
+        return vectors
+
+    @staticmethod
+    def put(text: str, embedding: Sequence[float]) -> None:
+        EmbeddingCache._remember(EmbeddingCache._key(text), EmbeddingCache._unit(embedding))
+
+
+def bm25_scores(query: str, texts: Sequence[str]) -> np.ndarray:
+    """Okapi BM25 of the query against each text, with statistics from the candidate set itself"""
+    query_terms = list(dict.fromkeys(_terms(query)))
+    if not query_terms or not texts:
+        return np.zeros(len(texts), dtype=np.float32)
+    column = {term: j for j, term in enumerate(query_terms)}
+    tf = np.zeros((len(texts), len(query_terms)), dtype=np.float32)
+    lengths = np.zeros(len(texts), dtype=np.float32)
+    for i, text in enumerate(texts):
+        terms = _terms(text)
+        lengths[i] = len(terms)
+        for term, count in Counter(terms).items():
+            j = column.get(term)
+            if j is not None:
+                tf[i, j] = count
+    df = (tf > 0).sum(axis=0)
+    idf = np.log(1 + (len(texts) - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()), 1.0))
+    return ((tf * (BM25_K1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def _scaled(values: np.ndarray) -> np.ndarray:
+    """Min-max scale to 0..1; a constant signal contributes nothing"""
+    low, high = float(values.min()), float(values.max())
+    if not math.isfinite(low) or high - low < 1e-9:
+        return np.zeros_like(values)
+    return (values - low) / (high - low)
+
+
+def rerank(
+    query: str,
+    candidates: Sequence[Dict[str, Any]],
+    k: int,
+    session=None,
+    query_embedding: Optional[Sequence[float]] = None,
+    text_key: str = 'CONTENT',
+    score_key: Optional[str] = 'SIMILARITY_SCORE'
+) -> List[Dict[str, Any]]:
+    """
+    Order retrieval candidates by a weighted mix of embedding cosine
+    similarity, BM25 and the search service's own score, and keep the top k.
+    Without a session or query embedding the cosine signal is left out.
+    Returns copies with 'RERANK_SCORE' set.
+    """
+    if len(candidates) <= 1:
+        return [dict(c, RERANK_SCORE=1.0) for c in candidates[:k]]
+    with span("rerank", candidates=len(candidates), k=k) as rerank_span:
+        texts = [c.get(text_key) or "" for c in candidates]
+        scores = BM25_WEIGHT * _scaled(bm25_scores(query, texts))
+        if score_key:
+            retrieval = np.asarray([float(c.get(score_key) or 0.0) for c in candidates], dtype=np.float32)
+            scores += RETRIEVAL_WEIGHT * _scaled(retrieval)
+
+        used_embeddings = False
+        try:
+            if query_embedding is None and session is not None:
+                query_embedding = LLMClient.embed(session, query)
+            query_vector = EmbeddingCache._unit(query_embedding) if query_embedding is not None else None
+            if query_vector is not None:
+                vectors = EmbeddingCache.get_many(session, texts, [c.get('FILENAME') for c in candidates])
+                if all(v is not None and v.shape == query_vector.shape for v in vectors):
+                    scores += COSINE_WEIGHT * _scaled(np.stack(vectors) @ query_vector)
+                    used_embeddings = True
+        except Exception as e:
+            print(f"Reranking without embeddings: {str(e)}")
+        rerank_span.set(embeddings=used_embeddings)
+
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [dict(candidates[i], RERANK_SCORE=round(float(scores[i]), 4)) for i in order]
@@ -0,0 +1,96 @@
+import json
+import time
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+from lazy_deps import get_root
+from semantic_cache import normalize_question
+from tracing import span
+
+# Search results are reused for this long; ingestion invalidates them sooner
+RETRIEVAL_TTL_SECONDS = 300
+MAX_ENTRIES = 1000
+# Every caller gets these columns, so one cached search serves them all
+SEARCH_COLUMNS = ["CONTENT", "FILENAME", "METADATA"]
+# Search options of every caller, so the search page and the RAG pipeline share entries
+SEARCH_OPTIONS = {'similarity_threshold': 0.5}  # Lower threshold for better recall
+ALL_DOCUMENTS = "*"
+
+
+class RetrievalCache:
+    """
+    Short-lived cache of Cortex Search results shared by the search page,
+    the RAG pipeline and its TruLens evaluation replays. Entries are keyed by
+    normalized query, filename filter and search options; a cached search
+    with a larger limit also answers smaller ones, since results are ranked.
+    Ingesting or deleting a document drops its entries and library-wide ones,
+    and a generation number per document stops searches that were running at
+    that moment from being cached afterwards.
+    """
+    _entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+    _generations: Counter = Counter()
+    _epoch = 0
+    _stats: Counter = Counter()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _key(query: str, filename: Optional[str], options: Dict[str, Any]) -> tuple:
+        return (normalize_question(query), filename or ALL_DOCUMENTS, json.dumps(options, sort_keys=True, default=str))
+
+    @staticmethod
+    def _search_service(session):
+        root = get_root(session)
+        return root.databases["TESTDB"].schemas["MYSCHEMA"].cortex_search_services["MY_RAG_SEARCH_SERVICE"]
+
+    @staticmethod
+    def search(session, query: str, limit: int, filename: Optional[str] = None, **options) -> List[Dict[str, Any]]:
+        """Ranked results as dicts of SEARCH_COLUMNS plus _SCORE when the service returns it"""
+        key = RetrievalCache._key(query, filename, options)
+        document = filename or ALL_DOCUMENTS
+        with RetrievalCache._lock:
+            entry = RetrievalCache._entries.get(key)
+            if entry and entry['limit'] >= limit and time.time() - entry['created'] < RETRIEVAL_TTL_SECONDS:
+                RetrievalCache._entries.move_to_end(key)
+                RetrievalCache._stats['hits'] += 1
+                return [dict(r) for r in entry['results'][:limit]]
+            RetrievalCache._stats['misses'] += 1
+            generation = (RetrievalCache._epoch, RetrievalCache._generations[document])
+
+        filters = "FILENAME = '{}'".format(filename.replace("'", "''")) if filename else None
+        with span("retrieval.search", limit=limit, filtered=bool(filename)) as search_span:
+            resp = RetrievalCache._search_service(session).search(
+                query=query, columns=SEARCH_COLUMNS, limit=limit, filters=filters, **options
+            )
+            results = [dict(r) for r in (resp.results or [])]
+            search_span.set(results=len(results))
+
+        with RetrievalCache._lock:
+            if (RetrievalCache._epoch, RetrievalCache._generations[document]) == generation:
+                RetrievalCache._entries[key] = {'limit': limit, 'results': results, 'created': time.time()}
+                RetrievalCache._entries.move_to_end(key)
+                while len(RetrievalCache._entries) > MAX_ENTRIES:
+                    RetrievalCache._entries.popitem(last=False)
+        return [dict(r) for r in results]
+
+    @staticmethod
+    def invalidate(filename: Optional[str] = None) -> None:
+        """Forget searches over a document, and library-wide ones; None forgets everything"""
+        with RetrievalCache._lock:
+            if filename is None:
+                RetrievalCache._entries.clear()
+                RetrievalCache._epoch += 1
+                return
+            for key in [k for k in RetrievalCache._entries if k[1] in (filename, ALL_DOCUMENTS)]:
+                del RetrievalCache._entries[key]
+            RetrievalCache._generations[filename] += 1
+            RetrievalCache._generations[ALL_DOCUMENTS] += 1
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        with RetrievalCache._lock:
+            stats = {name: RetrievalCache._stats[name] for name in ('hits', 'misses')}
+            stats['entries'] = len(RetrievalCache._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
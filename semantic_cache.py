@@ -0,0 +1,156 @@
+import re
+import time
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from llm_client import LLMClient
+
+# Questions at least this similar (cosine of their embeddings) share an answer
+SIMILARITY_THRESHOLD = 0.92
+MAX_ENTRIES_PER_DOCUMENT = 200
+# Backstop for documents changed outside this process, e.g. by the stage pipeline
+CACHE_TTL_SECONDS = 24 * 3600
+# Key used for library-wide searches; any document change invalidates it
+ALL_DOCUMENTS = "*"
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!]+$")
+
+
+def normalize_question(question: str) -> str:
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", question.strip().lower()))
+
+
+class SemanticCache:
+    """
+    Answers to earlier questions, per document. A question is answered from the
+    cache when an earlier one for the same document and answer settings has the
+    same normalized text or an embedding with cosine similarity of at least
+    SIMILARITY_THRESHOLD. Entries for a document are dropped when it is
+    uploaded or deleted; a generation number per document keeps answers that
+    were still being generated at that moment from being stored afterwards.
+    """
+    # document key -> OrderedDict of normalized question -> entry, least recently used first
+    _entries: Dict[str, "OrderedDict[str, Dict[str, Any]]"] = {}
+    _generations: Counter = Counter()
+    _epoch = 0
+    _stats: Counter = Counter()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _key(filename: Optional[str]) -> str:
+        return filename or ALL_DOCUMENTS
+
+    @staticmethod
+    def _normalized_embedding(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        if not embedding:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    @staticmethod
+    def lookup(
+        session,
+        question: str,
+        filename: Optional[str],
+        variant: Tuple
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Return (cached result or None, token); pass the token to store() once
+        a fresh answer is generated. variant holds the settings that change the
+        answer (style, format, limit, ...); only entries with the same variant match.
+        """
+        key = SemanticCache._key(filename)
+        normalized = normalize_question(question)
+        now = time.time()
+        with SemanticCache._lock:
+            token = {'key': key, 'question': normalized, 'text': question, 'variant': variant,
+                     'generation': (SemanticCache._epoch, SemanticCache._generations[key]), 'embedding': None}
+            entries = SemanticCache._entries.get(key)
+            entry = entries.get(normalized) if entries else None
+            if entry and entry['variant'] == variant and now - entry['created'] < CACHE_TTL_SECONDS:
+                entries.move_to_end(normalized)
+                SemanticCache._stats['exact_hits'] += 1
+                return entry['result'], token
+            if not entries:
+                SemanticCache._stats['misses'] += 1
+                return None, token
+
+        SemanticCache.question_embedding(session, token)
+        with SemanticCache._lock:
+            if token['embedding'] is None:
+                SemanticCache._stats['misses'] += 1
+                return None, token
+            entries = SemanticCache._entries.get(key) or OrderedDict()
+            candidates = [
+                (name, entry) for name, entry in entries.items()
+                if entry['variant'] == variant and entry['embedding'] is not None
+                and now - entry['created'] < CACHE_TTL_SECONDS
+            ]
+            if candidates:
+                similarities = np.stack([entry['embedding'] for _, entry in candidates]) @ token['embedding']
+                best = int(np.argmax(similarities))
+                if similarities[best] >= SIMILARITY_THRESHOLD:
+                    name, entry = candidates[best]
+                    entries.move_to_end(name)
+                    SemanticCache._stats['semantic_hits'] += 1
+                    return entry['result'], token
+            SemanticCache._stats['misses'] += 1
+            return None, token
+
+    @staticmethod
+    def question_embedding(session, token: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Unit-length embedding of the looked-up question, embedded at most once per request"""
+        if token['embedding'] is None and not token.get('embed_failed'):
+            try:
+                token['embedding'] = SemanticCache._normalized_embedding(LLMClient.embed(session, token['text']))
+            except Exception as e:
+                token['embed_failed'] = True
+                print(f"Error embedding question for the answer cache: {str(e)}")
+        return token['embedding']
+
+    @staticmethod
+    def store(session, token: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Cache a fresh answer, unless its document changed while it was being generated"""
+        # Still cached for exact repeats of the question if embedding fails
+        SemanticCache.question_embedding(session, token)
+        with SemanticCache._lock:
+            key = token['key']
+            if (SemanticCache._epoch, SemanticCache._generations[key]) != token['generation']:
+                return
+            entries = SemanticCache._entries.setdefault(key, OrderedDict())
+            entries[token['question']] = {
+                'variant': token['variant'],
+                'embedding': token['embedding'],
+                'result': result,
+                'created': time.time(),
+            }
+            entries.move_to_end(token['question'])
+            while len(entries) > MAX_ENTRIES_PER_DOCUMENT:
+                entries.popitem(last=False)
+            SemanticCache._stats['stores'] += 1
+
+    @staticmethod
+    def invalidate(filename: Optional[str] = None) -> None:
+        """Forget answers about a document, and library-wide ones; None forgets everything"""
+        with SemanticCache._lock:
+            if filename is None:
+                SemanticCache._entries.clear()
+                SemanticCache._epoch += 1
+                return
+            for key in (filename, ALL_DOCUMENTS):
+                SemanticCache._entries.pop(key, None)
+                SemanticCache._generations[key] += 1
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        with SemanticCache._lock:
+            stats = {name: SemanticCache._stats[name] for name in ('exact_hits', 'semantic_hits', 'misses', 'stores')}
+            stats['entries'] = sum(len(entries) for entries in SemanticCache._entries.values())
+        lookups = stats['exact_hits'] + stats['semantic_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['exact_hits'] + stats['semantic_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,333 @@
+import re
+import json
+from typing import Any, List, Optional, Sequence
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_$.]*$")
+# Chunks and queries must be embedded by the same model for their similarities to mean anything
+EMBED_MODEL = 'snowflake-arctic-embed-m-v1.5'
+
+
+class Statement:
+    """
+    Reusable SQL template with qmark (?) bind parameters.
+
+    Values are always sent as binds, never spliced into the text, so every call
+    of a template produces identical SQL: the server can reuse its compiled plan
+    and result cache, and large values such as prompts travel as parameters
+    instead of escaped literals.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = " ".join(text.split())
+
+    def format(self, **identifiers: Any) -> "Statement":
+        """Fill {placeholders} that cannot be bound (table names, LIMIT counts); values are validated"""
+        for key, value in identifiers.items():
+            if isinstance(value, bool) or not (isinstance(value, int) or _IDENTIFIER.match(str(value))):
+                raise ValueError(f"Unsafe value for {key} in statement {self.name}: {value!r}")
+        return Statement(self.name, self.text.format(**identifiers))
+
+    def query(self, session, *params: Any):
+        """Bound Snowpark DataFrame, for collect_nowait() or to_pandas()"""
+        return session.sql(self.text, params=list(params) if params else None)
+
+    def collect(self, session, *params: Any) -> List[Any]:
+        return self.query(session, *params).collect()
+
+    def __repr__(self) -> str:
+        return f"Statement({self.name!r})"
+
+
+def json_param(value: Any) -> str:
+    """Serialize a value for a PARSE_JSON(?) bind"""
+    return json.dumps(value)
+
+
+def complete(
+    session,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.3,
+    max_tokens: int = 500
+) -> List[Any]:
+    """Run COMPLETE with system and user messages bound as parameters; the response column is RESPONSE"""
+    return COMPLETE_CHAT.collect(session, model, system_prompt, user_prompt, float(temperature), int(max_tokens))
+
+
+def first_value(rows: Optional[Sequence[Any]], column: str, default: Any = None) -> Any:
+    return rows[0][column] if rows else default
+
+
+# Cortex
+
+COMPLETE_CHAT = Statement("complete_chat", """
+    SELECT SNOWFLAKE.CORTEX.COMPLETE(
+        ?,
+        ARRAY_CONSTRUCT(
+            OBJECT_CONSTRUCT('role', 'system', 'content', ?),
+            OBJECT_CONSTRUCT('role', 'user', 'content', ?)
+        ),
+        OBJECT_CONSTRUCT('temperature', ?, 'max_tokens', ?)
+    )::string AS RESPONSE
+""")
+
+COMPLETE_CHAT_OPTIONS = Statement("complete_chat_options", """
+    SELECT SNOWFLAKE.CORTEX.COMPLETE(
+        ?,
+        ARRAY_CONSTRUCT(
+            OBJECT_CONSTRUCT('role', 'system', 'content', ?),
+            OBJECT_CONSTRUCT('role', 'user', 'content', ?)
+        ),
+        PARSE_JSON(?)
+    )::string AS RESPONSE
+""")
+
+EMBED_TEXT = Statement("embed_text", """
+    SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_768(?, ?)::ARRAY AS EMBEDDING
+""")
+
+# RAG_DOCUMENTS_TMP
+
+RAG_PAGES_BY_FILENAME = Statement("rag_pages_by_filename", """
+    SELECT CONTENT, METADATA:page_number::INTEGER AS PAGE_NUM
+    FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE FILENAME = ?
+    ORDER BY PAGE_NUM, METADATA:chunk_number
+""")
+
+# BODY_START skips the heading and overlap a chunk repeats from the one before it
+RAG_CHUNKS_BY_FILENAME = Statement("rag_chunks_by_filename", """
+    SELECT CONTENT, METADATA:body_start::INTEGER AS BODY_START
+    FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE FILENAME = ?
+    ORDER BY METADATA:chunk_number
+""")
+
+# Changes whenever a file's chunks are replaced; keys the reader's cached text
+RAG_CHUNKS_FINGERPRINT = Statement("rag_chunks_fingerprint", """
+    SELECT COUNT(*) AS CHUNKS, SUM(LENGTH(CONTENT)) AS CHARS, MAX(CREATED_AT) AS UPDATED_AT
+    FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE FILENAME = ?
+""")
+
+RAG_CHUNK_COUNT = Statement("rag_chunk_count", """
+    SELECT COUNT(*) AS TOTAL_PAGES
+    FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE FILENAME = ?
+""")
+
+RAG_FILE_TYPE = Statement("rag_file_type", """
+    SELECT DISTINCT FILE_TYPE
+    FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE FILENAME = ?
+    LIMIT 1
+""")
+
+RAG_FIRST_CHUNK = Statement("rag_first_chunk", """
+    SELECT BINARY_CONTENT, METADATA, FILE_TYPE
+    FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE FILENAME = ?
+    ORDER BY METADATA:chunk_number
+    LIMIT 1
+""")
+
+RAG_DELETE_BY_FILENAME = Statement("rag_delete_by_filename", """
+    DELETE FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP WHERE FILENAME = ?
+""")
+
+# Bound as a JSON array so any number of files uses the same statement text
+RAG_DELETE_BY_FILENAMES = Statement("rag_delete_by_filenames", """
+    DELETE FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE FILENAME IN (SELECT VALUE::STRING FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))))
+""")
+
+# Keyset pages of chunk embeddings for the local vector store, for one file or all when the filename is NULL
+RAG_EMBEDDINGS_AFTER_ID = Statement("rag_embeddings_after_id", """
+    SELECT DOC_ID, FILENAME, EMBEDDING::ARRAY AS EMBEDDING
+    FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE DOC_ID > ? AND (? IS NULL OR FILENAME = ?)
+    ORDER BY DOC_ID
+    LIMIT ?
+""")
+
+# Stored embeddings of search results, matched on file and a hash of the trimmed chunk text
+RAG_EMBEDDINGS_BY_CONTENT_HASH = Statement("rag_embeddings_by_content_hash", """
+    SELECT SHA2(TRIM(CONTENT, ' \\n\\r\\t'), 256) AS CONTENT_HASH, EMBEDDING::ARRAY AS EMBEDDING
+    FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE FILENAME IN (SELECT VALUE::STRING FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))))
+    AND SHA2(TRIM(CONTENT, ' \\n\\r\\t'), 256) IN (SELECT VALUE::STRING FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))))
+    AND EMBEDDING IS NOT NULL
+""")
+
+RAG_DELETE_DUPLICATES = Statement("rag_delete_duplicates", """
+    DELETE FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+    WHERE DOC_ID IN (
+        SELECT DOC_ID
+        FROM (
+            SELECT DOC_ID,
+                ROW_NUMBER() OVER (PARTITION BY FILENAME ORDER BY CREATED_AT DESC) AS rn
+            FROM TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP
+            WHERE FILENAME = ?
+        )
+        WHERE rn > 1
+    )
+""")
+
+RAG_INSERT_FROM_STAGING = Statement("rag_insert_from_staging", """
+    INSERT INTO TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP (
+        DOC_ID, FILENAME, FILE_TYPE, CONTENT, EMBEDDING, METADATA, CREATED_AT
+    )
+    SELECT
+        t.DOC_ID,
+        t.FILENAME,
+        t.FILE_TYPE,
+        t.CONTENT,
+        CAST(SNOWFLAKE.CORTEX.EMBED_TEXT_768(?, t.CONTENT) AS VECTOR(FLOAT, 768)),
+        PARSE_JSON(t.METADATA),
+        CURRENT_TIMESTAMP()
+    FROM {staging_table} t
+""")
+
+RAG_SIMILAR_BOOKS = Statement("rag_similar_books", """
+    WITH current_book AS (
+        SELECT
+            m.FILENAME,
+            m.CATEGORY,
+            r.EMBEDDING
+        FROM TESTDB.MYSCHEMA.BOOK_METADATA m
+        JOIN TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP r ON m.FILENAME = r.FILENAME
+        WHERE m.FILENAME = ?
+        LIMIT 1
+    ),
+    similarity_scores AS (
+        SELECT DISTINCT
+            FIRST_VALUE(m.FILENAME) OVER (PARTITION BY m.FILENAME ORDER BY r.CREATED_AT DESC) AS FILENAME,
+            FIRST_VALUE(m.CATEGORY) OVER (PARTITION BY m.FILENAME ORDER BY r.CREATED_AT DESC) AS CATEGORY,
+            FIRST_VALUE(m.DATE_ADDED) OVER (PARTITION BY m.FILENAME ORDER BY r.CREATED_AT DESC) AS DATE_ADDED,
+            FIRST_VALUE(m.SIZE) OVER (PARTITION BY m.FILENAME ORDER BY r.CREATED_AT DESC) AS SIZE,
+            CASE
+                WHEN m.CATEGORY = (SELECT CATEGORY FROM current_book) THEN 0.2
+                ELSE 0
+            END AS category_boost,
+            VECTOR_COSINE_SIMILARITY(
+                r.EMBEDDING,
+                (SELECT EMBEDDING FROM current_book)
+            ) AS content_similarity
+        FROM TESTDB.MYSCHEMA.BOOK_METADATA m
+        JOIN TESTDB.MYSCHEMA.RAG_DOCUMENTS_TMP r ON m.FILENAME = r.FILENAME
+        WHERE m.FILENAME != ?
+    )
+    SELECT DISTINCT
+        FILENAME,
+        CATEGORY,
+        DATE_ADDED,
+        SIZE,
+        MAX(content_similarity + category_boost) AS total_score
+    FROM similarity_scores
+    GROUP BY FILENAME, CATEGORY, DATE_ADDED, SIZE
+    ORDER BY total_score DESC
+    LIMIT {limit}
+""")
+
+# RAG_METADATA
+
+RAG_METADATA_CONTENT_HASH = Statement("rag_metadata_content_hash", """
+    SELECT SHA2(TO_VARCHAR(BINARY_CONTENT, 'HEX')) AS CONTENT_HASH
+    FROM TESTDB.MYSCHEMA.RAG_METADATA
+    WHERE FILENAME = ?
+    LIMIT 1
+""")
+
+RAG_METADATA_BINARY = Statement("rag_metadata_binary", """
+    SELECT BINARY_CONTENT
+    FROM TESTDB.MYSCHEMA.RAG_METADATA
+    WHERE FILENAME = ?
+    LIMIT 1
+""")
+
+RAG_METADATA_INSERT = Statement("rag_metadata_insert", """
+    INSERT INTO TESTDB.MYSCHEMA.RAG_METADATA (DOC_ID, FILENAME, FILE_TYPE, BINARY_CONTENT, METADATA)
+    SELECT ?, ?, ?, TO_BINARY(HEX_ENCODE(?)), PARSE_JSON(?)
+""")
+
+RAG_METADATA_DELETE_BY_FILENAME = Statement("rag_metadata_delete_by_filename", """
+    DELETE FROM TESTDB.MYSCHEMA.RAG_METADATA WHERE FILENAME = ?
+""")
+
+# BOOK_METADATA
+
+BOOK_METADATA_ALL = Statement("book_metadata_all", """
+    SELECT BOOK_ID, FILENAME, CATEGORY, DATE_ADDED, SIZE, USAGE_STATS
+    FROM TESTDB.MYSCHEMA.BOOK_METADATA
+""")
+
+BOOK_METADATA_BY_FILENAMES = Statement("book_metadata_by_filenames", """
+    SELECT FILENAME, CATEGORY, DATE_ADDED, SIZE
+    FROM TESTDB.MYSCHEMA.BOOK_METADATA
+    WHERE FILENAME IN (SELECT VALUE::STRING FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))))
+""")
+
+BOOK_METADATA_THUMBNAIL = Statement("book_metadata_thumbnail", """
+    SELECT THUMBNAIL FROM TESTDB.MYSCHEMA.BOOK_METADATA WHERE FILENAME = ?
+""")
+
+BOOK_METADATA_INSERT = Statement("book_metadata_insert", """
+    INSERT INTO TESTDB.MYSCHEMA.BOOK_METADATA (
+        BOOK_ID, FILENAME, CATEGORY, DATE_ADDED, SIZE, USAGE_STATS, THUMBNAIL
+    )
+    SELECT ?, ?, ?, CURRENT_TIMESTAMP(), ?, TO_VARIANT(PARSE_JSON(?)), ?
+""")
+
+BOOK_METADATA_DELETE_BY_FILENAME = Statement("book_metadata_delete_by_filename", """
+    DELETE FROM TESTDB.MYSCHEMA.BOOK_METADATA WHERE FILENAME = ?
+""")
+
+BOOK_METADATA_GROUND_TRUTH = Statement("book_metadata_ground_truth", """
+    SELECT FILENAME
+    FROM TESTDB.MYSCHEMA.BOOK_METADATA
+    WHERE ARRAY_CONTAINS(?::VARIANT, SEARCH_GROUND_TRUTH:relevant_queries)
+""")
+
+BOOK_METADATA_SEARCH_METADATA = Statement("book_metadata_search_metadata", """
+    SELECT SEARCH_METADATA FROM TESTDB.MYSCHEMA.BOOK_METADATA WHERE FILENAME = ?
+""")
+
+BOOK_METADATA_UPDATE_SEARCH_METADATA = Statement("book_metadata_update_search_metadata", """
+    UPDATE TESTDB.MYSCHEMA.BOOK_METADATA
+    SET SEARCH_METADATA = PARSE_JSON(?)
+    WHERE FILENAME = ?
+""")
+
+# Metrics
+
+ANALYTICS_METRICS_INSERT = Statement("analytics_metrics_insert", """
+    INSERT INTO TESTDB.MYSCHEMA.ANALYTICS_METRICS (
+        METRIC_ID, TIMESTAMP, DOCUMENT_NAME, ACTION_TYPE, USER_QUERY,
+        STATUS, TOKEN_COUNT, MEMORY_USAGE_MB, RESPONSE_TIME_MS
+    ) VALUES (?, CURRENT_TIMESTAMP(), ?, ?, ?, ?, ?, ?, ?)
+""")
+
+ANALYTICS_DOCUMENT_COUNT = Statement("analytics_document_count", """
+    SELECT COUNT(DISTINCT DOCUMENT_NAME) AS DOCUMENTS FROM TESTDB.MYSCHEMA.ANALYTICS_METRICS
+""")
+
+TRULENS_METRICS_INSERT = Statement("trulens_metrics_insert", """
+    INSERT INTO TESTDB.MYSCHEMA.TRULENS_METRICS (
+        METRIC_ID, TIMESTAMP, OPERATION_TYPE, STYLE, FORMAT_TYPE, OUTPUT_TOKEN_COUNT,
+        CONTEXT_RELEVANCE, GROUNDEDNESS_SCORE, COHERENCE_SCORE, SOURCE_DIVERSITY_SCORE,
+        FLUENCY_SCORE, TOKEN_EFFICIENCY
+    ) VALUES (?, CURRENT_TIMESTAMP(), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+""")
+
+TRULENS_FEEDBACK_INSERT = Statement("trulens_feedback_insert", """
+    INSERT INTO TESTDB.MYSCHEMA.TRULENS_METRICS (
+        METRIC_ID, TIMESTAMP, RELEVANCE_SCORE, GROUNDEDNESS_SCORE, COHERENCE_SCORE,
+        STYLE, FORMAT_TYPE, OUTPUT_TOKEN_COUNT, OPERATION_TYPE
+    ) VALUES (?, CURRENT_TIMESTAMP(), ?, ?, ?, ?, ?, ?, ?)
+""")
+
+TRULENS_METRICS_EXISTS = Statement("trulens_metrics_exists", """
+    SELECT COUNT(*) AS COUNT FROM TESTDB.MYSCHEMA.TRULENS_METRICS WHERE METRIC_ID = ?
+""")
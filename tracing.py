@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import atexit
+import threading
+import itertools
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Spans kept in the in-memory ring buffer
+RING_BUFFER_CAPACITY = 4096
+# Optional file exporters, enabled by setting these environment variables to a path
+TRACE_JSONL_ENV = "SMART_LIBRARY_TRACE_JSONL"
+TRACE_CHROME_ENV = "SMART_LIBRARY_TRACE_CHROME"
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+
+
+class Span:
+    """One timed stage of a request; nested spans share the trace id of their root"""
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "thread_id", "start_ns", "end_ns")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.thread_id = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "thread_id": self.thread_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class RingBufferExporter:
+    """Keeps the most recent finished spans in memory for the admin view and benchmarks"""
+
+    def __init__(self, capacity: int = RING_BUFFER_CAPACITY):
+        self._spans: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def traces(self, limit: int = 20) -> List[List[Span]]:
+        """Most recent traces first, each as its spans in start order"""
+        grouped: Dict[int, List[Span]] = {}
+        for span in self.spans():
+            grouped.setdefault(span.trace_id, []).append(span)
+        recent = sorted(grouped.values(), key=lambda spans: max(s.start_ns for s in spans), reverse=True)
+        return [sorted(spans, key=lambda s: s.start_ns) for spans in recent[:limit]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class JsonLinesExporter:
+    """Appends one JSON object per finished span"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class ChromeTraceExporter:
+    """
+    Writes spans as Chrome trace "complete" events, viewable in chrome://tracing
+    or Perfetto. The JSON array is left open while running, which both accept.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "w", buffering=1)
+        self._file.write("[\n")
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def export(self, span: Span) -> None:
+        event = {
+            "name": span.name,
+            "cat": span.name.split(".")[0],
+            "ph": "X",
+            "ts": span.start_ns / 1000,
+            "dur": (span.end_ns - span.start_ns) / 1000,
+            "pid": self._pid,
+            "tid": span.thread_id,
+            "args": {"trace_id": span.trace_id, **span.attributes},
+        }
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + ",\n")
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.write("{}]\n")
+                self._file.close()
+
+
+RING_BUFFER = RingBufferExporter()
+_exporters: List[Any] = [RING_BUFFER]
+_exporters_lock = threading.Lock()
+
+
+def add_exporter(exporter: Any) -> None:
+    """Register an object with an export(span) method"""
+    with _exporters_lock:
+        _exporters.append(exporter)
+
+
+def _configure_from_env() -> None:
+    if os.environ.get(TRACE_JSONL_ENV):
+        add_exporter(JsonLinesExporter(os.environ[TRACE_JSONL_ENV]))
+    if os.environ.get(TRACE_CHROME_ENV):
+        add_exporter(ChromeTraceExporter(os.environ[TRACE_CHROME_ENV]))
+
+
+_configure_from_env()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Time a block as a child of the current span; exceptions are recorded and re-raised"""
+    new_span = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        new_span.end_ns = time.perf_counter_ns()
+        _current_span.reset(token)
+        export_span(new_span)
+
+
+def export_span(finished: Span) -> None:
+    """Hand a finished span to every exporter; for spans that outlive the block that started them"""
+    if finished.end_ns is None:
+        finished.end_ns = time.perf_counter_ns()
+    with _exporters_lock:
+        exporters = list(_exporters)
+    for exporter in exporters:
+        try:
+            exporter.export(finished)
+        except Exception as e:
+            print(f"Error exporting span {finished.name}: {str(e)}")
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator form of span(), named after the function unless given a name"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedQuery:
+    """Wraps a Snowpark DataFrame so collect() runs inside an sql.execute span"""
+
+    def __init__(self, query: Any, statement: str):
+        self._query = query
+        self._statement = statement
+
+    def collect(self, *args, **kwargs):
+        with span("sql.execute", statement=" ".join(self._statement.split())[:200]) as s:
+            rows = self._query.collect(*args, **kwargs)
+            s.set(rows=len(rows) if rows is not None else 0)
+            return rows
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._query, name)
+
+
+class TracedSession:
+    """Session proxy that traces sql(...).collect(); everything else is delegated"""
+
+    def __init__(self, session: Any):
+        self._session = session
+
+    def sql(self, query: str, *args, **kwargs) -> TracedQuery:
+        return TracedQuery(self._session.sql(query, *args, **kwargs), query)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session, name)
@@ -1,56 +1,30 @@
 import streamlit as st
 from typing import Dict, List, Any, Optional
-import requests
 import re
 import uuid
-from collections import Counter
-import pandas as pd
-import plotly.graph_objects as go 
 import json
-import numpy as np
 from back import SnowparkManager
 import traceback
-from trulens.apps.custom import instrument
-from trulens.core import TruSession
-from trulens.connectors.snowflake import SnowflakeConnector
-from snowflake.snowpark.context import get_active_session
-from trulens.providers.cortex import Cortex
-from trulens.core import Feedback, Select
-from trulens.core.guardrails.base import context_filter
-from back import SnowparkManager
 from datetime import datetime
-import uuid
-from typing import Dict, Any
-from trulens_eval import Select
-from trulens.feedback import GroundTruthAgreement
-from trulens.apps.basic import TruBasicApp
-from trulens.apps.custom import TruCustomApp
-from snowflake.core import Root
-from typing import List
-from snowflake.snowpark import Session
-from trulens_eval import TruChain, Feedback, Tru, feedback, Select
-import io
-import logging
-import threading
-import subprocess
-import re
-from io import StringIO
-import contextlib
 import sys
 from io import StringIO
-from functools import wraps
-
-
-
-
-tru = Tru()
+from snowflake.snowpark import Session
+from lazy_deps import instrument, apply_instrumentation, get_tru
+from tracing import current_span, traced
+import statements
+from llm_client import LLMClient
+import context_budget
+import retrieval_cache
+from retrieval_cache import RetrievalCache
+import reranking
+from statements import json_param
 
 
 
 class CortexSearchRetriever:
    
  
-    def __init__(self, session: Session, limit_to_retrieve: int = 4):
+    def __init__(self, session: Session, limit_to_retrieve: int = 4, filename: Optional[str] = None):
         try:
             session = SnowparkManager.get_session()
             if not session:
@@ -60,6 +34,7 @@ class CortexSearchRetriever:
         
             self._session = session
             self._limit_to_retrieve = limit_to_retrieve
+            self._filename = filename
           
         
         except Exception as e:
@@ -70,35 +45,32 @@ class CortexSearchRetriever:
 
     def retrieve(self, query: str) -> List[str]:
         #print(f"Searching for query: {query} in file: {filename}")
-        root = Root(self._session)
-        cortex_search_service = (
-            root.databases["TESTDB"]
-            .schemas["MYSCHEMA"]
-            .cortex_search_services["MY_RAG_SEARCH_SERVICE"]
-        )
         print("Calling cortex_search_service.search")
-        resp = cortex_search_service.search(
-            query=query,
-            columns=["CONTENT"],
-            limit=self._limit_to_retrieve,
+        # Evaluation replays of a query reuse the search already made for it, so the
+        # document filter and search options match the search page's
+        candidates = RetrievalCache.search(
+            self._session, query, reranking.candidate_count(self._limit_to_retrieve), self._filename,
+            **retrieval_cache.SEARCH_OPTIONS
         )
+        results = reranking.rerank(query, candidates, self._limit_to_retrieve, self._session, score_key='_SCORE')
         print(f"Search query: {query}")
-        print(f"Search response: {resp}")
+        print(f"Search response: {len(results)} results")
 
-        if resp.results:
-            print(f"Found {len(resp.results)} results")
-            return [curr["CONTENT"] for curr in resp.results]
+        if results:
+            print(f"Found {len(results)} results")
+            return [curr["CONTENT"] for curr in results]
         else:
             print("No results found")
             return []
         
 class RAGPipeline:
-    def __init__(self):
+    def __init__(self, filename: Optional[str] = None):
         session = SnowparkManager.get_session()
         self.session =session
         self.retriever = CortexSearchRetriever(
             session, 
-            limit_to_retrieve=3
+            limit_to_retrieve=3,
+            filename=filename
         )
         
     
@@ -117,34 +89,20 @@ class RAGPipeline:
     def generate_completion(self, query: str, contexts: list) -> str:
         """Generate answer from context."""
         try:
-            # Format contexts into a string
-            context_str = "\n\n".join([f"Context {i+1}:\n{ctx}" for i, ctx in enumerate(contexts)])
+            # Contexts arrive best first; keep as many as fit the budget, without near-duplicates
+            budget = context_budget.evidence_budget('mistral-large2', 100, context_budget.count_tokens(query))
+            packed, _ = context_budget.pack_context([{'CONTENT': ctx} for ctx in contexts], budget)
+            context_str = "\n\n".join([f"Context {i+1}:\n{ctx['CONTENT']}" for i, ctx in enumerate(packed)])
             
-            prompt = f"""You are an expert assistant extracting information from context provided.
+            # The context goes in the user message only, so it is not sent twice
+            prompt = """You are an expert assistant extracting information from context provided.
             Answer the question based on the context. Be concise and do not hallucinate.
-            If you don't have the information just say so.
-
-            Context:
-            {context_str}
-
-            Question: {query}
-            Answer:"""
-            
-            llm_query = f"""
-            SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                'mistral-large2',
-                ARRAY_CONSTRUCT(
-                    OBJECT_CONSTRUCT('role', 'system', 'content', '{prompt.replace("'", "''")}'),
-                    OBJECT_CONSTRUCT('role', 'user', 'content', 'Question: {query}\\n\\nContext:\\n{context_str.replace("'", "''")}')
-                ),
-                OBJECT_CONSTRUCT(
-                    'temperature', 0.3,
-                    'max_tokens', 100
-                )
-            ) as response
-            """
-            llm_response = self.session.sql(llm_query).collect()
-            synthesized_answer = SnowparkManager.process_llm_response(llm_response)
+            If you don't have the information just say so."""
+            
+            synthesized_answer = LLMClient.complete(
+                self.session, 'mistral-large2', prompt,
+                f"Question: {query}\n\nContext:\n{context_str}", 0.3, 100
+            ) or "Failed to generate response"
             
             return synthesized_answer
         
@@ -205,27 +163,18 @@ class TruLensEvaluator:
 
             print("Initializing Cortex provider...")
             try:
-              # Create SnowflakeConnector with correct parameters
-                import snowflake.connector
+                # TruLens is only loaded once an evaluator is actually needed
+                import numpy as np
+                from trulens.providers.cortex import Cortex
+                from trulens.core import Feedback, Select
+                from trulens.apps.custom import TruCustomApp
+                apply_instrumentation()
+                self.TruCustomApp = TruCustomApp
                     
-                connection_parameters = {
-                    "account": st.secrets["snowflake_account"],
-                    "user": st.secrets["snowflake_user"],
-                    "password": st.secrets["snowflake_password"],
-                    "role": st.secrets["snowflake_role"], 
-                    "database": st.secrets["snowflake_database"],
-                    "schema": st.secrets["snowflake_schema"],
-                    "warehouse": st.secrets["snowflake_warehouse"]
-                }
-                
-                # Create a Snowflake connection using the connection parameters
-                snowflake_conn = snowflake.connector.connect(
-                    **connection_parameters
-                )
-                
-                # Initialize Cortex with the Snowflake connection and model engine
+                # Reuse the connection behind the instrumented session instead of logging in again,
+                # so the provider shares its session setup and checkout span
                 self.provider = Cortex(
-                    snowflake_conn=snowflake_conn,
+                    snowflake_conn=session.connection,
                     model_engine="mistral-large2"
                 )
 
@@ -285,7 +234,7 @@ class TruLensEvaluator:
                 
                 self.rag = RAGPipeline()
                 
-                self.tru_rag = TruCustomApp(
+                self.tru_rag = self.TruCustomApp(
                 app=self.rag,
                 app_name="RAG Pipeline",
                 app_version="base1",
@@ -313,17 +262,16 @@ class TruLensEvaluator:
         
         
     def debug_metrics(self, eval_results: Dict[str, float]) -> None:
-        """Debug helper to print metric values"""
-        print("\n=== TruLens Metrics Debug ===")
-        for metric, value in eval_results.items():
-            print(f"{metric}: {value}")
-        print("============================\n")    
+        """Record metric values on the current trace span"""
+        metrics_span = current_span()
+        if metrics_span is not None:
+            metrics_span.set(**{f"metric.{metric}": value for metric, value in eval_results.items()})
             
+    @traced("trulens.save_metrics")
     def save_metrics_to_db(self, metrics: Dict[str, Any], operation_type: str) -> bool:
         """Save TruLens metrics to database with improved error handling"""
-        print("\n=== Starting save_metrics_to_db ===")
-        print(f"Operation Type: {operation_type}")
-        print(f"Input Metrics: {metrics}")
+        save_span = current_span()
+        save_span.set(operation_type=operation_type, metrics=sorted(metrics))
         
         session = None
         try:
@@ -334,54 +282,24 @@ class TruLensEvaluator:
 
             # Generate metric ID
             metric_id = str(uuid.uuid4())
-            print(f"Debug: Generated metric ID: {metric_id}")
-
-            # Format metric values with proper NULL handling
-            formatted_metrics = {
-                key: ('NULL' if value is None else 
-                    f"'{value}'" if isinstance(value, str) else 
-                    float(value)) 
-                for key, value in metrics.items()
-            }
-
-            # Construct query mapping feedback scores to TRULENS_METRICS columns
-            insert_query = f"""
-            INSERT INTO TESTDB.MYSCHEMA.TRULENS_METRICS (
-                METRIC_ID,
-                TIMESTAMP,
-                RELEVANCE_SCORE,
-                GROUNDEDNESS_SCORE,
-                COHERENCE_SCORE,
-                STYLE,
-                FORMAT_TYPE,
-                OUTPUT_TOKEN_COUNT,
-                OPERATION_TYPE
-            ) VALUES (
-                '{metric_id}',
-                CURRENT_TIMESTAMP(),
-                {formatted_metrics.get('relevance_score', 'NULL')},
-                {formatted_metrics.get('groundedness_score', 'NULL')},
-                {formatted_metrics.get('coherence_score', 'NULL')},
-                {formatted_metrics.get('style', "'default'")},
-                {formatted_metrics.get('format_type', "'default'")},
-                {formatted_metrics.get('output_token_count', 0)},
-                '{operation_type}'
+            save_span.set(metric_id=metric_id)
+
+            statements.TRULENS_FEEDBACK_INSERT.collect(
+                session,
+                metric_id,
+                metrics.get('relevance_score'),
+                metrics.get('groundedness_score'),
+                metrics.get('coherence_score'),
+                metrics.get('style', 'default'),
+                metrics.get('format_type', 'default'),
+                metrics.get('output_token_count', 0),
+                operation_type
             )
-            """
-            
-            print(f"Debug: Executing query:\n{insert_query}")
-            session.sql(insert_query).collect()
-            print(f"Debug: Successfully saved metrics with ID: {metric_id}")
             
             # Verify insertion
-            verify_query = f"""
-            SELECT COUNT(*) as count 
-            FROM TESTDB.MYSCHEMA.TRULENS_METRICS 
-            WHERE METRIC_ID = '{metric_id}'
-            """
-            verify_result = session.sql(verify_query).collect()
+            verify_result = statements.TRULENS_METRICS_EXISTS.collect(session, metric_id)
             inserted = verify_result[0]['COUNT'] > 0
-            print(f"Debug: Verification result - Record {'found' if inserted else 'not found'}")
+            save_span.set(inserted=inserted)
             
             return inserted
 
@@ -393,7 +311,6 @@ class TruLensEvaluator:
         finally:
             if session:
                 session.close()
-                print("Debug: Database session closed")
             
 
     def evaluate_relevance(self, query: str, response: str) -> float:
@@ -438,7 +355,7 @@ class TruLensEvaluator:
         stdout_backup = sys.stdout
         try:
             print("Starting evaluate_pal_chat")
-            self.rag = RAGPipeline()
+            self.rag = RAGPipeline(filename)
             print("✓ PAL Chat created")
 
             print("2. Setting up TruCustomApp...")
@@ -446,10 +363,10 @@ class TruLensEvaluator:
             print(f"Feedback type: {type(self.all_feedbacks[0]).__name__}")
             
           
-            self.rag = RAGPipeline()  
+            self.rag = RAGPipeline(filename)  
             print ("before self.tru_rag")
             # Initialize your TruCustomApp with the configuration
-            self.tru_rag = TruCustomApp(
+            self.tru_rag = self.TruCustomApp(
                 app=self.rag,
                 app_name="RAG Pipeline",
                 app_version="base2",
@@ -470,7 +387,7 @@ class TruLensEvaluator:
             print("Capturing dashboard output")
             sys.stdout = StringIO()
             
-            tru.run_dashboard()
+            get_tru().run_dashboard()
             output = sys.stdout.getvalue()
             print(f"Captured output: {output}")
             
@@ -500,7 +417,7 @@ class TruLensEvaluator:
         stdout_backup = sys.stdout
         try:
             print("Starting evaluate_rag_pipeline")
-            self.rag = RAGPipeline()
+            self.rag = RAGPipeline(filename)
             
             print("✓ RAG pipeline created")
 
@@ -512,7 +429,7 @@ class TruLensEvaluator:
             print ("before self.tru_rag")
             # Initialize your TruCustomApp with the configuration
             print("3. Starting evaluation with recording...")
-            self.tru_rag = TruCustomApp(
+            self.tru_rag = self.TruCustomApp(
                 app=self.rag,
                 app_name="RAG Pipeline",
                 app_version="base1",
@@ -532,7 +449,7 @@ class TruLensEvaluator:
             print("Capturing dashboard output")
             sys.stdout = StringIO()
             
-            tru.run_dashboard()
+            get_tru().run_dashboard()
             output = sys.stdout.getvalue()
             print(f"Captured output: {output}")
             
@@ -565,7 +482,8 @@ class TruLensEvaluator:
                 try:
                     # Run the app and collect metrics
                     metrics = self.tru_rag.app(record)
-                    print(f"Debug: Collected metrics: {metrics}")
+                    if isinstance(metrics, dict):
+                        self.debug_metrics(metrics)
                     return metrics
                     
                 except Exception as e:
@@ -605,12 +523,9 @@ class TruLensEvaluator:
         """Evaluate search results using precision and recall metrics"""
         try:
             # Get documents marked as relevant for this query from metadata
-            relevant_query = f"""
-            SELECT FILENAME
-            FROM TESTDB.MYSCHEMA.BOOK_METADATA
-            WHERE SEARCH_GROUND_TRUTH:relevant_queries ? '{query.replace("'", "''")}'
-            """
-            relevant_docs = set(row['FILENAME'] for row in self.session.sql(relevant_query).collect())
+            relevant_docs = set(
+                row['FILENAME'] for row in statements.BOOK_METADATA_GROUND_TRUTH.collect(self.session, query)
+            )
             
             # If no ground truth exists, use relevance scores as proxy
             if not relevant_docs:
@@ -648,13 +563,7 @@ class TruLensEvaluator:
             
             for result in results:
                 # Get existing metadata
-                metadata_query = f"""
-                SELECT SEARCH_METADATA
-                FROM TESTDB.MYSCHEMA.BOOK_METADATA
-                WHERE FILENAME = '{result['filename'].replace("'", "''")}'
-                """
-                
-                existing = self.session.sql(metadata_query).collect()
+                existing = statements.BOOK_METADATA_SEARCH_METADATA.collect(self.session, result['filename'])
                 
                 if existing:
                     # Parse existing metadata or create new
@@ -693,12 +602,9 @@ class TruLensEvaluator:
                         }
                     
                     # Update metadata in database
-                    update_query = f"""
-                    UPDATE TESTDB.MYSCHEMA.BOOK_METADATA
-                    SET SEARCH_METADATA = PARSE_JSON('{json.dumps(current_metadata).replace("'", "''")}')
-                    WHERE FILENAME = '{result['filename'].replace("'", "''")}'
-                    """
-                    self.session.sql(update_query).collect()
+                    statements.BOOK_METADATA_UPDATE_SEARCH_METADATA.collect(
+                        self.session, json_param(current_metadata), result['filename']
+                    )
                     
         except Exception as e:
             print(f"Error updating search metrics: {str(e)}")
@@ -0,0 +1,177 @@
+import io
+import re
+import wave
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+# Target characters per synthesized segment; segments end on sentence boundaries
+SEGMENT_CHARS = 600
+# Concurrent synthesis requests per document
+TTS_WORKERS = 4
+# Segments submitted ahead of the one being read, so a long chapter does not queue all of its requests
+PREFETCH_SEGMENTS = 2 * TTS_WORKERS
+# Bytes of synthesized audio kept in memory across all documents
+SEGMENT_CACHE_BYTES = 128 * 1024 * 1024
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+')
+
+
+def split_sentences(text: str, max_chars: int = SEGMENT_CHARS) -> List[str]:
+    """Split text into segments of whole sentences of roughly max_chars each"""
+    segments = []
+    current = ""
+    for sentence in _SENTENCE_END.split(' '.join(text.split())):
+        if not sentence:
+            continue
+        # Very long sentences are broken on whitespace so no segment gets too large
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                segments.append(current)
+                current = ""
+            segments.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            segments.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        segments.append(current)
+    return segments
+
+
+class TTSEngine:
+    """Base class for speech synthesizers used by the TTS pipeline"""
+    name = "base"
+    mime_type = "audio/mp3"
+
+    def synthesize(self, text: str, accent: str) -> bytes:
+        raise NotImplementedError
+
+    def join(self, segments: List[bytes]) -> bytes:
+        """Combine segment audio into one playable file; MP3 frames can simply be concatenated"""
+        return b"".join(segments)
+
+
+class GTTSEngine(TTSEngine):
+    """Google Translate TTS, streamed into memory instead of a temp file"""
+    name = "gtts"
+    mime_type = "audio/mp3"
+
+    def synthesize(self, text: str, accent: str) -> bytes:
+        from gtts import gTTS
+        buffer = io.BytesIO()
+        gTTS(text=text, lang='en', slow=False, tld=accent).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class SilentWavEngine(TTSEngine):
+    """Offline engine producing silent WAV audio sized to the text, for tests and local runs"""
+    name = "silent-wav"
+    mime_type = "audio/wav"
+    SAMPLE_RATE = 8000
+    CHARS_PER_SECOND = 15
+
+    def synthesize(self, text: str, accent: str) -> bytes:
+        frames = int(self.SAMPLE_RATE * max(1, len(text)) / self.CHARS_PER_SECOND)
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(1)
+            wav.setframerate(self.SAMPLE_RATE)
+            wav.writeframes(b'\x80' * frames)
+        return buffer.getvalue()
+
+    def join(self, segments: List[bytes]) -> bytes:
+        """One WAV file holding the frames of every segment"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as out:
+            for index, segment in enumerate(segments):
+                with wave.open(io.BytesIO(segment), 'rb') as part:
+                    if index == 0:
+                        out.setparams(part.getparams())
+                    out.writeframes(part.readframes(part.getnframes()))
+        return buffer.getvalue()
+
+
+class SegmentCache:
+    """Process-wide LRU of synthesized segments keyed by (engine, text hash, accent)"""
+    _entries: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+    _total_bytes = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def key(engine: TTSEngine, text: str, accent: str) -> Tuple[str, str, str]:
+        return (engine.name, hashlib.sha256(text.encode('utf-8')).hexdigest(), accent)
+
+    @staticmethod
+    def get(key: Tuple[str, str, str]) -> Optional[bytes]:
+        with SegmentCache._lock:
+            audio = SegmentCache._entries.get(key)
+            if audio is not None:
+                SegmentCache._entries.move_to_end(key)
+            return audio
+
+    @staticmethod
+    def put(key: Tuple[str, str, str], audio: bytes) -> None:
+        with SegmentCache._lock:
+            if key in SegmentCache._entries:
+                return
+            SegmentCache._entries[key] = audio
+            SegmentCache._total_bytes += len(audio)
+            while SegmentCache._total_bytes > SEGMENT_CACHE_BYTES and len(SegmentCache._entries) > 1:
+                _, old_audio = SegmentCache._entries.popitem(last=False)
+                SegmentCache._total_bytes -= len(old_audio)
+
+
+class TTSPipeline:
+    """Splits text into sentence segments and synthesizes them concurrently, in order"""
+    _executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+    def __init__(self, engine: Optional[TTSEngine] = None):
+        self.engine = engine or GTTSEngine()
+
+    @property
+    def mime_type(self) -> str:
+        return self.engine.mime_type
+
+    def _synthesize_segment(self, segment: str, accent: str) -> bytes:
+        key = SegmentCache.key(self.engine, segment, accent)
+        audio = SegmentCache.get(key)
+        if audio is None:
+            audio = self.engine.synthesize(segment, accent)
+            SegmentCache.put(key, audio)
+        return audio
+
+    def stream(self, text: str, accent: str = "com",
+               prefetch: int = PREFETCH_SEGMENTS) -> Iterator[Tuple[int, int, bytes]]:
+        """
+        Yield (index, total, audio) for each segment in reading order.
+        At most prefetch segments are in flight ahead of the reader; the rest
+        are submitted as earlier ones are consumed, and closing the generator
+        cancels whatever has not started.
+        """
+        segments = split_sentences(text)
+        futures = {}
+        try:
+            for index in range(len(segments)):
+                for ahead in range(index, min(len(segments), index + max(1, prefetch))):
+                    if ahead not in futures:
+                        futures[ahead] = TTSPipeline._executor.submit(self._synthesize_segment, segments[ahead], accent)
+                yield index, len(segments), futures.pop(index).result()
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+    def join(self, segments: List[bytes]) -> bytes:
+        """Combine segments from stream() or synthesize() into a single audio file"""
+        return self.engine.join(segments)
+
+    def synthesize(self, text: str, accent: str = "com") -> List[bytes]:
+        """Synthesize the whole text and return the audio segments in order"""
+        return [audio for _, _, audio in self.stream(text, accent)]
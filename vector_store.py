@@ -0,0 +1,351 @@
+import os
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+import statements
+
+DEFAULT_DIMS = 768
+DTYPES = ('int8', 'float16', 'float32')
+# Candidates rescored with the exact float32 vectors, per result asked for
+RESCORE_FACTOR = 4
+# Rows scored per step, so a search never materializes the whole matrix as float32
+SCAN_BLOCK_ROWS = 65536
+SYNC_PAGE_ROWS = 5000
+VECTOR_DIR_ENV = "SMART_LIBRARY_VECTOR_DIR"
+VECTOR_DTYPE_ENV = "SMART_LIBRARY_VECTOR_DTYPE"
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8: each row is scaled so its largest magnitude maps to 127"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _unit_rows(vectors: Any, dims: int) -> np.ndarray:
+    array = np.asarray(vectors, dtype=np.float32).reshape(-1, dims)
+    norms = np.linalg.norm(array, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return array / norms
+
+
+class VectorStore:
+    """
+    Packed, memory-mapped store of unit-length embeddings for local retrieval.
+
+    A store is a directory holding:
+      meta.json        dims, code type and the number of compactions so far
+      codes.bin        rows of int8, float16 or float32 codes, read through a memmap
+      scales.bin       float32 scale per row (int8 only)
+      full.bin         the float32 vectors, read only to rescore top candidates
+      ids.jsonl        append-only log of [row, id, label] and ["del", id] records
+
+    Searches score the compact codes block by block, then rescore the best
+    RESCORE_FACTOR * k rows exactly. Adding an existing id appends a new row and
+    removal only drops it from the id map; compact() rewrites the files
+    without dead rows and renumbers them, bumping generation so row-based
+    indexes such as ann_index.IVFIndex know to rebuild.
+    """
+
+    def __init__(self, path: str, dims: int = DEFAULT_DIMS, dtype: str = 'int8'):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {DTYPES}")
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.dims, self.dtype = meta['dims'], meta['dtype']
+            self.generation = meta.get('generation', 0)
+        else:
+            self.dims, self.dtype, self.generation = dims, dtype, 0
+            self._write_meta()
+        self._rows = 0
+        self._row_of: Dict[str, int] = {}
+        self._id_at: Dict[int, str] = {}
+        self._labels: Dict[str, Any] = {}
+        self._by_label: Dict[Any, Set[str]] = defaultdict(set)
+        self._maps: Optional[Dict[str, np.ndarray]] = None
+        code_bytes = np.dtype(self.dtype).itemsize * self.dims
+        self._rows = os.path.getsize(self._file("codes.bin")) // code_bytes if os.path.exists(self._file("codes.bin")) else 0
+        self._live = np.zeros(self._rows, dtype=bool)
+        self._load_ids()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _write_meta(self) -> None:
+        with open(self._file("meta.json"), "w") as f:
+            json.dump({'dims': self.dims, 'dtype': self.dtype, 'generation': self.generation}, f)
+
+    def _load_ids(self) -> None:
+        if os.path.exists(self._file("ids.jsonl")):
+            with open(self._file("ids.jsonl")) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record[0] == "del":
+                        self._forget(record[1])
+                    else:
+                        self._remember(*record)
+
+    def _remember(self, row: int, doc_id: str, label: Any) -> None:
+        self._forget(doc_id)
+        self._row_of[doc_id], self._id_at[row] = row, doc_id
+        self._live[row] = True
+        self._labels[doc_id] = label
+        self._by_label[label].add(doc_id)
+
+    def _forget(self, doc_id: str) -> None:
+        row = self._row_of.pop(doc_id, None)
+        if row is None:
+            return
+        self._id_at.pop(row, None)
+        self._live[row] = False
+        label = self._labels.pop(doc_id, None)
+        self._by_label[label].discard(doc_id)
+        if not self._by_label[label]:
+            del self._by_label[label]
+
+    def _mapped(self) -> Dict[str, np.ndarray]:
+        """Memmaps over the row files, reopened after writes"""
+        if self._maps is None:
+            self._maps = {}
+            if self._rows:
+                self._maps['codes'] = np.memmap(self._file("codes.bin"), dtype=self.dtype, mode="r", shape=(self._rows, self.dims))
+                self._maps['full'] = np.memmap(self._file("full.bin"), dtype=np.float32, mode="r", shape=(self._rows, self.dims))
+                if self.dtype == 'int8':
+                    self._maps['scales'] = np.memmap(self._file("scales.bin"), dtype=np.float32, mode="r", shape=(self._rows,))
+        return self._maps
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._row_of
+
+    def add(self, ids: Sequence[str], vectors: Any, labels: Optional[Sequence[Any]] = None) -> List[int]:
+        """Append vectors (normalized to unit length) and return their rows; re-added ids move to the new row"""
+        full = _unit_rows(vectors, self.dims)
+        if len(ids) != len(full):
+            raise ValueError("ids and vectors differ in length")
+        with self._lock:
+            if self.dtype == 'int8':
+                codes, scales = quantize_int8(full)
+                with open(self._file("scales.bin"), "ab") as f:
+                    f.write(scales.tobytes())
+            else:
+                codes = full.astype(self.dtype)
+            with open(self._file("codes.bin"), "ab") as f:
+                f.write(codes.tobytes())
+            with open(self._file("full.bin"), "ab") as f:
+                f.write(full.tobytes())
+
+            rows = list(range(self._rows, self._rows + len(ids)))
+            self._live = np.concatenate([self._live, np.zeros(len(ids), dtype=bool)])
+            with open(self._file("ids.jsonl"), "a") as f:
+                for i, (row, doc_id) in enumerate(zip(rows, ids)):
+                    label = labels[i] if labels is not None else None
+                    self._remember(row, doc_id, label)
+                    f.write(json.dumps([row, doc_id, label]) + "\n")
+            self._rows += len(ids)
+            self._maps = None
+            return rows
+
+    def remove(self, ids: Iterable[str]) -> int:
+        """Drop ids from the store; their rows stay on disk until compact()"""
+        removed = 0
+        with self._lock:
+            with open(self._file("ids.jsonl"), "a") as f:
+                for doc_id in ids:
+                    if doc_id in self._row_of:
+                        self._forget(doc_id)
+                        f.write(json.dumps(["del", doc_id]) + "\n")
+                        removed += 1
+        return removed
+
+    def clear(self) -> None:
+        """Remove every id"""
+        self.remove(list(self._row_of))
+
+    def remove_label(self, label: Any) -> int:
+        """Drop every id carrying this label, e.g. all chunks of one file"""
+        return self.remove(self.ids_with_label(label))
+
+    def ids_with_label(self, label: Any) -> List[str]:
+        return list(self._by_label.get(label, ()))
+
+    def is_live(self, rows: Any) -> np.ndarray:
+        return self._live[np.asarray(rows, dtype=np.int64)]
+
+    @property
+    def rows(self) -> int:
+        """Rows on disk, live or dead; new rows are always appended at the end"""
+        return self._rows
+
+    def label(self, doc_id: str) -> Any:
+        return self._labels.get(doc_id)
+
+    def row(self, doc_id: str) -> Optional[int]:
+        return self._row_of.get(doc_id)
+
+    def id_at(self, row: int) -> Optional[str]:
+        """Live id stored at a row; None for rows replaced or removed"""
+        return self._id_at.get(row)
+
+    def vectors(self, rows: Sequence[int]) -> np.ndarray:
+        """Exact float32 vectors of the given rows"""
+        with self._lock:
+            full = self._mapped().get('full')
+        if full is None or not len(rows):
+            return np.zeros((0, self.dims), dtype=np.float32)
+        return np.asarray(full[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+
+    def get(self, doc_id: str) -> Optional[np.ndarray]:
+        row = self._row_of.get(doc_id)
+        if row is None:
+            return None
+        with self._lock:
+            return np.array(self._mapped()['full'][row])
+
+    def approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot products of a unit query with the compact codes, for all rows or the given ones"""
+        with self._lock:
+            maps = self._mapped()
+        if not maps:
+            return np.zeros(0, dtype=np.float32)
+        codes = maps['codes']
+        selected = np.arange(self._rows) if rows is None else np.asarray(rows, dtype=np.int64)
+        scores = np.empty(len(selected), dtype=np.float32)
+        for start in range(0, len(selected), SCAN_BLOCK_ROWS):
+            block_rows = selected[start:start + SCAN_BLOCK_ROWS]
+            block = codes[block_rows[0]:block_rows[-1] + 1] if rows is None else codes[block_rows]
+            block_scores = block.astype(np.float32) @ query
+            if self.dtype == 'int8':
+                scales = maps['scales']
+                block_scores *= scales[block_rows[0]:block_rows[-1] + 1] if rows is None else scales[block_rows]
+            scores[start:start + len(block_rows)] = block_scores
+        return scores
+
+    def rescore(self, query: np.ndarray, rows: Sequence[int]) -> np.ndarray:
+        """Exact float32 dot products for a few rows"""
+        with self._lock:
+            full = self._mapped().get('full')
+        if full is None or not len(rows):
+            return np.zeros(0, dtype=np.float32)
+        order = np.argsort(rows)
+        scores = np.empty(len(rows), dtype=np.float32)
+        # Reading rows in file order keeps page faults sequential
+        scores[order] = np.asarray(full[np.asarray(rows)[order]], dtype=np.float32) @ query
+        return scores
+
+    def search(self, query: Any, k: int = 10, rows: Optional[np.ndarray] = None,
+               rescore: int = RESCORE_FACTOR, generation: Optional[int] = None,
+               exclude_label: Any = None) -> List[Tuple[str, float]]:
+        """
+        Top k (id, cosine similarity) among live rows, optionally restricted to
+        candidate rows numbered in the given generation (all rows once the
+        store has been compacted since) and skipping ids with exclude_label.
+        Holds the store lock, so rows are not renumbered or removed mid-search.
+        """
+        query = _unit_rows(query, self.dims)[0]
+        with self._lock:
+            if rows is not None and generation is not None and generation != self.generation:
+                rows = None
+            candidate_rows = np.arange(self._rows) if rows is None else np.asarray(rows, dtype=np.int64)
+            scores = self.approximate_scores(query, None if rows is None else candidate_rows)
+            scores[~self._live[candidate_rows]] = -np.inf
+            if exclude_label is not None:
+                excluded = [self._row_of[doc_id] for doc_id in self._by_label.get(exclude_label, ())]
+                scores[np.isin(candidate_rows, excluded)] = -np.inf
+            keep = min(len(scores), max(k, k * rescore) if rescore else k)
+            if keep == 0:
+                return []
+            top = np.argpartition(-scores, keep - 1)[:keep]
+            top = top[np.isfinite(scores[top])]
+            top_rows = candidate_rows[top]
+            final = self.rescore(query, top_rows) if rescore else scores[top]
+            order = np.argsort(-final)[:k]
+            return [(self._id_at[int(top_rows[i])], float(final[i])) for i in order]
+
+    def compact(self) -> None:
+        """Rewrite the files with only live rows, in their current order, block by block"""
+        with self._lock:
+            live = sorted(self._id_at.items())
+            keep = np.asarray([row for row, _ in live], dtype=np.int64)
+            maps = self._mapped()
+            for name, array in maps.items():
+                with open(self._file(f"{name}.bin.new"), "wb") as f:
+                    for start in range(0, len(keep), SCAN_BLOCK_ROWS):
+                        f.write(np.ascontiguousarray(array[keep[start:start + SCAN_BLOCK_ROWS]]).tobytes())
+            self._maps = None
+            for name in maps:
+                os.replace(self._file(f"{name}.bin.new"), self._file(f"{name}.bin"))
+            if not maps:
+                for name in ("codes", "full", "scales"):
+                    if os.path.exists(self._file(f"{name}.bin")):
+                        os.remove(self._file(f"{name}.bin"))
+
+            labels = dict(self._labels)
+            self._row_of, self._id_at, self._labels = {}, {}, {}
+            self._by_label = defaultdict(set)
+            self._live = np.zeros(len(live), dtype=bool)
+            with open(self._file("ids.jsonl.new"), "w") as f:
+                for new_row, (_, doc_id) in enumerate(live):
+                    self._remember(new_row, doc_id, labels.get(doc_id))
+                    f.write(json.dumps([new_row, doc_id, labels.get(doc_id)]) + "\n")
+            os.replace(self._file("ids.jsonl.new"), self._file("ids.jsonl"))
+            self._rows = len(live)
+            self.generation += 1
+            self._write_meta()
+
+    def stats(self) -> Dict[str, Any]:
+        code_bytes = np.dtype(self.dtype).itemsize * self.dims + (4 if self.dtype == 'int8' else 0)
+        return {
+            'dtype': self.dtype,
+            'dims': self.dims,
+            'live': len(self._row_of),
+            'rows': self._rows,
+            # Bytes that stay hot for searching; full.bin is read only for rescoring
+            'scan_bytes': self._rows * code_bytes,
+            'float32_bytes': self._rows * self.dims * 4,
+        }
+
+
+def sync_from_table(session, store: VectorStore, filename: Optional[str] = None,
+                    page_rows: int = SYNC_PAGE_ROWS) -> int:
+    """Copy chunk embeddings not yet in the store from RAG_DOCUMENTS_TMP, labelled with their filename"""
+    added = 0
+    last_id = ""
+    while True:
+        rows = statements.RAG_EMBEDDINGS_AFTER_ID.collect(session, last_id, filename, filename, page_rows)
+        if not rows:
+            break
+        last_id = rows[-1]['DOC_ID']
+        fresh = [r for r in rows if r['DOC_ID'] not in store and r['EMBEDDING'] is not None]
+        if fresh:
+            vectors = [json.loads(r['EMBEDDING']) if isinstance(r['EMBEDDING'], str) else r['EMBEDDING'] for r in fresh]
+            store.add([r['DOC_ID'] for r in fresh], vectors, [r['FILENAME'] for r in fresh])
+            added += len(fresh)
+        if len(rows) < page_rows:
+            break
+    return added
+
+
+_store: Optional[VectorStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[VectorStore]:
+    """The library's local store in $SMART_LIBRARY_VECTOR_DIR, or None when local retrieval is not configured"""
+    global _store
+    with _store_lock:
+        if _store is None and os.environ.get(VECTOR_DIR_ENV):
+            _store = VectorStore(os.environ[VECTOR_DIR_ENV], dtype=os.environ.get(VECTOR_DTYPE_ENV, "int8"))
+        return _store